@@ -0,0 +1,122 @@
+import json, os
+from .utils import cache_folder, prune_files
+
+
+class DeviceCache:
+    """per device metadata saved between runs: measured timeouts / pipeline depth and onboard memory geometry.
+
+        one json file per device, keyed by serial number, device index and product name, in the user cache folder.
+        devices not seen for max_age seconds are forgotten, and the oldest ones past max_files.
+    """
+    max_files = 64
+    max_age = 180*24*3600
+
+    def __init__(self, folder = None):
+        self.folder = folder or cache_folder('devices')
+
+    def filename(self, dev):
+        serial = ''.join(x for x in str(dev.hidpp20_info('serial')) if x.isalnum()) or 'device'
+        name = ''.join(x if x.isalnum() else '_' for x in str(dev.product_name))
+        return os.path.join(self.folder, f'{serial}-{dev.device_index:02x}-{name}.json')
+
+    def load(self, dev):
+        """
+        Args:
+            dev (LogiHPP20): the device
+
+        Returns:
+            dict: section name => dict, empty if not cached
+        """
+        filename = self.filename(dev)
+        if not os.path.isfile(filename):
+            return {}
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            #broken cache file, measure again
+            return {}
+
+    def save(self, dev, entry):
+        os.makedirs(self.folder, exist_ok = True)
+        filename = self.filename(dev)
+        tmp = filename + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, indent = 2)
+        os.replace(tmp, filename)
+        prune_files(self.folder, self.max_files, self.max_age)
+
+    def invalidate(self, dev):
+        """forget the tuning of a device, keep the geometry"""
+        entry = self.load(dev)
+        if entry.pop('tuning', None) is not None:
+            self.save(dev, entry)
+
+    def tune(self, dev, omm = None, force = False, use_geometry = True):
+        """apply cached timeout and pipeline depth, or measure them on the first run
+            or after the cached ones timed out repeatedly
+
+        Args:
+            dev (LogiHPP20): the device
+            omm (FeatureOnboardProfile, optional): also tune page i/o pipelining and save the geometry,
+                    or load the cached geometry. Defaults to None.
+            force (bool, optional): measure again even if cached. Defaults to False.
+            use_geometry (bool, optional): load the cached geometry. False while recording, so the recording
+                    has the getInfo request a replay sends. Defaults to True.
+
+        Returns:
+            dict: tuning values
+        """
+        entry = self.load(dev)
+        #repeated timeouts with the tuned values, measure again next time
+        dev.on_stale_tuning = lambda: self.invalidate(dev)
+        if 'tuning' in entry and not force:
+            dev.apply_tuning(entry['tuning'])
+            if omm is not None and use_geometry and 'geometry' in entry:
+                omm.load_geometry(entry['geometry'])
+            return entry['tuning']
+        dev.tune_timeout(dev.measure_rtt())
+        if omm is not None:
+            omm.tune_pipeline()
+            entry['geometry'] = omm.geometry()
+        entry['pid'] = dev.product_id
+        entry['device_index'] = dev.device_index
+        entry['tuning'] = dev.tuning()
+        self.save(dev, entry)
+        return entry['tuning']
+
+    def find_geometry(self, pid, device_index):
+        """cached geometry of a device model, to decode profiles without opening the device
+
+        Args:
+            pid (int): usb pid
+            device_index (int): device index
+
+        Returns:
+            dict: from OnboardGeometry.geometry(), None if not cached
+        """
+        entry = self.find_entry(pid, device_index)
+        return None if entry is None else entry['geometry']
+
+    def find_entry(self, pid, device_index):
+        """latest cached entry with a geometry of a device model
+
+        Args:
+            pid (int): usb pid
+            device_index (int): device index
+
+        Returns:
+            dict: cache entry, with 'geometry' and 'tuning'. None if not cached
+        """
+        if not os.path.isdir(self.folder):
+            return None
+        files = [os.path.join(self.folder, x) for x in os.listdir(self.folder) if x.endswith('.json')]
+        for filename in sorted(files, key = os.path.getmtime, reverse = True):
+            try:
+                with open(filename, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if entry.get('pid') == pid and entry.get('device_index') == device_index and 'geometry' in entry:
+                return entry
+        return None
@@ -0,0 +1,105 @@
+import math
+from .FeatureOnboardProfile import OnboardProfileImage
+from .ProfileCache import ProfileCache
+
+
+class DryRun:
+    """plan the page i/o of an import or export without touching the device, and estimate its time.
+
+        the json is encoded with the same pipeline as a real import, against a cached geometry.
+        writes are one request per 16 bytes chunk plus start / end, each waits for its reply.
+        reads are one request per 16 bytes chunk, pipelined. an export also reads the macro pages
+        if the profile has macros, they are planned as "macro" steps.
+        the time is estimated from the read round trip time, flash writes take longer: for imports it is a lower bound.
+    """
+    def __init__(self, geometry, tuning = None):
+        """
+        Args:
+            geometry (OnboardGeometry or dict): target geometry, e.g. from DeviceCache.find_entry
+            tuning (dict, optional): from LogiHPP20.tuning(), for the time estimate. Defaults to None.
+        """
+        self.geometry = OnboardProfileImage(geometry)
+        self.tuning = tuning or {}
+        #(operation, page, bytes, transactions, round trips)
+        self.steps = []
+
+    def plan_import(self, profile_index, j):
+        """
+        Args:
+            profile_index (int): target profile
+            j (dict): profile json
+        """
+        #nothing is written, not even the disk cache
+        data = ProfileCache(persist = False).compile(self.geometry, j, profile_index)
+        layout = self.geometry.page_layout[profile_index]
+        #same order as onboard_profile_save, macro pages first
+        pages = [(layout[i], x) for i, x in enumerate(data[1:], 1)] + [(layout[0], data[0])]
+        for page, page_data in pages:
+            n = math.ceil(len(page_data) / 16) + 2
+            self.steps.append(('write', page, len(page_data), n, n))
+
+    def plan_switch(self, profile_index):
+        """one switch per command, after all imports
+
+        Args:
+            profile_index (int): profile to switch to
+        """
+        self.steps.append(('switch', profile_index, 0, 1, 1))
+
+    def plan_export(self, profile_index):
+        """
+        Args:
+            profile_index (int): profile to read
+        """
+        n = math.ceil(self.geometry.page_size / 16)
+        depth = self.tuning.get('pipeline_depth', 1)
+        layout = self.geometry.page_layout[profile_index]
+        self.steps.append(('read', layout[0], self.geometry.page_size, n, math.ceil(n / depth)))
+        #macros are only known after reading the profile page, plan each macro page once
+        for page in layout[1:]:
+            self.steps.append(('macro', page, self.geometry.page_size, n, math.ceil(n / depth)))
+
+    def totals(self):
+        """
+        Returns:
+            dict: pages, bytes, chunks, transactions and estimated seconds, None without a measured rtt.
+                lower_bound is True if the plan writes
+        """
+        rtt = self.tuning.get('rtt_p50')
+        ret = {
+            'pages': sum(1 for x in self.steps if x[0] in ['read', 'write', 'macro']),
+            'bytes': sum(x[2] for x in self.steps),
+            'chunks': sum(math.ceil(x[2] / 16) for x in self.steps),
+            'transactions': sum(x[3] for x in self.steps),
+            'seconds': None,
+            'lower_bound': any(x[0] in ['write', 'switch'] for x in self.steps),
+        }
+        if rtt is not None:
+            ret['seconds'] = sum(x[4] for x in self.steps) * rtt / 1000
+        return ret
+
+    def print_plan(self, devices = 1, workers = 0):
+        """
+        Args:
+            devices (int, optional): number of devices, for fleet estimates. Defaults to 1.
+            workers (int, optional): devices done at once, 0 for all. Defaults to 0.
+        """
+        for op, page, size, n, _ in self.steps:
+            if op == 'switch':
+                print(f'  switch to profile {page}, {n} transaction')
+            elif op == 'macro':
+                print(f'  read  page {page:<4}{size:>6} bytes {math.ceil(size/16):>4} chunks {n:>4} transactions, if the profile has macros')
+            else:
+                print(f'  {op:<6}page {page:<4}{size:>6} bytes {math.ceil(size/16):>4} chunks {n:>4} transactions')
+        t = self.totals()
+        print(f"total: {t['pages']} pages, {t['bytes']} bytes, {t['chunks']} chunks, {t['transactions']} transactions", end = '')
+        if t['seconds'] is None:
+            print(', no measured rtt, run once with the device to estimate the time')
+            return
+        at_least = 'at least ' if t['lower_bound'] else ''
+        print(f", est. {at_least}{t['seconds']*1000:.1f}ms per device (rtt p50 {self.tuning['rtt_p50']}ms, {self.tuning.get('connection', '')})")
+        if t['lower_bound']:
+            print('  writes wait for the flash, the estimate uses the read round trip time')
+        if devices > 1:
+            rounds = math.ceil(devices / (workers or devices))
+            print(f"fleet: {devices} devices, {t['transactions']*devices} transactions, est. {at_least}{t['seconds']*rounds:.2f}s wall")
@@ -0,0 +1,75 @@
+import struct
+from .HidppFeatures import Feature
+
+
+class FeatureAdjustableDpi:
+    """interface to feature 0x2201, adjustable dpi. takes effect in host mode (onboard mode off).
+    """
+    def __init__(self, dev):
+        self.dev = dev
+        assert self.dev.has_feature(Feature.adjustable_dpi), 'unsupported device: no adjustable dpi!'
+        self._sensor_count = None
+        self._dpi_list = {}
+
+    @property
+    def sensor_count(self):
+        if self._sensor_count is None:
+            data = self.dev.call_feature(Feature.adjustable_dpi, 0)
+            self._sensor_count = data[4]
+        return self._sensor_count
+
+    def dpi_list(self, sensor = 0):
+        """supported dpi, queried once per sensor
+
+        Args:
+            sensor (int, optional): sensor index. Defaults to 0.
+
+        Returns:
+            list: dpi values, or (low, high, step) tuples for ranges
+        """
+        if sensor not in self._dpi_list:
+            data = self.dev.call_feature(Feature.adjustable_dpi, 1, [sensor])
+            raw = []
+            for i in range(5, 19, 2):
+                val = struct.unpack('>H', data[i:i+2])[0]
+                if val == 0:
+                    break
+                raw.append(val)
+            #a value with the top 3 bits set is a step, from the previous value up to the next one
+            is_step = lambda i: i + 2 < len(raw) and raw[i+1] >> 13 == 0x7
+            ret = []
+            i = 0
+            while i < len(raw):
+                if is_step(i):
+                    ret.append((raw[i], raw[i+2], raw[i+1] & 0x1FFF))
+                    #the upper bound may start the next range
+                    i += 2 if is_step(i+2) else 3
+                else:
+                    ret.append(raw[i])
+                    i += 1
+            self._dpi_list[sensor] = ret
+        return self._dpi_list[sensor]
+
+    def is_supported(self, dpi, sensor = 0):
+        for x in self.dpi_list(sensor):
+            if isinstance(x, tuple):
+                low, high, step = x
+                if low <= dpi <= high and (dpi - low) % step == 0:
+                    return True
+            elif x == dpi:
+                return True
+        return False
+
+    def get_dpi(self, sensor = 0):
+        data = self.dev.call_feature(Feature.adjustable_dpi, 2, [sensor])
+        return struct.unpack('>H', data[5:7])[0]
+
+    def set_dpi(self, dpi, sensor = 0):
+        """set sensor dpi
+
+        Args:
+            dpi (int): dpi
+            sensor (int, optional): sensor index. Defaults to 0.
+        """
+        assert self.is_supported(dpi, sensor), f'unsupported dpi: {dpi}, supported: {self.dpi_list(sensor)}'
+        self.dev.call_feature(Feature.adjustable_dpi, 3, [sensor] + list(struct.pack('>H', dpi)))
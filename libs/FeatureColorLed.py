@@ -0,0 +1,145 @@
+import struct, time
+from .HidppFeatures import Feature
+
+
+class FeatureColorLed:
+    """interface to feature 0x8070, color led effects
+    """
+    EFFECT_STATIC = 0x0001
+
+    def __init__(self, dev):
+        self.dev = dev
+        assert self.dev.has_feature(Feature.color_led_control), 'unsupported device: no color led control!'
+        self._zone_count = None
+        self._effects = {}
+
+    @property
+    def zone_count(self):
+        if self._zone_count is None:
+            data = self.dev.call_feature(Feature.color_led_control, 0)
+            self._zone_count = data[4]
+        return self._zone_count
+
+    def zone_effects(self, zone):
+        """effect ids supported by a zone, queried once
+
+        Args:
+            zone (int): zone index
+
+        Returns:
+            list[int]: effect id for each effect index
+        """
+        if zone not in self._effects:
+            data = self.dev.call_feature(Feature.color_led_control, 1, [zone])
+            ret = []
+            for i in range(data[7]):
+                out = self.dev.call_feature(Feature.color_led_control, 2, [zone, i])
+                ret.append(struct.unpack('>H', out[6:8])[0])
+            self._effects[zone] = ret
+        return self._effects[zone]
+
+    def set_zone_color(self, zone, color, wait_ack = True):
+        """set a zone to a static color, not saved to the device
+
+        Args:
+            zone (int): zone index
+            color (int): 0xRRGGBB
+            wait_ack (bool, optional): wait for the device to reply. Defaults to True.
+        """
+        effects = self.zone_effects(zone)
+        assert self.EFFECT_STATIC in effects, f'zone {zone} has no static color effect'
+        #zone, effect index, 10 bytes effect params, persistence
+        params = [zone, effects.index(self.EFFECT_STATIC)] + list(struct.pack('>I', color)[1:]) + [0]*7 + [0]
+        self.dev.call_feature(Feature.color_led_control, 3, params, wait_ack)
+
+
+class RGBStream:
+    """push per-zone colors through 0x8070 at a steady frame rate.
+
+        unchanged zones are not sent, frames that can't be sent in time are dropped.
+    """
+    def __init__(self, led, fps = 60, wait_ack = True):
+        """
+        Args:
+            led (FeatureColorLed): the led interface
+            fps (int, optional): target frame rate. Defaults to 60.
+            wait_ack (bool, optional): wait for the device to reply to each zone update.
+                    without it, call LogiHPP20.share() first so replies don't disturb other requests. Defaults to True.
+        """
+        self.led = led
+        self.fps = fps
+        self.wait_ack = wait_ack
+        self.last = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.frames = 0
+        self.dropped = 0
+        self.zones_sent = 0
+        self.zones_skipped = 0
+        self.elapsed = 0.0
+
+    def push(self, colors):
+        """send one frame
+
+        Args:
+            colors (dict): zone index => 0xRRGGBB
+
+        Returns:
+            int: number of zones sent
+        """
+        sent = 0
+        for zone, color in colors.items():
+            if self.last.get(zone) == color:
+                self.zones_skipped += 1
+                continue
+            self.led.set_zone_color(zone, color, self.wait_ack)
+            self.last[zone] = color
+            sent += 1
+        self.zones_sent += sent
+        self.frames += 1
+        return sent
+
+    def run(self, frame_source, duration = None, frames = None):
+        """stream frames until frame_source returns None, or duration / frames is reached
+
+        Args:
+            frame_source (function): frame_source(frame_number, seconds) returns colors for push()
+            duration (float, optional): seconds. Defaults to None.
+            frames (int, optional): number of frame slots. Defaults to None.
+
+        Returns:
+            dict: stats()
+        """
+        interval = 1.0 / self.fps
+        start = time.perf_counter()
+        slot = 0
+        while frames is None or slot < frames:
+            now = time.perf_counter() - start
+            if duration is not None and now >= duration:
+                break
+            colors = frame_source(slot, now)
+            if colors is None:
+                break
+            self.push(colors)
+            slot += 1
+            now = time.perf_counter() - start
+            if now > slot * interval:
+                #behind schedule, drop the frames whose time has passed
+                missed = int(now / interval) - slot
+                if frames is not None:
+                    missed = min(missed, frames - slot)
+                self.dropped += missed
+                slot += missed
+            time.sleep(max(0.0, slot * interval - (time.perf_counter() - start)))
+        self.elapsed += time.perf_counter() - start
+        return self.stats()
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'dropped': self.dropped,
+            'zones_sent': self.zones_sent,
+            'zones_skipped': self.zones_skipped,
+            'fps': self.frames / self.elapsed if self.elapsed else 0.0,
+        }
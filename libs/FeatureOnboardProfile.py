@@ -1,23 +1,39 @@
-import struct
-from .HidppConstants import *
+import struct, time
 from .utils import crc16_ccitt, pretty_list
-from .HidppProfile import Profile
 from .HidppFeatures import *
+from .Timings import span
 
+#page, offset of memoryRead
+ADDRESS = struct.Struct('>HH')
 
-#https://github.com/libratbag/libratbag/blob/master/src/hidpp20.c
-class FeatureOnboardProfile:
-    """interface to feature 0x8100, onboard profile
+
+class OnboardGeometry:
+    """memory geometry of feature 0x8100, from getInfo and the profile directory in page 0
     """
-    def __init__(self, dev):
-        self.dev = dev
-        assert self.dev.has_feature(Feature.onboard_profile), 'unsupported device: no onboard profiles!'
-        data = self.dev.call_feature(Feature.onboard_profile, 0, [0])
+    #from getInfo, fixed for a device
+    INFO_FIELDS = ['profile_format', 'num_profiles', 'num_buttons', 'num_gbuttons', 'num_pages', 'page_size',
+                   'extended_report_rate']
+    #from the profile directory in page 0
+    FIELDS = INFO_FIELDS + ['profile_list', 'page_layout']
+
+    def geometry(self):
+        """
+        Returns:
+            dict: geometry fields, to cache with the device
+        """
+        return {k: getattr(self, k) for k in self.FIELDS}
+
+    def load_info(self, data):
+        """parse onboard profile getInfo
+
+        Args:
+            data (bytes): response payload, from byte 4
+        """
         #sample output on G502
         #0x11 0xff 0x0c 0x0f 0x01 0x02 0x01 0x05 0x05 0x0b 0x10 0x01 0x00 0x0a 0x01 0x00 0x00 0x00 0x00 0x00
         memory_layout, self.profile_format, macro_format, self.num_profiles, \
             num_profiles_oob, self.num_buttons, self.num_pages, self.page_size, gshift = \
-            struct.unpack('>BBBBBBBHB', data[4:14])
+            struct.unpack('>BBBBBBBHB', data[:10])
         assert memory_layout == 1, f'unsupported device! {memory_layout}'
         assert self.profile_format <= 5, f'unsupported profile format {self.profile_format}' 
         assert macro_format == 1, f'unsupported macro format {macro_format}'
@@ -26,9 +42,14 @@ class FeatureOnboardProfile:
             self.page_size = 256
         assert self.page_size in [256, 1024], f'unsupported page size, should be 256 or 1024: {self.page_size}'
         self.num_gbuttons = self.num_buttons if gshift & 0x3 == 0x2 else 0
-        self.extended_report_rate = self.dev.has_feature(Feature.extended_report_rate)
+
+    def load_directory(self, data):
+        """parse profile directory in page 0 and calculate page layout
+
+        Args:
+            data (bytes): page 0
+        """
         self.profile_list = [{}]
-        data = self.read_memory_page(0)
         for i in range(self.num_profiles):
             rom, page, vis = struct.unpack('BBB', data[i*4:i*4+3])
             if rom == 0xFF:
@@ -42,8 +63,135 @@ class FeatureOnboardProfile:
             self.profile_list.append({'page':page, 'vis': vis == 1})
         self.page_layout = self.calc_page_layout()
 
+    def calc_page_layout(self):
+        # irregular page layout override
+        # return [[], [1,6,7],[2,10,11,12,15],[3,10,11],[4,12,13],[5,14,15]]
+
+        # default: 2 pages per profile for macro (16-6)/5
+        ret = [[]]
+        pages = int((self.num_pages - self.num_profiles - 1) / self.num_profiles)
+        for i in range(self.num_profiles):
+            arr = [self.profile_list[i+1]['page']]
+            arr += list(range(self.num_profiles + i*pages+1, self.num_profiles + i*pages+pages+1))
+            ret.append(arr)
+        return ret
+
+    def profile_bin_to_json(self, data):
+        from .HidppProfile import Profile
+        with span('decode json'):
+            p = Profile(self)
+            p.load_profile_bin(data)
+            return p.profile_to_json()
+
+
+class OnboardProfileImage(OnboardGeometry):
+    """memory pages held on the host, used in place of FeatureOnboardProfile to decode profiles without device i/o
+    """
+    def __init__(self, geometry, pages = {}):
+        """
+        Args:
+            geometry (OnboardGeometry or dict): geometry to copy, or a dict from geometry()
+            pages (dict, optional): page index => bytes. Defaults to {}.
+        """
+        if isinstance(geometry, OnboardGeometry):
+            geometry = geometry.geometry()
+        for k in self.FIELDS:
+            setattr(self, k, geometry[k])
+        self.pages = dict(pages)
+
+    def read_memory_page(self, page, verify = True):
+        assert page in self.pages, f'memory page {page} is not loaded'
+        ret = bytearray(self.pages[page])
+        if verify:
+            assert crc16_ccitt(ret[:-2]) == struct.unpack('>H', ret[-2:])[0], f'checksum error while reading memory page: {page}'
+        return ret
+
+
+#https://github.com/libratbag/libratbag/blob/master/src/hidpp20.c
+class FeatureOnboardProfile(OnboardGeometry):
+    """interface to feature 0x8100, onboard profile
+    """
+    def __init__(self, dev):
+        self.dev = dev
+        #read a page again on checksum error, restart a page write on a lost reply
+        self.page_retries = 2
+        assert self.dev.has_feature(Feature.onboard_profile), 'unsupported device: no onboard profiles!'
+        #geometry and page 0 are read on first use, see __getattr__
+        #cached device state, kept up to date by notifications after monitor()
+        self.state = None
+        self.listeners = []
+        self.monitor_handle = None
+
+    def __getattr__(self, name):
+        #only called for attributes not loaded yet
+        if name in self.INFO_FIELDS:
+            with span('memory info'):
+                data = self.dev.call_feature(Feature.onboard_profile, 0, [0])
+                self.load_info(data[4:])
+                self.extended_report_rate = self.dev.has_feature(Feature.extended_report_rate)
+        elif name in ['profile_list', 'page_layout']:
+            with span('profile directory'):
+                self.load_directory(self.read_memory_page(0))
+        else:
+            raise AttributeError(name)
+        return self.__dict__[name]
+
+    def load_geometry(self, geometry):
+        """use cached getInfo values instead of asking the device
+
+        Args:
+            geometry (dict): from geometry()
+        """
+        for k in self.INFO_FIELDS:
+            setattr(self, k, geometry[k])
+
     def close(self):
+        self.stop_monitor()
         self.dev.close()
+
+    def monitor(self, callback = None):
+        """listen to 0x8100 notifications sent when a profile or dpi button is pressed,
+            and serve current_profile / onboard_mode from a local cache from now on.
+
+        Args:
+            callback (function, optional): called as callback(event, state) from the reader thread,
+                    event is 'profile' or 'dpi', state is a copy of self.state. Defaults to None.
+
+        Returns:
+            dict: current state, {'profile', 'onboard_mode', 'dpi_index'}
+        """
+        if callback is not None:
+            self.listeners.append(callback)
+        if self.monitor_handle is None:
+            #notifications are handled on the reader thread, which can't wait for page 0 itself
+            self.profile_list
+            self.monitor_handle = self.dev.subscribe(Feature.onboard_profile, self._on_notification)
+            self.state = {'profile': self.current_profile, 'onboard_mode': self.onboard_mode, 'dpi_index': -1}
+        return dict(self.state)
+
+    def stop_monitor(self):
+        if self.monitor_handle is not None:
+            self.dev.unsubscribe(self.monitor_handle)
+        self.monitor_handle = None
+        self.state = None
+        self.listeners = []
+
+    def _on_notification(self, data):
+        event = data[3] >> 4
+        if event == 0:
+            #current profile changed, payload is the profile's memory page
+            sector = struct.unpack('>H', data[4:6])[0]
+            pages = [p.get('page') for p in self.profile_list]
+            self.state['profile'] = pages.index(sector) if sector in pages else sector & 0xFF
+            name = 'profile'
+        elif event == 1:
+            #dpi index changed
+            self.state['dpi_index'] = data[4]
+            name = 'dpi'
+        else:
+            return
+        for callback in list(self.listeners):
+            callback(name, dict(self.state))
         
     def info_display(self):
         print(self.dev.hidpp20_info())        
@@ -73,13 +221,44 @@ class FeatureOnboardProfile:
         Returns:
             bytearray: content out
         """
-        ret = bytearray()
-        for i in range(0, int(self.page_size/16)):
-            ret += self.dev.call_feature(Feature.onboard_profile, 5, list(struct.pack('>HH', page, i*16)))[4:]  #[page >> 8, page & 0xFF, 0,  i*16, 0x10])[4:])
+        for attempt in range(self.page_retries + 1):
+            with span('read page'):
+                ret = self.read_memory_range(page, 0, self.page_size)
+            if not verify or crc16_ccitt(ret[:-2]) == struct.unpack('>H', ret[-2:])[0]:
+                break
+            #read the failing page again
+            self.dev.stats['crc_failures'] += 1
+            if attempt < self.page_retries:
+                self.dev.stats['page_retries'] += 1
         if verify:
             assert crc16_ccitt(ret[:-2]) == struct.unpack('>H', ret[-2:])[0], f'checksum error while reading memory page: {page}'
-        return bytearray(ret)
+        return ret
     
+    def read_memory_range(self, page, offset, length):
+        """read part of a memory page, no checksum check
+
+        Args:
+            page (int): page index
+            offset (int): start offset
+            length (int): number of bytes
+
+        Returns:
+            bytearray: content out
+        """
+        #16 bytes per read, copied into one buffer
+        start = time.perf_counter()
+        ret = bytearray(length)
+        params = [ADDRESS.pack(page, offset + i) for i in range(0, length, 16)]
+        for i, out in enumerate(self.dev.call_feature_batch(Feature.onboard_profile, 5, params)):
+            assert out, f'error while reading memory page: {page}'
+            n = min(16, length - i*16)
+            ret[i*16:i*16+n] = memoryview(out)[4:4+n]
+        stats = self.dev.stats
+        stats['page_reads'] += 1
+        stats['read_bytes'] += length
+        stats['read_time'] += time.perf_counter() - start
+        return ret
+
     def write_memory_page(self, page, data, verify = True):
         """write memory page with data
 
@@ -92,48 +271,136 @@ class FeatureOnboardProfile:
         if verify:
             checksum = crc16_ccitt(data[:-2])
             data = data[:-2] + struct.pack('>H', checksum)
-        #call 06 to start, then 07 writing in loop, 08 to finish
-        self.dev.call_feature(Feature.onboard_profile, 6, list(struct.pack('>HHH', page, 0, len(data))))
+        with span('write page'):
+            self.write_memory_range(page, 0, data)
+
+    def write_memory_range(self, page, offset, data):
+        """write part of a memory page, no checksum update
+
+        Args:
+            page (int): page index
+            offset (int): start offset, multiple of 16
+            data (bytes): data to write, multiple of 16 bytes
+        """
+        assert offset % 16 == 0 and len(data) % 16 == 0 and offset + len(data) <= self.page_size, f'wrong range: {offset}, {len(data)}'
+        start = time.perf_counter()
+        for attempt in range(self.page_retries + 1):
+            if self._write_range_once(page, offset, data):
+                stats = self.dev.stats
+                stats['page_writes'] += 1
+                stats['write_bytes'] += len(data)
+                stats['write_time'] += time.perf_counter() - start
+                return
+            #the write pointer moves on every chunk, so a lost reply restarts the whole range
+            if attempt < self.page_retries:
+                self.dev.stats['page_retries'] += 1
+        raise Exception(f'error while writing memory page: {page}')
+
+    def write_memory_diff(self, page, old, data, verify = True):
+        """write only the 16 bytes chunks of a page that differ from old
+
+        Args:
+            page (int): page index
+            old (bytes): page content on the device
+            data (bytes): new page content
+            verify (bool, optional): update the checksum in the last 2 bytes. Defaults to True.
+
+        Returns:
+            int: number of bytes written
+        """
+        assert len(data) == self.page_size and len(old) == self.page_size, 'wrong data size!'
+        if verify:
+            data = data[:-2] + struct.pack('>H', crc16_ccitt(data[:-2]))
+        #merge neighbouring changed chunks into one write sequence
+        ranges = []
+        for i in range(0, self.page_size, 16):
+            if data[i:i+16] != old[i:i+16]:
+                if ranges and ranges[-1][1] == i:
+                    ranges[-1][1] = i + 16
+                else:
+                    ranges.append([i, i + 16])
+        for start, end in ranges:
+            self.write_memory_range(page, start, data[start:end])
+        return sum(end - start for start, end in ranges)
+
+    def tune_pipeline(self, depths = [1, 2, 4, 8]):
+        """pick the fastest pipeline depth for page i/o by reading page 0
+
+        Args:
+            depths (list, optional): depths to try, in order. Defaults to [1, 2, 4, 8].
+
+        Returns:
+            int: chosen depth, also set to the device
+        """
+        ref = None
+        best, best_time = 1, None
+        for depth in depths:
+            self.dev.pipeline_depth = depth
+            elapsed = None
+            for _ in range(2):
+                start = time.perf_counter()
+                try:
+                    data = self.read_memory_page(0, False)
+                except AssertionError:
+                    data = None
+                t = time.perf_counter() - start
+                elapsed = t if elapsed is None else min(elapsed, t)
+            if ref is None:
+                ref = data
+            if data is None or data != ref:
+                #replies out of order or lost, stop at the last good depth
+                break
+            if best_time is None or elapsed < best_time:
+                best, best_time = depth, elapsed
+        self.dev.pipeline_depth = best
+        return best
+
+    def _write_range_once(self, page, offset, data):
+        #call 06 to start, then 07 writing in loop, 08 to finish. the tuned timeout is for reads,
+        #flash writes wait longer. 08 commits the write, a lost reply restarts the range instead of repeating it
+        timeout = self.dev.flash_timeout
+        if not self.dev.call_feature(Feature.onboard_profile, 6, struct.pack('>HHH', page, offset, len(data)), timeout = timeout):
+            return False
+        chunks = memoryview(data)
         for i in range(int(len(data)/16)):
-            self.dev.call_feature(Feature.onboard_profile, 7, list(data[i*16:i*16+16]))
-        self.dev.call_feature(Feature.onboard_profile, 8)
-        return
+            if not self.dev.call_feature(Feature.onboard_profile, 7, chunks[i*16:i*16+16], retry = False, timeout = timeout):
+                return False
+        return self.dev.call_feature(Feature.onboard_profile, 8, retry = False, timeout = timeout) is not None
 
     def onboard_profile_to_bin(self):
         assert self.profile_list[self.dest]['page'] == self.dest, f'error profile {self.dest} at page {self.profile_list[self.dest]['page']}'
         return self.read_memory_page(self.page_layout[self.dest][0])
         
-    def onboard_profile_save(self, data):
+    def onboard_profile_save(self, data, journal = None):
+        """write profile page and macro pages
+
+        Args:
+            data (list): data[0]: profile, data[1:]: macro pages
+            journal (WriteJournal, optional): record completed pages, resume an interrupted write. Defaults to None.
+        """
         assert self.profile_list[self.dest]['page'] == self.dest, f'error profile {self.dest} at page {self.profile_list[self.dest]['page']}'
         print('save profile', self.dest)
-        #write to profile page and macro page
-        self.write_memory_page(self.page_layout[self.dest][0], data[0])
-        for i, macro in enumerate(data[1:], 1):
-            self.write_memory_page(self.page_layout[self.dest][i] , macro, False)
+        #macro pages first, so the profile never points at a half written macro
+        pages = [(self.page_layout[self.dest][i], macro, False) for i, macro in enumerate(data[1:], 1)]
+        pages.append((self.page_layout[self.dest][0], data[0], True))
+        if journal is not None:
+            pages = journal.start(pages)
+        for page, page_data, verify in pages:
+            self.write_memory_page(page, page_data, verify)
+            if journal is not None:
+                journal.done(page)
+        if journal is not None:
+            journal.finish()
 
     def profile_bin_from_json(self, j):
-        return Profile(self).profile_bytes_from_json(j, self.dest)
+        #same json and geometry give the same pages, encode once per fleet / run
+        from .ProfileCache import ProfileCache
+        return ProfileCache().compile(self, j, self.dest)
 
-    def profile_bin_to_json(self, data):
-        p = Profile(self)
-        p.load_profile_bin(data)
-        return p.profile_to_json()
-    
-    def calc_page_layout(self):
-        # irregular page layout override
-        # return [[], [1,6,7],[2,10,11,12,15],[3,10,11],[4,12,13],[5,14,15]]
-
-        # default: 2 pages per profile for macro (16-6)/5
-        ret = [[]]
-        pages = int((self.num_pages - self.num_profiles - 1) / self.num_profiles)
-        for i in range(self.num_profiles):
-            arr = [self.profile_list[i+1]['page']]
-            arr += list(range(self.num_profiles + i*pages+1, self.num_profiles + i*pages+pages+1))
-            ret.append(arr)
-        return ret
-    
     @property
     def current_profile(self):
+        if self.state is not None:
+            return self.state['profile']
         data = self.dev.call_feature(Feature.onboard_profile, 4, [0])
         return data[5]
     
@@ -149,16 +416,23 @@ class FeatureOnboardProfile:
             print(f'enable profile {profile_index} visible')
             self.profile_visibility = True
         self.dev.call_feature(Feature.onboard_profile, 3, [0, profile_index, 0])
+        if self.state is not None:
+            self.state['profile'] = profile_index
         print(f'switch profile: {curr}=>{profile_index}')
 
     @property
     def onboard_mode(self):
+        if self.state is not None:
+            return self.state['onboard_mode']
         data = self.dev.call_feature(Feature.onboard_profile, 2)
         return data[4] == 1
     
     @onboard_mode.setter
     def onboard_mode(self, mode = True):
         self.dev.call_feature(Feature.onboard_profile, 1, [1 if mode else 2])
+        #no notification for mode changes, only the host can change it
+        if self.state is not None:
+            self.state['onboard_mode'] = mode
 
     @property
     def dest_profile(self):
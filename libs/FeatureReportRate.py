@@ -0,0 +1,56 @@
+import struct
+from .HidppFeatures import Feature
+
+
+class FeatureReportRate:
+    """interface to feature 0x8060 report rate, or 0x8061 extended report rate if the device has it.
+        takes effect in host mode (onboard mode off).
+    """
+    #rate index of 0x8061, same as the extended report rate byte in profiles
+    EXTENDED_RATES = [125, 250, 500, 1000, 2000, 4000, 8000]
+
+    def __init__(self, dev):
+        self.dev = dev
+        self.extended = self.dev.has_feature(Feature.extended_report_rate)
+        assert self.extended or self.dev.has_feature(Feature.report_rate), 'unsupported device: no report rate control!'
+        self._rates = None
+
+    @property
+    def rates(self):
+        """supported report rates, queried once
+
+        Returns:
+            list: report rates in hz
+        """
+        if self._rates is None:
+            if self.extended:
+                #getReportRateList, bit n for EXTENDED_RATES[n]
+                data = self.dev.call_feature(Feature.extended_report_rate, 1, [0])
+                mask = struct.unpack('>H', data[4:6])[0]
+                self._rates = [x for i, x in enumerate(self.EXTENDED_RATES) if mask & (1 << i)]
+            else:
+                #getReportRateList, bit n for (n+1) ms
+                data = self.dev.call_feature(Feature.report_rate, 0)
+                self._rates = sorted(int(1000/(i+1)) for i in range(8) if data[4] & (1 << i))
+        return self._rates
+
+    @property
+    def rate(self):
+        """current report rate
+
+        Returns:
+            int: report rate in hz
+        """
+        if self.extended:
+            data = self.dev.call_feature(Feature.extended_report_rate, 2)
+            return self.EXTENDED_RATES[data[4]]
+        data = self.dev.call_feature(Feature.report_rate, 1)
+        return int(1000/data[4])
+
+    @rate.setter
+    def rate(self, val):
+        assert val in self.rates, f'unsupported report rate: {val}, supported: {self.rates}'
+        if self.extended:
+            self.dev.call_feature(Feature.extended_report_rate, 3, [self.EXTENDED_RATES.index(val)])
+        else:
+            self.dev.call_feature(Feature.report_rate, 2, [int(1000/val)])
@@ -0,0 +1,200 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from .LogiHPP20 import LogiHPP20
+from .FeatureOnboardProfile import FeatureOnboardProfile
+from .HidppReceiver import ReceiverSession
+from .HidppJournal import WriteJournal
+from .DeviceCache import DeviceCache
+from .ProfileDiff import diff_profile
+from .JsonLines import stream_profiles
+
+
+def select_devices(selector, pid = 0):
+    """resolve a fleet selector to a list of usb devices
+
+    Args:
+        selector (str): "all" for every device matching pid,
+                        a hex pid like "0xc08b",
+                        or a comma seperated serial number list
+        pid (int, optional): default pid for "all". Defaults to 0.
+
+    Returns:
+        list[tuple]: (pid, serial) for each selected device
+    """
+    selector = selector.strip()
+    serials = []
+    if selector.lower().startswith('0x'):
+        pid = int(selector, 16)
+    elif selector.lower() != 'all':
+        serials = [x.strip() for x in selector.split(',') if x.strip()]
+    ret = []
+    for dev in LogiHPP20.enumerate_devices(pid):
+        if serials and dev['serial_number'] not in serials:
+            continue
+        ret.append((dev['product_id'], dev['serial_number']))
+    missing = set(serials) - set(x[1] for x in ret)
+    if missing:
+        print('devices not found:', ', '.join(sorted(missing)))
+    return ret
+
+
+def apply_profiles(dev, ret, profiles, do_switch = 0, journal = '', audit = False, stream = None):
+    """write a profile set to an opened device and fill in the result dict
+
+    Args:
+        dev (LogiHPP20): the device
+        ret (dict): per device result
+        profiles (dict): profile index => json dict
+        do_switch (int, optional): profile to switch to after import, 0 to keep. Defaults to 0.
+        journal (str, optional): journal folder, resume interrupted imports. Defaults to ''.
+        audit (bool, optional): only compare, changes go to ret['changes']. Defaults to False.
+        stream (JsonLines, optional): write all profiles of the device here instead, profiles is ignored. Defaults to None.
+    """
+    start = time.perf_counter()
+    try:
+        ret['name'] = dev.product_name
+        omm = FeatureOnboardProfile(dev)
+        DeviceCache().tune(dev, omm)
+        if stream is not None:
+            t = time.perf_counter()
+            stream_profiles(omm, stream)
+            ret['profiles']['all'] = time.perf_counter() - t
+            profiles = {}
+        for profile_index, j in sorted(profiles.items()):
+            t = time.perf_counter()
+            omm.dest_profile = profile_index
+            assert omm.profile_enabled, f'profile {profile_index} is disabled!'
+            if audit:
+                ret['changes'][profile_index] = diff_profile(omm, j)
+                ret['profiles'][profile_index] = time.perf_counter() - t
+                continue
+            omm.onboard_profile_save(omm.profile_bin_from_json(j), WriteJournal.for_device(journal, dev, profile_index) if journal else None)
+            ret['profiles'][profile_index] = time.perf_counter() - t
+        if do_switch and not audit:
+            omm.dest_profile = do_switch
+            omm.current_profile = do_switch
+        ret['ok'] = True
+    except Exception as e:
+        ret['error'] = str(e) or type(e).__name__
+    ret['elapsed'] += time.perf_counter() - start
+    ret['metrics'] = dev.metrics()
+    return ret
+
+
+def _result(pid, serial, index):
+    return {'pid': pid, 'serial': serial, 'index': index, 'name': '', 'ok': False, 'error': '', 'profiles': {}, 'changes': {}, 'elapsed': 0.0}
+
+
+def provision_device(target, index_list, profiles, do_switch = 0, journal = '', audit = False, stream = None):
+    """open one device and apply a profile set. runs inside a pool worker.
+
+    Args:
+        target (tuple): (pid, serial)
+        index_list (list): possible connection id, see LogiHPP20
+        profiles (dict): profile index => json dict
+        do_switch (int, optional): profile to switch to after import, 0 to keep. Defaults to 0.
+        journal (str, optional): journal folder, resume interrupted imports. Defaults to ''.
+        audit (bool, optional): compare instead of writing, see ProfileDiff. Defaults to False.
+        stream (JsonLines, optional): dump all profiles here instead of writing. Defaults to None.
+
+    Returns:
+        list[dict]: per device result, with timing in seconds
+    """
+    pid, serial = target
+    ret = _result(pid, serial, index_list[0] if len(index_list) == 1 else -1)
+    start = time.perf_counter()
+    try:
+        dev = LogiHPP20(pid, '', index_list, serial)
+    except Exception as e:
+        ret['error'] = str(e) or type(e).__name__
+        ret['elapsed'] = time.perf_counter() - start
+        return [ret]
+    ret['index'] = dev.device_index
+    ret['elapsed'] = time.perf_counter() - start
+    apply_profiles(dev, ret, profiles, do_switch, journal, audit, stream)
+    dev.close()
+    return [ret]
+
+
+def provision_receiver(target, index_list, profiles, do_switch = 0, journal = '', audit = False, stream = None):
+    """open a receiver once and provision all paired devices on it concurrently
+
+    Args:
+        target (tuple): (pid, serial) of the receiver
+        index_list (list): slots to probe, all slots if empty
+        profiles (dict): profile index => json dict
+        do_switch (int, optional): profile to switch to after import. Defaults to 0.
+        journal (str, optional): journal folder, resume interrupted imports. Defaults to ''.
+        audit (bool, optional): compare instead of writing. Defaults to False.
+        stream (JsonLines, optional): dump all profiles here instead of writing. Defaults to None.
+
+    Returns:
+        list[dict]: one result per paired device
+    """
+    pid, serial = target
+    start = time.perf_counter()
+    try:
+        session = ReceiverSession(pid, serial)
+        devices = session.probe([i for i in index_list if i in range(1, 7)] or [1, 2, 3, 4, 5, 6])
+    except Exception as e:
+        ret = _result(pid, serial, -1)
+        ret['error'] = str(e) or type(e).__name__
+        ret['elapsed'] = time.perf_counter() - start
+        return [ret]
+    results = []
+    for i in devices:
+        ret = _result(pid, serial, i)
+        ret['elapsed'] = time.perf_counter() - start
+        results.append(ret)
+    if devices:
+        with ThreadPoolExecutor(max_workers = len(devices)) as pool:
+            n = len(results)
+            list(pool.map(apply_profiles, devices.values(), results, [profiles]*n, [do_switch]*n, [journal]*n, [audit]*n, [stream]*n))
+    session.close()
+    return results
+
+
+def run_fleet(targets, index_list, profiles, do_switch = 0, workers = 0, use_processes = False, journal = '', audit = False, stream = None):
+    """apply a profile set to many devices concurrently
+
+    Args:
+        targets (list[tuple]): (pid, serial) from select_devices()
+        index_list (list): possible connection id, see LogiHPP20
+        profiles (dict): profile index => json dict
+        do_switch (int, optional): profile to switch to after import. Defaults to 0.
+        workers (int, optional): pool size, 0 for one worker per device. Defaults to 0.
+        use_processes (bool, optional): use a process pool instead of threads. Defaults to False.
+        journal (str, optional): journal folder, resume interrupted imports. Defaults to ''.
+        audit (bool, optional): compare the profiles with each device instead of writing. Defaults to False.
+        stream (JsonLines, optional): dump all profiles of each device here instead of writing, threads only. Defaults to None.
+
+    Returns:
+        tuple: (list of per device results, wall clock seconds)
+    """
+    if not targets:
+        return [], 0.0
+    assert stream is None or not use_processes, 'streaming output needs a thread pool'
+    executor = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    start = time.perf_counter()
+    results = []
+    with executor(max_workers = workers or len(targets)) as pool:
+        futures = []
+        for t in targets:
+            func = provision_receiver if LogiHPP20.is_receiver(t[0]) else provision_device
+            futures.append(pool.submit(func, t, index_list, profiles, do_switch, journal, audit, stream))
+        for f in as_completed(futures):
+            results += f.result()
+    results.sort(key = lambda r: (r['serial'], r['index']))
+    return results, time.perf_counter() - start
+
+
+def print_report(results, wall_time):
+    print(f'{"serial":<24} {"pid":<6} {"index":<6} {"result":<6} {"time(s)":>8}  profiles')
+    for r in results:
+        timing = ' '.join(f'{k}:{v:.2f}' + (f'({len(r["changes"][k])} changes)' if k in r['changes'] else '') for k, v in r['profiles'].items())
+        index = f'0x{r["index"]:02X}' if r['index'] >= 0 else '-'
+        print(f'{r["serial"]:<24} {r["pid"]:04X}   {index:<6} {"ok" if r["ok"] else "FAIL":<6} {r["elapsed"]:>8.2f}  {timing}')
+        if r['error']:
+            print(f'    error: {r["error"]}')
+    total = sum(r['elapsed'] for r in results)
+    print(f'\n{sum(r["ok"] for r in results)}/{len(results)} devices ok, wall {wall_time:.2f}s, sum of device time {total:.2f}s')
@@ -0,0 +1,284 @@
+import asyncio, struct, threading
+from .LogiHPP20 import LogiHPP20
+from .HidppTransport import HidppTransport
+from .HidppFeatures import Feature
+from .HidppProfile import Profile
+from .FeatureOnboardProfile import OnboardGeometry, OnboardProfileImage, ADDRESS
+from .ProfileCache import ProfileCache
+from .utils import crc16_ccitt, pretty_list2
+
+
+class AsyncTransport:
+    """hid++ transport for asyncio.
+
+        a background thread reads reports from the port and hands them to the event loop.
+        each request gets its own software id (1-15), replies go to the waiting request by
+        (device index, feature index, function, swid) like HidppTransport, so one transport can serve
+        every device index behind a receiver and a late reply never goes to the next request.
+    """
+    def __init__(self, port, loop = None):
+        """
+        Args:
+            port (hid.Device): opened long report port
+            loop (asyncio.AbstractEventLoop, optional): defaults to the running loop.
+        """
+        self.port = port
+        self.loop = loop or asyncio.get_running_loop()
+        self.pending = {}
+        #futures of requests waiting for a free swid
+        self.released = []
+        self.swid = 0
+        self.stale = 0
+        self.running = True
+        self.reader = threading.Thread(target = self._reader, daemon = True)
+        self.reader.start()
+
+    def _reader(self):
+        while self.running:
+            try:
+                data = self.port.read(size = 255, timeout = 100)
+            except Exception:
+                break
+            if len(data) >= 5:
+                self.loop.call_soon_threadsafe(self._dispatch, bytes(data))
+
+    def _dispatch(self, data):
+        key, error = HidppTransport.reply_key(data)
+        fut = self.pending.pop(key, None)
+        if fut is None:
+            #late reply of a timed out request, or a notification
+            self.stale += 1
+            return
+        self._release()
+        if not fut.done():
+            fut.set_result(None if error else data)
+
+    def _release(self):
+        released, self.released = self.released, []
+        for fut in released:
+            if not fut.done():
+                fut.set_result(None)
+
+    def _next_key(self, data):
+        for _ in range(15):
+            self.swid = self.swid % 15 + 1
+            key = (data[1], data[2], data[3] >> 4, self.swid)
+            if key not in self.pending:
+                return key
+        return None
+
+    async def request(self, data, read_back = True, timeout = 5.0):
+        """send a report and wait for the reply
+
+        Args:
+            data (bytes): full report, byte 3 is function << 4, the swid is filled in here
+            read_back (bool, optional): wait for the reply. Defaults to True.
+            timeout (float, optional): seconds, also for waiting on a free swid. Defaults to 5.0.
+
+        Returns:
+            bytes: reply, None on error or timeout
+        """
+        data = bytearray(data)
+        deadline = self.loop.time() + timeout
+        while True:
+            key = self._next_key(data)
+            if key is not None or not read_back:
+                break
+            #every swid of this function is in flight
+            fut = self.loop.create_future()
+            self.released.append(fut)
+            try:
+                await asyncio.wait_for(fut, max(0, deadline - self.loop.time()))
+            except asyncio.TimeoutError:
+                return None
+        data[3] = data[3] & 0xF0 | self.swid
+        fut = None
+        if read_back:
+            fut = self.loop.create_future()
+            self.pending[key] = fut
+        self.port.write(bytes(data))
+        if fut is None:
+            return b''
+        try:
+            return await asyncio.wait_for(fut, max(0, deadline - self.loop.time()))
+        except asyncio.TimeoutError:
+            #a late reply with this swid is dropped, not handed to the next request
+            if self.pending.get(key) is fut:
+                del self.pending[key]
+                self._release()
+            return None
+
+    def close(self):
+        self.running = False
+        self.reader.join()
+        self.port.close()
+
+
+class AsyncLogiHPP20:
+    """awaitable hid++ 2.0 device, see LogiHPP20
+    """
+    def __init__(self, transport, device_index, product_name = ''):
+        self.transport = transport
+        self.device_index = device_index
+        self.product_name = product_name
+        #seconds
+        self.timeout = 5.0
+        self.debug = False
+        self.feature_index = {0:0}
+
+    @classmethod
+    async def open(cls, pid = 0, name = '', index_list = [], serial = ''):
+        """find and open a device. detection is blocking and runs in the default executor.
+
+        Returns:
+            AsyncLogiHPP20: the device
+        """
+        loop = asyncio.get_running_loop()
+        dev = await loop.run_in_executor(None, LogiHPP20, pid, name, index_list, serial)
+        #requests go through the long port only, the transport closes it
+        for p in dev.open_ports()[1:]:
+            p.close()
+        return cls(AsyncTransport(dev.port_long, loop), dev.device_index, dev.product_name)
+
+    def close(self):
+        self.transport.close()
+
+    async def find_feature_index(self, val):
+        if val in self.feature_index:
+            return self.feature_index.get(val)
+        out = await self.call_feature(0, 0, list(struct.pack(">H", val)))
+        if out and out[4] > 0:
+            self.feature_index[val] = out[4]
+            return out[4]
+        else:
+            return 0xFF
+
+    async def has_feature(self, val):
+        return await self.find_feature_index(val) != 0xFF
+
+    async def call_feature(self, feature_val, func_id, params = [0], read_back = True):
+        feature_idx = await self.find_feature_index(feature_val)
+        if feature_idx == 0xFF:
+            return None
+        #the transport fills in the swid
+        data = ([0x11, self.device_index, feature_idx, func_id << 4] + list(params) + [0]*20)[:20]
+        out = await self.transport.request(data, read_back, self.timeout)
+        if self.debug:
+            print('fap ping:')
+            print(pretty_list2(data))
+            print(pretty_list2(out) if out else 'no readback')
+        return out
+
+    async def get_device_name(self):
+        if not await self.has_feature(Feature.device_name):
+            return None
+        out = await self.call_feature(Feature.device_name, 0, [0])
+        name_length = out[4]
+        name = b''
+        while len(name) < name_length:
+            frag = await self.call_feature(Feature.device_name, 1, [len(name)])
+            if not frag:
+                return None
+            name += frag[4:4+name_length - len(name)]
+        return name.decode('utf-8')
+
+
+class AsyncOnboardProfile(OnboardGeometry):
+    """awaitable interface to feature 0x8100, see FeatureOnboardProfile
+    """
+    def __init__(self, dev):
+        self.dev = dev
+        self.write_lock = asyncio.Lock()
+
+    @classmethod
+    async def open(cls, dev):
+        """read geometry and the profile directory
+
+        Args:
+            dev (AsyncLogiHPP20): the device
+
+        Returns:
+            AsyncOnboardProfile: the interface
+        """
+        self = cls(dev)
+        assert await dev.has_feature(Feature.onboard_profile), 'unsupported device: no onboard profiles!'
+        data = await dev.call_feature(Feature.onboard_profile, 0, [0])
+        self.load_info(data[4:])
+        self.extended_report_rate = await dev.has_feature(Feature.extended_report_rate)
+        self.load_directory(await self.read_memory_page(0))
+        return self
+
+    async def read_memory_page(self, page, verify = True):
+        ret = bytearray(self.page_size)
+        for i in range(0, int(self.page_size/16)):
+            out = await self.dev.call_feature(Feature.onboard_profile, 5, ADDRESS.pack(page, i*16))
+            assert out, f'error while reading memory page: {page}'
+            ret[i*16:i*16+16] = memoryview(out)[4:20]
+        if verify:
+            assert crc16_ccitt(ret[:-2]) == struct.unpack('>H', ret[-2:])[0], f'checksum error while reading memory page: {page}'
+        return ret
+
+    async def write_memory_page(self, page, data, verify = True):
+        assert len(data) == self.page_size, 'wrong data size!'
+        if verify:
+            data = data[:-2] + struct.pack('>H', crc16_ccitt(data[:-2]))
+        #one write sequence at a time per device
+        async with self.write_lock:
+            out = await self.dev.call_feature(Feature.onboard_profile, 6, list(struct.pack('>HHH', page, 0, len(data))))
+            assert out, f'error while writing memory page: {page}'
+            for i in range(int(len(data)/16)):
+                out = await self.dev.call_feature(Feature.onboard_profile, 7, list(data[i*16:i*16+16]))
+                assert out, f'error while writing memory page: {page}'
+            out = await self.dev.call_feature(Feature.onboard_profile, 8)
+            assert out, f'error while writing memory page: {page}'
+
+    async def load_profile_image(self, profile_index):
+        """read a profile page and the macro pages it points to
+
+        Args:
+            profile_index (int): profile index, starting from 1
+
+        Returns:
+            OnboardProfileImage: pages for Profile to decode
+        """
+        assert self.profile_list[profile_index]['page'] == profile_index, f'profile {profile_index} is disabled!'
+        page = self.page_layout[profile_index][0]
+        pages = {page: await self.read_memory_page(page)}
+        p = Profile(self)
+        p.load_profile_bin(pages[page])
+        for x in sorted(p.macro_pages(self.page_layout[profile_index])):
+            pages[x] = await self.read_memory_page(x, False)
+        return OnboardProfileImage(self, pages)
+
+    async def profile_to_json(self, profile_index):
+        image = await self.load_profile_image(profile_index)
+        return image.profile_bin_to_json(image.read_memory_page(self.page_layout[profile_index][0]))
+
+    async def profile_save(self, profile_index, j):
+        """encode json and write the profile page and macro pages
+
+        Args:
+            profile_index (int): profile index, starting from 1
+            j (dict): profile json
+        """
+        assert self.profile_list[profile_index]['page'] == profile_index, f'profile {profile_index} is disabled!'
+        data = ProfileCache().compile(self, j, profile_index)
+        #macro pages first, so the profile never points at a half written macro
+        for i, macro in enumerate(data[1:], 1):
+            await self.write_memory_page(self.page_layout[profile_index][i], macro, False)
+        await self.write_memory_page(self.page_layout[profile_index][0], data[0])
+
+    async def get_current_profile(self):
+        data = await self.dev.call_feature(Feature.onboard_profile, 4, [0])
+        return data[5]
+
+    async def set_current_profile(self, profile_index):
+        assert profile_index in range(1, self.num_profiles+1), f'wrong profile index! {profile_index}'
+        await self.dev.call_feature(Feature.onboard_profile, 3, [0, profile_index, 0])
+
+    async def get_onboard_mode(self):
+        data = await self.dev.call_feature(Feature.onboard_profile, 2)
+        return data[4] == 1
+
+    async def set_onboard_mode(self, mode = True):
+        await self.dev.call_feature(Feature.onboard_profile, 1, [1 if mode else 2])
@@ -0,0 +1,71 @@
+import hashlib, json, os
+
+
+class WriteJournal:
+    """record the target image and per-page completion of a multi-page write,
+        so an interrupted import resumes with only the remaining pages.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.state = None
+
+    @staticmethod
+    def for_device(folder, dev, profile_index):
+        """journal file for one profile of one device
+
+        Args:
+            folder (str): journal folder
+            dev (LogiHPP20): the device
+            profile_index (int): profile index
+
+        Returns:
+            WriteJournal: the journal
+        """
+        os.makedirs(folder, exist_ok = True)
+        serial = ''.join(x for x in str(dev.hidpp20_info('serial')) if x.isalnum()) or 'device'
+        return WriteJournal(os.path.join(folder, f'{serial}-{dev.device_index:02x}-p{profile_index}.json'))
+
+    @staticmethod
+    def image_hash(pages):
+        h = hashlib.sha256()
+        for page, data, verify in pages:
+            h.update(bytes([page >> 8, page & 0xFF, verify]) + bytes(data))
+        return h.hexdigest()
+
+    def start(self, pages):
+        """start or resume writing pages
+
+        Args:
+            pages (list): (page index, data, verify) in write order
+
+        Returns:
+            list: pages still to write
+        """
+        target = self.image_hash(pages)
+        if os.path.isfile(self.filename):
+            with open(self.filename, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('hash') == target:
+                self.state = state
+                pending = [x for x in pages if x[0] not in self.state['done']]
+                print(f'resume from {self.filename}: {len(pages) - len(pending)}/{len(pages)} pages already written')
+                return pending
+            print(f'journal {self.filename} is for a different image, start over')
+        self.state = {'hash': target, 'pages': [[page, bytes(data).hex(), verify] for page, data, verify in pages], 'done': []}
+        self._save()
+        return list(pages)
+
+    def done(self, page):
+        self.state['done'].append(page)
+        self._save()
+
+    def finish(self):
+        if os.path.isfile(self.filename):
+            os.remove(self.filename)
+        self.state = None
+
+    def _save(self):
+        tmp = self.filename + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.filename)
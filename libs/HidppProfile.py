@@ -2,6 +2,7 @@ from .HidppConstants import *
 import struct, io
 from .utils import crc16_ccitt, pretty_list
 from .HidppMacro import Macro
+from .Timings import span
 
 class Profile:
     def __init__(self, x8100):
@@ -46,6 +47,22 @@ class Profile:
         #read last 2 bytes as checksum 
         self.checksum = struct.unpack('>H', file.read(2))[0]
         return
+
+    def macro_pages(self, layout):
+        """memory pages the macros of a loaded profile may be in, empty if it has no macros
+
+        Args:
+            layout (list): page layout of the profile, [profile page, macro pages...]
+
+        Returns:
+            set: page indexes
+        """
+        pages = set()
+        for x in self.buttons + self.buttons_gshift:
+            if x.startswith('00'):
+                pages.add(int(x[:4], 16))
+                pages.update(layout[1:])
+        return pages
     
     def _rgb_to_json(self, data):
         try:
@@ -135,7 +152,8 @@ class Profile:
         elif keystr.startswith('00'):
             ret['action'] = 'macro'
             ret['bytes'] = struct.pack('>I', keyval).hex()            
-            data = Macro.read_macro_bytes(self.x8100, keyval)
+            with span('read macro'):
+                data = Macro.read_macro_bytes(self.x8100, keyval)
             ret['value'] = Macro.macro_bin_to_text(data)
         else:
             ret['action'] = 'unknown'
@@ -264,8 +282,8 @@ class Profile:
 
         #calculated page map, allow manual override.
         idx = 1
-        page = bytearray(b'\xFF'*256)
         size = self.x8100.page_size
+        page = bytearray(b'\xFF'*size)
         for macro in macro_rec:
             data = macro[1] #array of ops
             ret[0][macro[0]:macro[0]+4] = bytearray([0, page_map[profile_index][idx], 0, pos])
@@ -285,6 +303,8 @@ class Profile:
                     pos = 0
             page[pos] = MacroControl.macro_end
             pos += 1
-        ret.append(page)
+        #macro pages only if the profile has macros
+        if macro_rec:
+            ret.append(page)
         return ret
     
@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+from .LogiHPP20 import LogiHPP20, load_hid
+from .HidppTransport import HidppTransport
+
+
+class ReceiverSession:
+    """share one receiver handle between all paired devices.
+
+        replies are routed by device index (and swid, see HidppTransport),
+        so each slot can run its own requests concurrently.
+    """
+    def __init__(self, pid, serial = ''):
+        """open the receiver
+
+        Args:
+            pid (int): receiver usb pid
+            serial (str, optional): receiver serial number. Defaults to ''.
+        """
+        hid = load_hid()
+        list_short, list_long, _ = LogiHPP20.find_interfaces(pid, serial)
+        assert list_long, f'error while opening receiver 0x{pid:04X}'
+        self.pid = pid
+        port = hid.Device(path = list_long[0][0])
+        #absent slots reply with a short hid++ 1.0 error, read it so probes don't wait for the timeout
+        extra_ports = [hid.Device(path = list_short[0][0])] if list_short and list_short[0][0] != list_long[0][0] else []
+        self.transport = HidppTransport(port, extra_ports)
+        self.devices = {}
+
+    def device(self, device_index):
+        """get the device object for one slot. an empty slot is probed with the probe timeout and no retries,
+            a paired device keeps its usual timeout and retries, see LogiHPP20.probing()
+
+        Args:
+            device_index (int): receiver slot, 1-6
+
+        Returns:
+            LogiHPP20: device on the shared handle, None if the slot is empty
+        """
+        if device_index not in self.devices:
+            dev = LogiHPP20(transport = self.transport, index_list = [device_index])
+            if not dev.product_name:
+                return None
+            #usb pid, as for devices opened directly
+            dev.product_id = self.pid
+            self.devices[device_index] = dev
+        return self.devices[device_index]
+
+    def probe(self, index_list = [1, 2, 3, 4, 5, 6]):
+        """probe slots concurrently
+
+        Args:
+            index_list (list, optional): slots to probe. Defaults to [1, 2, 3, 4, 5, 6].
+
+        Returns:
+            dict: slot index => LogiHPP20 for paired devices
+        """
+        with ThreadPoolExecutor(max_workers = len(index_list)) as pool:
+            found = list(pool.map(self.device, index_list))
+        ret = {i: dev for i, dev in zip(index_list, found) if dev is not None}
+        for i, dev in ret.items():
+            print(f'{dev.product_name} at receiver 0x{self.pid:04X} sub-id {i}')
+        return ret
+
+    def close(self):
+        self.transport.close()
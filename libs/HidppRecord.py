@@ -0,0 +1,169 @@
+import json, queue, struct, threading, time
+from .HidppTransport import HidppTransport
+
+#file: magic, metadata json, then records of (time, direction, length, data)
+MAGIC = b'OMMR\x01'
+RECORD = struct.Struct('>dBB')
+WRITE = 0
+READ = 1
+
+
+class RecordingPort:
+    """wrap an opened hid.Device and save every report written and read, with timestamps
+    """
+    def __init__(self, port, filename, meta = {}):
+        """
+        Args:
+            port (hid.Device): port to wrap
+            filename (str): recording file
+            meta (dict, optional): device info saved in the header, e.g. device_index. Defaults to {}.
+        """
+        self.port = port
+        self.lock = threading.Lock()
+        self.file = open(filename, 'wb')
+        meta = dict(meta, product = port.product, serial = port.serial)
+        header = json.dumps(meta).encode('utf-8')
+        self.file.write(MAGIC + struct.pack('>H', len(header)) + header)
+        self.start = time.perf_counter()
+
+    @property
+    def product(self):
+        return self.port.product
+
+    @property
+    def serial(self):
+        return self.port.serial
+
+    def _save(self, direction, data, t):
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(RECORD.pack(t - self.start, direction, len(data)) + bytes(data))
+
+    def write(self, data):
+        t = time.perf_counter()
+        ret = self.port.write(data)
+        self._save(WRITE, data, t)
+        return ret
+
+    def read(self, size = 255, timeout = None):
+        data = self.port.read(size = size, timeout = timeout)
+        if data:
+            self._save(READ, data, time.perf_counter())
+        return data
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+        self.port.close()
+
+
+def load_recording(filename):
+    """load a recording file
+
+    Args:
+        filename (str): recording file
+
+    Returns:
+        tuple: (metadata dict, list of (time, direction, bytes))
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    assert data.startswith(MAGIC), f'not a recording file: {filename}'
+    pos = len(MAGIC)
+    length = struct.unpack('>H', data[pos:pos+2])[0]
+    meta = json.loads(data[pos+2:pos+2+length].decode('utf-8'))
+    pos += 2 + length
+    records = []
+    while pos < len(data):
+        t, direction, length = RECORD.unpack_from(data, pos)
+        pos += RECORD.size
+        records.append((t, direction, data[pos:pos+length]))
+        pos += length
+    return meta, records
+
+
+class ReplayPort:
+    """serve a recording back as if it was the device. use with LogiHPP20(port = ...).
+
+        each write is matched to the next same write in the recording, ignoring the software id,
+        its replies are returned by read(). replies are matched to their write by device index, feature index,
+        function and software id, so pipelined requests get their own replies back.
+    """
+    def __init__(self, filename, timing = False):
+        """
+        Args:
+            filename (str): recording file
+            timing (bool, optional): delay replies by the recorded round trip time. Defaults to False.
+        """
+        self.meta, records = load_recording(filename)
+        self.timing = timing
+        #group replies by the write they answer, with their delay from the write
+        self.requests = []
+        #request key => latest write with it, a write with the same key replaces a request that timed out
+        waiting = {}
+        for t, direction, data in records:
+            if direction == WRITE:
+                waiting[(data[1], data[2], data[3] >> 4, data[3] & 0xF)] = len(self.requests)
+                self.requests.append((data, t, []))
+            elif self.requests:
+                key = HidppTransport.reply_key(data)[0] if len(data) >= 5 else None
+                #notifications and stale replies go with the last write, as they were read
+                i = waiting.pop(key, len(self.requests) - 1)
+                self.requests[i][2].append((t - self.requests[i][1], data))
+        self.pos = 0
+        self.lock = threading.Lock()
+        self.replies = queue.Queue()
+
+    @property
+    def product(self):
+        return self.meta.get('product', '')
+
+    @property
+    def serial(self):
+        return self.meta.get('serial', '')
+
+    @property
+    def device_index(self):
+        return self.meta.get('device_index', 0xFF)
+
+    @staticmethod
+    def _request_key(data):
+        #ignore the software id, it depends on how many requests were sent before
+        return data[:3] + bytes([data[3] & 0xF0]) + data[4:]
+
+    @staticmethod
+    def _with_swid(reply, request):
+        reply = bytearray(reply)
+        if reply[2] in [0xFF, 0x8F] and reply[3] == request[2]:
+            reply[4] = request[3]
+        elif reply[1:3] == request[1:3] and reply[3] >> 4 == request[3] >> 4:
+            reply[3] = request[3]
+        return bytes(reply)
+
+    def write(self, data):
+        data = bytes(data)
+        key = self._request_key(data)
+        with self.lock:
+            for i in range(self.pos, len(self.requests)):
+                if self._request_key(self.requests[i][0]) == key:
+                    break
+            else:
+                raise Exception(f'replay: request not in recording: {data.hex()}')
+            self.pos = i + 1
+            now = time.perf_counter()
+            for delay, reply in self.requests[i][2]:
+                self.replies.put((now + delay if self.timing else 0, self._with_swid(reply, data)))
+        return len(data)
+
+    def read(self, size = 255, timeout = None):
+        try:
+            due, reply = self.replies.get(timeout = None if timeout is None else timeout / 1000)
+        except queue.Empty:
+            return b''
+        wait = due - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        return reply
+
+    def close(self):
+        pass
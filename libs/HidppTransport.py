@@ -0,0 +1,181 @@
+import threading, time
+
+
+class HidppTransport:
+    """thread safe hid++ transport, shared by every caller of a device or receiver.
+
+        each request gets its own software id (1-15), a reader thread routes replies to the waiting
+        caller by (device index, feature index, function, swid). reports with swid 0 are notifications
+        from the device and go to subscribers.
+    """
+    def __init__(self, port, extra_ports = []):
+        """start the reader thread(s)
+
+        Args:
+            port (hid.Device): long report port, all requests are written here
+            extra_ports (list, optional): other ports to read from, e.g. the short report port
+                    where receivers send hid++ 1.0 errors. Defaults to [].
+        """
+        self.port = port
+        self.ports = [port] + list(extra_ports)
+        self.lock = threading.Lock()
+        #signaled when a swid is free again
+        self.released = threading.Condition(self.lock)
+        self.write_lock = threading.Lock()
+        self.pending = {}
+        self.subscribers = []
+        self.swid = 0
+        self.stale = 0
+        self.running = True
+        self.readers = []
+        for p in self.ports:
+            t = threading.Thread(target = self._reader, args = (p,), daemon = True)
+            t.start()
+            self.readers.append(t)
+
+    @staticmethod
+    def reply_key(data):
+        """routing key of a report
+
+        Args:
+            data (bytes): report
+
+        Returns:
+            tuple: (key, is_error)
+        """
+        if data[2] in [0xFF, 0x8F]:
+            #hid++ 2.0 / 1.0 error, the request's feature index and function are in byte 3, 4
+            return (data[1], data[3], data[4] >> 4, data[4] & 0xF), True
+        return (data[1], data[2], data[3] >> 4, data[3] & 0xF), False
+
+    def _reader(self, port):
+        while self.running:
+            try:
+                data = port.read(size = 255, timeout = 100)
+            except Exception:
+                break
+            if len(data) < 5:
+                continue
+            key, error = self.reply_key(data)
+            with self.lock:
+                waiter = self.pending.pop(key, None)
+                if waiter is not None:
+                    self.released.notify_all()
+            if waiter is not None:
+                waiter[1] = None if error else data
+                waiter[0].set()
+            elif key[3] == 0 and not error:
+                self._notify(data)
+            else:
+                #late reply of a timed out request
+                self.stale += 1
+
+    def _notify(self, data):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for device_index, feature_index, callback in subscribers:
+            if device_index in [None, data[1]] and feature_index in [None, data[2]]:
+                callback(data)
+
+    def request(self, data, read_back = True, timeout = 5000, port = None):
+        """send a request and wait for its reply. safe to call from many threads.
+
+        Args:
+            data (list): report, byte 3 is function << 4, the swid is filled in here
+            read_back (bool, optional): wait for the reply. Defaults to True.
+            timeout (int, optional): in ms. Defaults to 5000.
+            port (hid.Device, optional): one of the ports, for short or very long reports. Defaults to the long port.
+
+        Returns:
+            bytes: reply, None on error or timeout
+        """
+        token = self.submit(data, read_back, port, timeout)
+        return self.wait(token, timeout) if read_back else []
+
+    def submit(self, data, read_back = True, port = None, timeout = 5000):
+        """send a request without waiting, for pipelined requests
+
+        Args:
+            data (list): report, the swid is filled in here
+            read_back (bool, optional): expect a reply. Defaults to True.
+            port (hid.Device, optional): port to write to. Defaults to the long port.
+            timeout (int, optional): in ms, how long to wait for a free swid when 15 requests of the same
+                    function are in flight. Defaults to 5000.
+
+        Returns:
+            tuple: token for wait(), fails at once if no swid got free in time
+        """
+        data = bytearray(data)
+        waiter = None
+        deadline = time.perf_counter() + timeout / 1000
+        with self.lock:
+            while True:
+                for _ in range(15):
+                    self.swid = self.swid % 15 + 1
+                    key = (data[1], data[2], data[3] >> 4, self.swid)
+                    if key not in self.pending:
+                        break
+                else:
+                    key = None
+                wait = deadline - time.perf_counter()
+                if key is not None or not read_back or wait <= 0:
+                    break
+                #other threads have every swid of this function in flight
+                self.released.wait(wait)
+            if key is None and read_back:
+                event = threading.Event()
+                event.set()
+                return None, [event, None]
+            data[3] = data[3] & 0xF0 | self.swid
+            if read_back:
+                waiter = [threading.Event(), None]
+                self.pending[key] = waiter
+        with self.write_lock:
+            (port or self.port).write(bytes(data))
+        return key, waiter
+
+    def wait(self, token, timeout = 5000):
+        """wait for the reply of a submitted request
+
+        Args:
+            token (tuple): from submit()
+            timeout (int, optional): in ms. Defaults to 5000.
+
+        Returns:
+            bytes: reply, None on error or timeout
+        """
+        key, waiter = token
+        if not waiter[0].wait(timeout / 1000):
+            with self.lock:
+                if self.pending.pop(key, None) is not None:
+                    self.released.notify_all()
+            return None
+        return waiter[1]
+
+    def subscribe(self, callback, device_index = None, feature_index = None):
+        """receive notifications
+
+        Args:
+            callback (function): called with the report, from the reader thread
+            device_index (int, optional): only this device. Defaults to None for all.
+            feature_index (int, optional): only this feature index. Defaults to None for all.
+
+        Returns:
+            tuple: handle for unsubscribe()
+        """
+        handle = (device_index, feature_index, callback)
+        with self.lock:
+            self.subscribers.append(handle)
+        return handle
+
+    def unsubscribe(self, handle):
+        with self.lock:
+            if handle in self.subscribers:
+                self.subscribers.remove(handle)
+
+    def close(self):
+        self.running = False
+        for t in self.readers:
+            t.join()
+        for p in self.ports:
+            p.close()
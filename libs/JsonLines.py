@@ -0,0 +1,50 @@
+import json, threading
+
+
+class JsonLines:
+    """one compact json object per line, written and flushed as soon as it is ready. safe to share between threads.
+    """
+    def __init__(self, file, macros = False):
+        """
+        Args:
+            file (file): opened text file, e.g. sys.stdout
+            macros (bool, optional): stream_profiles also writes one line per macro button. Defaults to False.
+        """
+        self.file = file
+        self.macros = macros
+        self.lock = threading.Lock()
+
+    def write(self, obj):
+        line = json.dumps(obj, ensure_ascii = False, separators = (',', ':')) + '\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+
+def stream_profiles(omm, out):
+    """decode every enabled profile of a device and write one line each, one at a time
+
+    Args:
+        omm (FeatureOnboardProfile): the device
+        out (JsonLines): output
+
+    Returns:
+        int: number of profiles written
+    """
+    dev = omm.dev
+    device = {'serial': dev.hidpp20_info('serial'), 'pid': f'0x{dev.product_id:04x}', 'index': dev.device_index,
+              'name': dev.product_name}
+    count = 0
+    for profile_index in range(1, omm.num_profiles + 1):
+        omm.dest_profile = profile_index
+        if not omm.profile_enabled:
+            continue
+        j = omm.profile_bin_to_json(omm.onboard_profile_to_bin())
+        out.write(dict(device, type = 'profile', profile = profile_index, settings = j))
+        count += 1
+        if out.macros:
+            for key in ['buttons', 'buttons_gshift']:
+                for i, x in enumerate(j[key]):
+                    if x['action'] == 'macro':
+                        out.write(dict(device, type = 'macro', profile = profile_index, button = f'{key}[{i}]', value = x['value']))
+    return count
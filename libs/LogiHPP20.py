@@ -1,21 +1,43 @@
-import sys, os, struct
+import sys, os, struct, time, collections, ctypes, contextlib
 from .HidppFeatures import Feature
-from .utils import pretty_list, pretty_list2
-if sys.platform == 'win32':
-    if struct.calcsize("P") * 8 == 64:
-        os.add_dll_directory(os.path.dirname(os.path.abspath(__file__)) + '/x64')
-    else:
-        os.add_dll_directory(os.path.dirname(os.path.abspath(__file__)) + '/x86')
+from .utils import pretty_list, pretty_list2, percentile
+from .Timings import timings, span
 
 #hid.dll binary from
 #https://github.com/libusb/hidapi
 
 #py hid binding:
 #https://github.com/apmorton/pyhidapi
-import hid
+hid = None
+
+def load_hid():
+    """import the hid binding on first use, loading the hidapi library is slow
+
+    Returns:
+        module: hid
+    """
+    global hid
+    if hid is None:
+        if sys.platform == 'win32':
+            if struct.calcsize("P") * 8 == 64:
+                os.add_dll_directory(os.path.dirname(os.path.abspath(__file__)) + '/x64')
+            else:
+                os.add_dll_directory(os.path.dirname(os.path.abspath(__file__)) + '/x86')
+        import hid as _hid
+        hid = _hid
+    return hid
+
+#report id, device index, feature index, function << 4 | swid
+HEADER = struct.Struct('>BBBB')
+#padding for reports, sliced without copying
+ZEROS = memoryview(bytes(64))
 
 class LogiHPP20:
-    def __init__(self, pid = 0, name = '', index_list = []):
+    #report id => report size
+    REPORT_SIZE = {0x10: 7, 0x11: 20, 0x12: 64}
+    REPORT_NAME = {0x10: 'short_reports', 0x11: 'long_reports', 0x12: 'very_long_reports'}
+
+    def __init__(self, pid = 0, name = '', index_list = [], serial = '', port = None, transport = None):
         """init hidpp device
 
         Args:
@@ -23,10 +45,13 @@ class LogiHPP20:
             name (str): partial name string
             index_list (list, optional): a list of possible connection id. 
                     0 for bluetooth, 0xFF for wired, 1-6 for receiver. Defaults to [0xFF].
+            serial (str, optional): only open the usb device with this serial number.
+            port (optional): an opened long report port, skip enumeration and bind to index_list[0].
+            transport (HidppTransport, optional): a transport shared with other devices, e.g. behind one receiver.
+                    skip enumeration and bind to index_list[0]. see HidppReceiver.ReceiverSession
         """
-        assert pid > 0 or name, 'error: pid or name muse be set'
+        assert pid > 0 or name or port is not None or transport is not None, 'error: pid or name muse be set'
         self.debug = False
-        vid = 0x046D
         self.swid = 0xF
         self.port_short = None
         self.port_long = None
@@ -35,75 +60,331 @@ class LogiHPP20:
         self.SHORT_REGS = [0x80, 0x81]  #RAP registers: 80 set 81 get
         self.LONG_REGS = [0x82, 0x83]   #82 set 83 get
         self.product_name = ''
+        self.product_id = 0
         self.feature_index = {0:0}
+        #read timeout in ms, retries and backoff(s) for lost or failed replies
+        self.timeout = 5000
+        #tuned timeouts never go below min_timeout. after retune_after requests in a row
+        #timed out the timeout is doubled and on_stale_tuning() called, see DeviceCache. 0 to disable
+        self.min_timeout = 300
+        self.retune_after = 3
+        self.timeout_streak = 0
+        self.on_stale_tuning = None
+        #onboard memory writes can take long to commit to flash, never tuned down
+        self.flash_timeout = 5000
+        self.retries = 3
+        self.backoff = 0.01
+        self.max_backoff = 0.2
+        #one preallocated report per type, reused by every request on the direct path.
+        #written through a c_char array, which hid_write takes without a copy
+        self.buffers = {k: bytearray(v) for k, v in self.REPORT_SIZE.items()}
+        self.reports = {k: (ctypes.c_char * len(v)).from_buffer(v) for k, v in self.buffers.items()}
+        self.stats = {'requests': 0, 'retries': 0, 'timeouts': 0, 'errors': 0, 'drained': 0,
+                      'crc_failures': 0, 'page_retries': 0,
+                      #onboard memory i/o, see FeatureOnboardProfile. time in seconds
+                      'page_reads': 0, 'read_bytes': 0, 'read_time': 0.0,
+                      'page_writes': 0, 'write_bytes': 0, 'write_time': 0.0,
+                      'short_reports': 0, 'long_reports': 0, 'very_long_reports': 0, 'bytes_sent': 0}
+        #timeout for probing possibly empty slots in ms, requests in flight for bulk i/o, see tune()
+        self.probe_timeout = 500
+        self.pipeline_depth = 1
+        #recent round trip times in seconds
+        self.rtt = collections.deque(maxlen = 1000)
+        self.transport = transport
+        self.shared = transport is not None
+        timings.watch(self)
+        if transport is not None:
+            port = transport.port
+        if port is not None:
+            self.port_long = port
+            self.device_index = index_list[0]
+            with self.probing():
+                self.product_name = self.get_device_name() or ''
+            return
+        with span('enumerate'):
+            list_short, list_long, list_very_long = self.find_interfaces(pid, serial)
+        with span('detect device'):
+            path_long, dev_name_hidpp, product_id = self.detect_device(list_long, name, index_list)
+        assert list_long and path_long, 'error while opening device!'
+        with span('open ports'):
+            self.port_long = hid.Device(path=path_long)
+            #short and very long reports, if the device has them
+            self.port_short = self.open_port(list_short, path_long, product_id)
+            self.port_very_long = self.open_port(list_very_long, path_long, product_id)
+        self.product_name = dev_name_hidpp
+        self.product_id = product_id
+        print(f'{dev_name_hidpp} pid 0x{product_id:04X} at 0x{self.device_index:02X}')
+        #print('device info', self.device_index, dev_name_hidpp,'\n')
+
+    @staticmethod
+    def find_interfaces(pid = 0, serial = ''):
+        """find hid++ interfaces by report id in the report descriptor
+
+        Args:
+            pid (int, optional): usb pid. Defaults to 0.
+            serial (str, optional): usb serial number. Defaults to ''.
+
+        Returns:
+            tuple: (short, long, very long) lists of (path, pid, serial). an interface with many report ids is in many lists.
+        """
+        load_hid()
         list_short = []
         list_long = []
         list_very_long = []
-        devs = hid.enumerate(vid = vid, pid = pid)
+        devs = hid.enumerate(vid = 0x046D, pid = pid)
         #print(devs)
         for dev in devs:
+            if serial and dev['serial_number'] != serial:
+                continue
             if dev['usage_page'] >= 0xFF00:
                 h = hid.Device(path = dev['path'])
-                data = h.get_report_descriptor()
-                if len(data) > 10 and 0x85 in data:
-                    if data[data.index(0x85)+1] == 0x10:
-                        list_short.append((dev['path'], dev['product_id']))
-                    elif data[data.index(0x85)+1] == 0x11:
-                        list_long.append((dev['path'], dev['product_id']))
-                    elif data[data.index(0x85)+1] == 0x12: #64bytes??
-                        list_very_long.append((dev['path'], dev['product_id']))
+                report_ids = LogiHPP20.report_ids(h.get_report_descriptor())
                 h.close()
-        path_long, dev_name_hidpp, product_id = self.detect_device(list_long, name, index_list)
-        assert list_long and path_long, 'error while opening device!'
-        self.port_long = hid.Device(path=path_long)
-        print(f'{dev_name_hidpp} pid 0x{product_id:04X} at 0x{self.device_index:02X}')
-        #print('device info', self.device_index, dev_name_hidpp,'\n')
+                entry = (dev['path'], dev['product_id'], dev['serial_number'])
+                if 0x10 in report_ids:
+                    list_short.append(entry)
+                if 0x11 in report_ids:
+                    list_long.append(entry)
+                if 0x12 in report_ids: #64bytes
+                    list_very_long.append(entry)
+        return list_short, list_long, list_very_long
+
+    @staticmethod
+    def report_ids(descriptor):
+        """report ids declared in a hid report descriptor
+
+        Args:
+            descriptor (bytes): report descriptor
+
+        Returns:
+            list: report ids
+        """
+        ret = []
+        i = 0
+        while i < len(descriptor):
+            prefix = descriptor[i]
+            if prefix == 0xFE:
+                #long item: size, tag, data
+                i += 3 + (descriptor[i+1] if i+1 < len(descriptor) else 0)
+                continue
+            size = [0, 1, 2, 4][prefix & 3]
+            if prefix == 0x85 and i+1 < len(descriptor):
+                ret.append(descriptor[i+1])
+            i += 1 + size
+        return ret
+
+    def open_port(self, path_list, path_long, pid):
+        """open another report type of the device on the long port
+
+        Args:
+            path_list (list): from find_interfaces()
+            path_long (bytes): path of the long port
+            pid (int): usb pid
+
+        Returns:
+            hid.Device: the port, port_long if it is the same interface, None if not found
+        """
+        serial = self.port_long.serial
+        for path, _pid, _serial in path_list:
+            if path == path_long:
+                return self.port_long
+            if _pid == pid and _serial == serial:
+                return hid.Device(path = path)
+        return None
+
+    def open_ports(self):
+        """
+        Returns:
+            list: opened ports, each once, long port first
+        """
+        ret = []
+        for p in [self.port_long, self.port_short, self.port_very_long]:
+            if p is not None and all(p is not x for x in ret):
+                ret.append(p)
+        return ret
+
+    def frame(self, device_index, feature_idx, func_swid, params):
+        """pack a request into the smallest report type that fits it and the device supports.
+
+            on the direct path the report is this device's preallocated buffer of that type,
+            valid until the next request.
+
+        Args:
+            device_index (int): device index
+            feature_idx (int): feature index
+            func_swid (int): function << 4 | software id
+            params (list or bytes): params
+
+        Returns:
+            tuple: (report to write, port to write it to)
+        """
+        #reports are zero padded, trailing zeros don't need the room
+        size = len(params)
+        while size and not params[size-1]:
+            size -= 1
+        if size <= 3 and self.port_short is not None:
+            report_id, port = 0x10, self.port_short
+        elif size <= 16:
+            report_id, port = 0x11, self.port_long
+        elif size <= 60 and self.port_very_long is not None:
+            report_id, port = 0x12, self.port_very_long
+        else:
+            raise Exception(f'request too long for this device: {size} bytes of params')
+        length = self.REPORT_SIZE[report_id]
+        if self.transport is not None:
+            #shared between threads, the transport takes its own copy
+            buf = report = bytearray(length)
+        else:
+            buf, report = self.buffers[report_id], self.reports[report_id]
+        HEADER.pack_into(buf, 0, report_id, device_index, feature_idx, func_swid)
+        n = min(len(params), length - 4)
+        buf[4:4+n] = params if n == len(params) else params[:n]
+        buf[4+n:] = ZEROS[:length-4-n]
+        self.stats[self.REPORT_NAME[report_id]] += 1
+        self.stats['bytes_sent'] += length
+        return report, port
+
+    def report_usage(self):
+        """
+        Returns:
+            dict: number of requests sent per report type, and bytes sent
+        """
+        return {k: self.stats[k] for k in ['short_reports', 'long_reports', 'very_long_reports', 'bytes_sent']}
 
     def close(self):
-        for p in [self.port_short, self.port_long, self.port_very_long]:
-            if p is not None:
-                p.close()
+        timings.unwatch(self)
+        if self.shared:
+            #owned by the receiver session
+            return
+        ports = self.open_ports()
+        if self.transport is not None:
+            #closes its own ports
+            self.transport.close()
+            ports = [p for p in ports if p not in self.transport.ports]
+        for p in ports:
+            p.close()
+        self.port_short = self.port_long = self.port_very_long = None
+
+    def record(self, filename):
+        """save every report from now on to a recording file, see HidppRecord.ReplayPort
+
+        Args:
+            filename (str): recording file
+        """
+        from .HidppRecord import RecordingPort
+        assert self.transport is None, 'start recording before share()'
+        #long reports only, the same requests as replay with a single port
+        for p in self.open_ports()[1:]:
+            p.close()
+        self.port_short = self.port_very_long = None
+        self.port_long = RecordingPort(self.port_long, filename, {'device_index': self.device_index})
+        #replay starts with the same requests as LogiHPP20(port = ReplayPort(...))
+        self.feature_index = {0:0}
+        self.get_device_name()
+
+    def share(self):
+        """switch to a thread safe transport, so many threads can call this device at the same time
+            and notifications can be subscribed.
+
+        Returns:
+            HidppTransport: the transport
+        """
+        if self.transport is None:
+            from .HidppTransport import HidppTransport
+            self.transport = HidppTransport(self.port_long, self.open_ports()[1:])
+        return self.transport
+
+    def subscribe(self, feature_val, callback):
+        """receive notifications of a feature
+
+        Args:
+            feature_val (int): feature id
+            callback (function): called with the report, from the reader thread
+
+        Returns:
+            tuple: handle for unsubscribe(), None if the feature is not supported
+        """
+        feature_idx = self.find_feature_index(feature_val)
+        if feature_idx == 0xFF:
+            return None
+        return self.share().subscribe(callback, self.device_index, feature_idx)
+
+    def unsubscribe(self, handle):
+        if self.transport is not None and handle is not None:
+            self.transport.unsubscribe(handle)
+
+    @contextlib.contextmanager
+    def probing(self):
+        """an empty slot never replies, don't retry or wait long while probing, and don't take it for a stale tuning.
+            restores retries and timeout
+        """
+        retries, self.retries = self.retries, 0
+        timeout, self.timeout = self.timeout, min(self.timeout, self.probe_timeout)
+        retune_after, self.retune_after = self.retune_after, 0
+        try:
+            yield
+        finally:
+            self.retries = retries
+            self.timeout = timeout
+            self.retune_after = retune_after
 
     def detect_device(self, long_path_list, name, _dev_index_list):
         path_long = None
         dev_name_hidpp = ''
         product_id = ''
-        for path, pid in long_path_list:
-            if path_long:
-                break
-            dev = hid.Device(path=path)
-            self.port_long = dev
-            is_receiver = 'receiver' in dev.product.lower()
-            if not _dev_index_list:
-                dev_index_list = [1,2,3,4,5,6] if is_receiver else [255,0]
-            else:
-                dev_index_list = _dev_index_list
-            for i in dev_index_list:
-                if is_receiver:
-                    print(f'checking receiver 046D:{pid:04X} sub-id {i}')
-                self.device_index = i            
-                dev_name = self.get_device_name()
-                if not dev_name:
-                    continue
-                #print(f'{dev_name} at {i}')
-                if (name and name in dev_name) or not name:
-                    path_long = path
-                    dev_name_hidpp = dev_name
-                    product_id = pid
+        with self.probing():
+            for path, pid, _ in long_path_list:
+                if path_long:
                     break
-            dev.close()
+                dev = hid.Device(path=path)
+                self.port_long = dev
+                is_receiver = 'receiver' in dev.product.lower()
+                if not _dev_index_list:
+                    dev_index_list = [1,2,3,4,5,6] if is_receiver else [255,0]
+                else:
+                    dev_index_list = _dev_index_list
+                for i in dev_index_list:
+                    if is_receiver:
+                        print(f'checking receiver 046D:{pid:04X} sub-id {i}')
+                    self.device_index = i            
+                    dev_name = self.get_device_name()
+                    if not dev_name:
+                        continue
+                    #print(f'{dev_name} at {i}')
+                    if (name and name in dev_name) or not name:
+                        path_long = path
+                        dev_name_hidpp = dev_name
+                        product_id = pid
+                        break
+                dev.close()
         return path_long, dev_name_hidpp, product_id
         
     @staticmethod
-    def list_devices(pid = 0):
+    def enumerate_devices(pid = 0):
+        """list Logitech usb devices, one entry per serial number
+
+        Args:
+            pid (int, optional): usb pid, 0 for all. Defaults to 0.
+
+        Returns:
+            list[dict]: hid.enumerate() entries
+        """
+        load_hid()
         devs = hid.enumerate(vid = 0x046D, pid = pid)
         sn = set()
+        ret = []
         for dev in devs:
             if dev['serial_number'] not in sn:
                 sn.add(dev['serial_number'])
-                print(dev['manufacturer_string'], dev['product_string'])
-                print('SN: ', dev['serial_number'])
-                print(f'PID  0x{dev['product_id']:04X}\n')
+                ret.append(dev)
+        return ret
+
+    @staticmethod
+    def list_devices(pid = 0):
+        for dev in LogiHPP20.enumerate_devices(pid):
+            print(dev['manufacturer_string'], dev['product_string'])
+            print('SN: ', dev['serial_number'])
+            print(f'PID  0x{dev['product_id']:04X}\n')
 
     @staticmethod
     def is_receiver(pid):
@@ -115,6 +396,7 @@ class LogiHPP20:
         Returns:
             bool: True if "receiver" in product name
         """
+        load_hid()
         devs = hid.enumerate(vid = 0x046D, pid = pid)
         for dev in devs:
             if "receiver" in dev['product_string'].lower():
@@ -129,30 +411,252 @@ class LogiHPP20:
             features.append(out[4]<< 8 | out[5])
         return features
 
-    def ping_device(self, data, read_back = False):
-        if self.port_short is not None and data[0] == 0x10 and len(data) <= 7:
-            data = (data + [0]*7)[:7]
-            self.port_short.write(bytes(data))
-        else:
-            data = (data + [0]*20)[:20]
-            data[0] = 0x11
-            self.port_long.write(bytes(data))
-        
-        #RAP w/short register, read from short
-        #everything else from long
-        data[0] = 0x11
-        out = self.port_long.read(size = 255, timeout = 5000) if read_back else []
+    def ping_device(self, data, read_back = False, retry = True):
+        """send a request, retry with bounded backoff if the reply is lost or an error
+
+        Args:
+            data (list): report, byte 0 is replaced by the report id
+            read_back (bool, optional): wait for the reply. Defaults to False.
+            retry (bool, optional): set False for requests that can't be repeated safely. Defaults to True.
+
+        Returns:
+            bytes: reply, None on error
+        """
+        return self.send(data[2], data[3], data[4:], read_back, retry, data[1])
+
+    def send(self, feature_idx, func_swid, params, read_back = False, retry = True, device_index = None, timeout = None):
+        """send a request, retry with bounded backoff if the reply is lost or an error
+
+        Args:
+            feature_idx (int): feature index
+            func_swid (int): function << 4 | software id
+            params (list or bytes): params
+            read_back (bool, optional): wait for the reply. Defaults to False.
+            retry (bool, optional): set False for requests that can't be repeated safely. Defaults to True.
+            device_index (int, optional): Defaults to this device.
+            timeout (int, optional): in ms. Defaults to the tuned self.timeout.
 
+        Returns:
+            bytes: reply, None on error
+        """
+        if device_index is None:
+            device_index = self.device_index
+        self.stats['requests'] += 1
+        attempts = self.retries + 1 if retry and read_back else 1
+        timeouts = self.stats['timeouts']
+        for attempt in range(attempts):
+            start = time.perf_counter()
+            out = self._send_once(device_index, feature_idx, func_swid, params, read_back, timeout or self.timeout)
+            if out is not None:
+                if read_back:
+                    self.rtt.append(time.perf_counter() - start)
+                    self.timeout_streak = 0
+                return out
+            if attempt + 1 < attempts:
+                self.stats['retries'] += 1
+                time.sleep(min(self.backoff * (2 ** attempt), self.max_backoff))
+        #every attempt timed out with the tuned timeout
+        if self.retune_after and read_back and timeout is None and self.stats['timeouts'] - timeouts >= attempts:
+            self.timeout_streak += 1
+            if self.timeout_streak >= self.retune_after:
+                self.stale_tuning()
+        return None
+
+    def stale_tuning(self):
+        """the tuned timeout is too short for the link now, e.g. a receiver moved away.
+            double it, and let the device cache measure again on the next run
+        """
+        self.timeout_streak = 0
+        self.timeout = min(5000, self.timeout * 2)
+        if self.on_stale_tuning is not None:
+            self.on_stale_tuning()
+
+    def _send_once(self, device_index, feature_idx, func_swid, params, read_back, timeout):
+        report, port = self.frame(device_index, feature_idx, func_swid, params)
         if self.debug:
             print('fap ping:')
-            print(pretty_list2(data))
-            print(pretty_list2(out) if read_back else 'no readback')
-        
-        if read_back and data[:4] != list(out[:4]):
-            #print(f'error r/w hid++2 {data[:4]} {out[:4]}')
-            return None
+            print(pretty_list2(bytes(report)))
+        if self.transport is not None:
+            start = time.perf_counter()
+            out = self.transport.request(report, read_back, timeout, port)
+            if out is None:
+                timed_out = time.perf_counter() - start >= timeout / 1000
+                self.stats['timeouts' if timed_out else 'errors'] += 1
+        else:
+            port.write(report)
+            out = self.read_reply(device_index, feature_idx, func_swid, timeout) if read_back else []
+        if self.debug:
+            print(pretty_list2(out) if out else 'no readback')
         return out
-    
+
+    def read_reply(self, device_index, feature_idx, func_swid, timeout = None, inflight = None):
+        """read until the reply to a request, drop stale replies and notifications on the way
+
+        Args:
+            device_index (int): device index of the request
+            feature_idx (int): feature index of the request
+            func_swid (int): function << 4 | software id of the request
+            timeout (int, optional): in ms. Defaults to self.timeout.
+            inflight (dict, optional): swid => None for other pipelined requests of the same function,
+                    their replies read on the way are kept here instead of dropped, b'' for an error. Defaults to None.
+
+        Returns:
+            bytes: reply, None on error or timeout
+        """
+        ports = self.open_ports()
+        deadline = time.perf_counter() + (timeout or self.timeout) / 1000
+        while True:
+            wait = int((deadline - time.perf_counter()) * 1000)
+            if wait <= 0:
+                self.stats['timeouts'] += 1
+                return None
+            #replies come on the long port, errors may come on the others
+            out = self.port_long.read(size = 255, timeout = wait if len(ports) == 1 else min(wait, 5))
+            for p in ports[1:]:
+                if not out:
+                    out = p.read(size = 255, timeout = 0)
+            if len(out) < 5 or out[1] != device_index:
+                continue
+            if out[2] == feature_idx and out[3] == func_swid:
+                return out
+            if out[2] in [0xFF, 0x8F] and out[3] == feature_idx and out[4] == func_swid:
+                #print(f'error r/w hid++2 {feature_idx} {func_swid} {out[:5]}')
+                self.stats['errors'] += 1
+                return None
+            if inflight is not None:
+                if out[2] == feature_idx and out[3] >> 4 == func_swid >> 4 and inflight.get(out[3] & 0xF, 0) is None:
+                    inflight[out[3] & 0xF] = out
+                    continue
+                if out[2] in [0xFF, 0x8F] and out[3] == feature_idx and out[4] >> 4 == func_swid >> 4 and inflight.get(out[4] & 0xF, 0) is None:
+                    self.stats['errors'] += 1
+                    inflight[out[4] & 0xF] = b''
+                    continue
+            self.stats['drained'] += 1
+
+    def call_feature_batch(self, feature_val, func_id, params_list, retry = True):
+        """send many requests of one function, keeping up to pipeline_depth of them in flight
+
+        Args:
+            feature_val (int): feature id
+            func_id (int): function
+            params_list (list): params for each request
+            retry (bool, optional): resend failed requests one by one. Defaults to True.
+
+        Returns:
+            list: replies in order, None for failed requests
+        """
+        if self.pipeline_depth <= 1:
+            return [self.call_feature(feature_val, func_id, p, True, retry) for p in params_list]
+        feature_idx = self.find_feature_index(feature_val)
+        if feature_idx == 0xFF:
+            return [None] * len(params_list)
+        ret = [None] * len(params_list)
+        self.stats['requests'] += len(params_list)
+        sent = 0
+        tokens = {}
+        #direct path: swid => reply read early, None while waiting
+        inflight = {}
+        for k in range(len(params_list)):
+            while sent < len(params_list) and sent - k < self.pipeline_depth:
+                #a different swid per request in flight, so a late reply can't be taken for the next one
+                report, port = self.frame(self.device_index, feature_idx, func_id << 4 | (sent % 15 + 1), params_list[sent])
+                if self.transport is not None:
+                    tokens[sent] = self.transport.submit(report, True, port, self.timeout)
+                else:
+                    inflight[sent % 15 + 1] = None
+                    port.write(report)
+                sent += 1
+            if self.transport is not None:
+                ret[k] = self.transport.wait(tokens.pop(k), self.timeout)
+            else:
+                #a lost reply only costs its own timeout, the replies behind it are kept
+                out = inflight.pop(k % 15 + 1)
+                if out is None:
+                    out = self.read_reply(self.device_index, feature_idx, func_id << 4 | (k % 15 + 1), None, inflight)
+                ret[k] = out or None
+        if not retry:
+            return ret
+        #replies carry no request data, a late reply to a failed request must not be taken for a retry:
+        #retries use swids no failed request had
+        failed = {k % 15 + 1 for k, out in enumerate(ret) if out is None}
+        for k, out in enumerate(ret):
+            if out is None:
+                free = [x for x in range(1, 16) if x not in failed]
+                if not free:
+                    break
+                ret[k] = self.send(feature_idx, func_id << 4 | free[0], params_list[k], True)
+                if ret[k] is None:
+                    failed.add(free[0])
+        return ret
+
+    @property
+    def connection_type(self):
+        if self.device_index == 0xFF:
+            return 'wired'
+        elif self.device_index == 0:
+            return 'bluetooth'
+        return 'receiver'
+
+    def measure_rtt(self, count = 20):
+        """measure round trip time with root feature ping
+
+        Args:
+            count (int, optional): number of pings. Defaults to 20.
+
+        Returns:
+            list: round trip times in seconds
+        """
+        samples = []
+        for i in range(count):
+            start = time.perf_counter()
+            if self.call_feature(0, 1, [0, 0, i]) is not None:
+                samples.append(time.perf_counter() - start)
+        return samples
+
+    def tune_timeout(self, samples):
+        """set read timeout from measured round trip times: 4 x p99 + 20ms, within min_timeout-5000ms.
+            a few quiet pings say little about a busy receiver, so the floor is well above usb round trips.
+            flash writes keep flash_timeout.
+
+        Args:
+            samples (list): round trip times in seconds
+        """
+        if samples:
+            self.timeout = int(min(5000, max(self.min_timeout, 4 * percentile(samples, 99) * 1000 + 20)))
+
+    def tuning(self):
+        """tuned values to save with the device's cached metadata
+
+        Returns:
+            dict: connection type, timeout, pipeline depth and round trip percentiles in ms
+        """
+        return {
+            'connection': self.connection_type,
+            'timeout': self.timeout,
+            'pipeline_depth': self.pipeline_depth,
+            'rtt_p50': round(percentile(self.rtt, 50) * 1000, 3),
+            'rtt_p99': round(percentile(self.rtt, 99) * 1000, 3),
+        }
+
+    def metrics(self):
+        """statistics of this session for telemetry, see Telemetry
+
+        Returns:
+            dict: counters from stats, round trip percentiles in seconds, page i/o throughput in bytes/s
+        """
+        ret = dict(self.stats)
+        for p in [50, 90, 99]:
+            ret[f'rtt_p{p}'] = percentile(self.rtt, p)
+        ret['rtt_samples'] = len(self.rtt)
+        ret['read_throughput'] = self.stats['read_bytes'] / self.stats['read_time'] if self.stats['read_time'] else 0
+        ret['write_throughput'] = self.stats['write_bytes'] / self.stats['write_time'] if self.stats['write_time'] else 0
+        ret['timeout'] = self.timeout / 1000
+        return ret
+
+    def apply_tuning(self, tuning):
+        self.timeout = max(self.min_timeout, tuning.get('timeout', self.timeout))
+        self.pipeline_depth = tuning.get('pipeline_depth', self.pipeline_depth)
+
     def find_feature_index(self, val):
         if val in self.feature_index:
             return self.feature_index.get(val)
@@ -166,19 +670,13 @@ class LogiHPP20:
     def has_feature(self, val):
         return self.find_feature_index(val) != 0xFF
 
-    def call_feature(self, feature_val, func_id, params = [0], read_back = True):
+    def call_feature(self, feature_val, func_id, params = [0], read_back = True, retry = True, timeout = None):
         feature_idx = self.find_feature_index(feature_val)
         if feature_idx == 0xFF:
             return None
-        if isinstance(params, bytes) or isinstance(params, bytearray):
-            params_arr = list(params)
-        elif isinstance(params, list):
-            params_arr = params
-        else:
+        if not isinstance(params, (bytes, bytearray, memoryview, list)):
             raise Exception('wrong params')
-        
-        data = [0x10, self.device_index, feature_idx, func_id << 4 | self.swid] + params_arr
-        return self.ping_device(data, read_back)
+        return self.send(feature_idx, func_id << 4 | self.swid, params, read_back, retry, timeout = timeout)
 
     def hidpp20_info(self, prop=''):
         dev = self.port_long
@@ -210,6 +708,9 @@ class LogiHPP20:
         if not self.has_feature(Feature.device_name):
             return None
         out = self.call_feature(Feature.device_name, 0, [0])
+        if not out:
+            #lost reply, probes don't retry
+            return None
         name_length = out[4]
         name = b''
         while len(name) < name_length:
@@ -0,0 +1,205 @@
+try:
+    import numpy as np
+except ImportError:
+    #optional, only for bulk analytics
+    np = None
+from .HidppConstants import MouseButton
+
+#profile page layout, as read by Profile.load_profile_bin. the first 252 bytes are the same for every page size
+PROFILE_FIELDS = [
+    ('rate', 'u1'),
+    ('dpi_default', 'u1'),
+    ('dpi_shift', 'u1'),
+    ('dpi_list', '<u2', (5,)),
+    ('color', 'u1', (3,)),
+    ('chunk1', 'u1', (16,)),
+    ('buttons', '>u4', (16,)),
+    ('buttons_gshift', '>u4', (16,)),
+    ('name', 'V48'),
+    ('rgb', 'u1', (4, 11)),
+]
+PROFILE_SIZE = 252
+#device and snapshot of each row
+ROW_FIELDS = [('serial', 'U32'), ('model', 'U48'), ('pid', 'u2'), ('index', 'u1'), ('profile', 'u1'), ('time', 'f8'),
+              ('num_buttons', 'u1'), ('num_gbuttons', 'u1'), ('extended_report_rate', '?')]
+#button action codes, same rules as Profile._keymap_to_json
+ACTIONS = ['button', 'key', 'macro', 'unknown']
+BUTTON, KEY, MACRO, UNKNOWN = range(4)
+EXTENDED_RATES = [125, 250, 500, 1000, 2000, 4000, 8000]
+
+
+class ProfileTable:
+    """raw profile pages of many devices stacked in a numpy structured array, for filters and aggregations
+        without decoding each page to json.
+
+        table.data holds the page fields (PROFILE_FIELDS), table.rows the device of each page (ROW_FIELDS).
+        numpy is only needed here, "pip install -r requirements-analytics.txt".
+    """
+    def __init__(self, data, rows):
+        """
+        Args:
+            data (numpy.ndarray): PROFILE_FIELDS records
+            rows (numpy.ndarray): ROW_FIELDS records, same length
+        """
+        self.data = data
+        self.rows = rows
+
+    @staticmethod
+    def dtypes():
+        assert np is not None, 'numpy is needed for profile analytics, run "pip install -r requirements-analytics.txt"'
+        data = np.dtype(PROFILE_FIELDS)
+        assert data.itemsize == PROFILE_SIZE
+        return data, np.dtype(ROW_FIELDS)
+
+    @classmethod
+    def from_archive(cls, archive, latest = True):
+        """
+        Args:
+            archive (ProfileArchive): opened archive
+            latest (bool, optional): only the newest snapshot of each device and profile. Defaults to True.
+
+        Returns:
+            ProfileTable
+        """
+        data_type, row_type = cls.dtypes()
+        entries = list(archive.entries(latest))
+        raw = bytearray(len(entries) * PROFILE_SIZE)
+        rows = np.empty(len(entries), row_type)
+        for i, x in enumerate(entries):
+            g = x.meta['geometry']
+            raw[i*PROFILE_SIZE:(i+1)*PROFILE_SIZE] = x.profile_page()[:PROFILE_SIZE]
+            rows[i] = (x.serial, x.meta['name'], x.pid, x.device_index, x.profile_index, x.time,
+                       g['num_buttons'], g['num_gbuttons'], g['extended_report_rate'])
+        return cls(np.frombuffer(raw, data_type), rows)
+
+    @classmethod
+    def from_pages(cls, pages, geometry, serial = '', model = '', pid = 0, device_index = 0):
+        """
+        Args:
+            pages (list): (profile index, bytes) of one device model, e.g. from debug page dumps
+            geometry (OnboardGeometry or dict): geometry of the model
+            serial (str, optional): Defaults to ''.
+            model (str, optional): product name. Defaults to ''.
+            pid (int, optional): Defaults to 0.
+            device_index (int, optional): Defaults to 0.
+
+        Returns:
+            ProfileTable
+        """
+        data_type, row_type = cls.dtypes()
+        if not isinstance(geometry, dict):
+            geometry = geometry.geometry()
+        raw = b''.join(bytes(page[:PROFILE_SIZE]) for _, page in pages)
+        rows = np.array([(serial, model, pid, device_index, profile_index, 0, geometry['num_buttons'], geometry['num_gbuttons'],
+                          geometry['extended_report_rate']) for profile_index, _ in pages], row_type)
+        return cls(np.frombuffer(raw, data_type), rows)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, mask):
+        """
+        Args:
+            mask: boolean array or index array
+
+        Returns:
+            ProfileTable: the selected rows
+        """
+        return ProfileTable(self.data[mask], self.rows[mask])
+
+    def report_rate(self):
+        """
+        Returns:
+            numpy.ndarray: report rate in hz, 0 for a wrong rate byte
+        """
+        rate = self.data['rate'].astype(np.int64)
+        #rate bytes past the table are wrong, not the fastest rate
+        valid = rate < len(EXTENDED_RATES)
+        extended = np.where(valid, np.array(EXTENDED_RATES)[np.where(valid, rate, 0)], 0)
+        regular = np.where(np.isin(rate, [1, 2, 4, 8]), 1000 // np.maximum(rate, 1), 0)
+        return np.where(self.rows['extended_report_rate'], extended, regular)
+
+    def dpi(self):
+        """
+        Returns:
+            numpy.ndarray: default dpi of each profile
+        """
+        index = np.minimum(self.data['dpi_default'], 4)
+        return self.data['dpi_list'][np.arange(len(self)), index]
+
+    def button_actions(self, key = 'buttons'):
+        """
+        Args:
+            key (str, optional): 'buttons' or 'buttons_gshift'. Defaults to 'buttons'.
+
+        Returns:
+            numpy.ndarray: (rows, 16) action codes, BUTTON / KEY / MACRO / UNKNOWN, -1 past the device's buttons
+        """
+        x = self.data[key]
+        known = np.array([int(b) for b in MouseButton], dtype = np.uint32)
+        button = np.isin(x, known) | (((x >> 24) == 0x90) & np.isin(x & 0xFFFFFF00, known))
+        ret = np.full(x.shape, UNKNOWN, dtype = np.int8)
+        ret[(x >> 24) == 0] = MACRO
+        ret[(x >> 16) == 0x8002] = KEY
+        ret[button] = BUTTON
+        count = self.rows['num_buttons' if key == 'buttons' else 'num_gbuttons']
+        ret[np.arange(16) >= count[:, None]] = -1
+        return ret
+
+    def has_macro(self, button, key = 'buttons'):
+        """
+        Args:
+            button (int): button position in the json "buttons" list, from 0
+            key (str, optional): 'buttons' or 'buttons_gshift'. Defaults to 'buttons'.
+
+        Returns:
+            numpy.ndarray: bool per row
+        """
+        return self.button_actions(key)[:, button] == MACRO
+
+    def where(self, mask = None):
+        """
+        Args:
+            mask (numpy.ndarray, optional): bool per row. Defaults to None for all rows.
+
+        Returns:
+            list[dict]: serial, pid, index and profile of the rows
+        """
+        rows = self.rows if mask is None else self.rows[mask]
+        return [{'serial': str(r['serial']), 'pid': int(r['pid']), 'index': int(r['index']), 'profile': int(r['profile'])} for r in rows]
+
+    def distribution(self, values, by = 'pid'):
+        """count values per group
+
+        Args:
+            values (numpy.ndarray): one value per row, e.g. dpi()
+            by (str, optional): row field to group by, e.g. 'model' or 'profile'. Defaults to 'pid'.
+
+        Returns:
+            dict: group => {value: count}
+        """
+        labels, group = np.unique(self.rows[by], return_inverse = True)
+        pairs, counts = np.unique(np.stack([group, values.astype(np.int64)]), axis = 1, return_counts = True)
+        ret = {}
+        for (g, v), n in zip(pairs.T, counts):
+            ret.setdefault(labels[g].item(), {})[int(v)] = int(n)
+        return ret
+
+    def names(self):
+        """
+        Returns:
+            list[str]: profile names, decoded one by one
+        """
+        return [bytes(x).decode('utf-16le', errors = 'replace').rstrip('\u0000') for x in self.data['name']]
+
+    def print_summary(self):
+        """profiles and devices, then report rates, default dpi and buttons with macros by model
+        """
+        print(f'{len(self)} profiles of {len(np.unique(self.rows["serial"]))} devices')
+        if not len(self):
+            return
+        for title, values in [('report rate', self.report_rate()), ('default dpi', self.dpi()),
+                              ('buttons with macros', (self.button_actions() == MACRO).sum(axis = 1))]:
+            print(f'{title}:')
+            for model, counts in self.distribution(values, 'model').items():
+                print(f'  {model}: ' + ', '.join(f'{v} x{n}' for v, n in sorted(counts.items())))
@@ -0,0 +1,282 @@
+import json, mmap, os, struct, time
+from .FeatureOnboardProfile import OnboardProfileImage
+
+#file: header, then snapshot records and indexes. each append writes a whole new index after its records,
+#the header points to the latest one. old indexes are dead space until compact() rewrites the file.
+#header: magic, offset and number of index entries
+MAGIC = b'OMMA\x01'
+HEADER = struct.Struct('>5sQI')
+#index entry, sorted by serial, pid, profile, time: serial, pid, device index, profile, time, record offset, record length
+ENTRY = struct.Struct('>32sHBBdQI')
+#record: metadata json length, metadata json (name, geometry, page numbers), then the pages
+META = struct.Struct('>I')
+
+
+class ArchiveEntry:
+    """one archived profile snapshot, pages are read from the archive on first use
+    """
+    def __init__(self, archive, serial, pid, device_index, profile_index, timestamp, offset, length):
+        self.archive = archive
+        self.serial = serial
+        self.pid = pid
+        self.device_index = device_index
+        self.profile_index = profile_index
+        self.time = timestamp
+        self.offset = offset
+        self.length = length
+        self._meta = None
+        self.pages_offset = 0
+
+    @property
+    def meta(self):
+        if self._meta is None:
+            data = self.archive.data
+            length = META.unpack_from(data, self.offset)[0]
+            raw = bytes(data[self.offset+META.size:self.offset+META.size+length])
+            #snapshots of one model share their metadata, parse it once
+            self._meta = self.archive.meta_cache.get(raw)
+            if self._meta is None:
+                self._meta = self.archive.meta_cache[raw] = json.loads(raw.decode('utf-8'))
+            self.pages_offset = self.offset + META.size + length
+        return self._meta
+
+    def profile_page(self):
+        """
+        Returns:
+            bytes: the profile page, without decoding
+        """
+        page_size = self.meta['geometry']['page_size']
+        return self.archive.data[self.pages_offset:self.pages_offset+page_size]
+
+    def image(self):
+        """
+        Returns:
+            OnboardProfileImage: geometry and pages of the snapshot
+        """
+        meta = self.meta
+        page_size = meta['geometry']['page_size']
+        pos = self.pages_offset
+        pages = {}
+        for i, page in enumerate(meta['pages']):
+            pages[page] = bytes(self.archive.data[pos+i*page_size:pos+(i+1)*page_size])
+        return OnboardProfileImage(meta['geometry'], pages)
+
+    def profile_json(self):
+        """decode the snapshot with Profile, macros from the archived macro pages
+        """
+        image = self.image()
+        return image.profile_bin_to_json(image.read_memory_page(self.meta['pages'][0]))
+
+
+class ProfileArchive:
+    """profile and macro pages of many devices in one file, opened with mmap.
+
+        entries are found by binary search in the index, only the accessed snapshots are decoded.
+        add() appends snapshots at the end of the file and writes a new index after them, the old
+        records are not touched, the header is updated last. when the old indexes take more than half
+        of the file, flush() compacts it.
+    """
+    def __init__(self, filename, writable = False):
+        """
+        Args:
+            filename (str): archive file, created by the first flush() if writable
+            writable (bool, optional): allow add(). Defaults to False.
+        """
+        self.filename = filename
+        self.writable = writable
+        self.pending = []
+        self.file = None
+        self.data = b''
+        self.count = 0
+        self.index_offset = 0
+        #metadata json => parsed dict
+        self.meta_cache = {}
+        self._open()
+
+    def _open(self):
+        self.close()
+        if not os.path.isfile(self.filename):
+            assert self.writable, f'archive not found: {self.filename}'
+            return
+        self.file = open(self.filename, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        magic, self.index_offset, self.count = HEADER.unpack_from(self.data, 0)
+        assert magic == MAGIC, f'not a profile archive: {self.filename}'
+
+    def close(self):
+        if self.file is not None:
+            self.data.close()
+            self.file.close()
+            self.file = None
+            self.data = b''
+            self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.writable:
+            self.flush()
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _key(self, i):
+        return ENTRY.unpack_from(self.data, self.index_offset + i * ENTRY.size)
+
+    def entry(self, i):
+        serial, pid, device_index, profile_index, timestamp, offset, length = self._key(i)
+        return ArchiveEntry(self, serial.rstrip(b'\0').decode('utf-8'), pid, device_index, profile_index, timestamp, offset, length)
+
+    @staticmethod
+    def _serial(serial):
+        data = serial.encode('utf-8')
+        assert len(data) <= 32, f'serial number too long: {serial}'
+        return data.ljust(32, b'\0')
+
+    def find(self, serial, pid = None, profile_index = None):
+        """
+        Args:
+            serial (str): usb serial number
+            pid (int, optional): only this pid. Defaults to None.
+            profile_index (int, optional): only this profile. Defaults to None.
+
+        Returns:
+            list[ArchiveEntry]: matching snapshots, oldest first
+        """
+        key = self._serial(serial)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        ret = []
+        while lo < self.count and self._key(lo)[0] == key:
+            x = self.entry(lo)
+            if pid in [None, x.pid] and profile_index in [None, x.profile_index]:
+                ret.append(x)
+            lo += 1
+        return ret
+
+    def entries(self, latest = False):
+        """all snapshots in index order
+
+        Args:
+            latest (bool, optional): only the newest snapshot of each device and profile. Defaults to False.
+
+        Yields:
+            ArchiveEntry
+        """
+        for i in range(self.count):
+            if latest and i + 1 < self.count and self._key(i + 1)[:4] == self._key(i)[:4]:
+                continue
+            yield self.entry(i)
+
+    def latest(self, serial, pid = None, profile_index = 1):
+        """
+        Returns:
+            ArchiveEntry: newest snapshot of any device index, None if not archived
+        """
+        found = self.find(serial, pid, profile_index)
+        return max(found, key = lambda x: x.time) if found else None
+
+    def add(self, serial, pid, device_index, name, geometry, profile_index, pages, timestamp = None):
+        """queue a snapshot, written by flush()
+
+        Args:
+            serial (str): usb serial number
+            pid (int): usb pid
+            device_index (int): device index
+            name (str): product name
+            geometry (OnboardGeometry or dict): memory geometry
+            profile_index (int): profile number
+            pages (list): (page index, bytes), the profile page first
+            timestamp (float, optional): Defaults to now.
+        """
+        assert self.writable, 'archive opened read only'
+        if not isinstance(geometry, dict):
+            geometry = geometry.geometry()
+        meta = json.dumps({'name': name, 'geometry': geometry, 'pages': [x[0] for x in pages]}).encode('utf-8')
+        record = META.pack(len(meta)) + meta + b''.join(bytes(x[1]) for x in pages)
+        key = (self._serial(serial), pid, device_index, profile_index, time.time() if timestamp is None else timestamp)
+        self.pending.append((key, record))
+
+    def flush(self):
+        """append the queued snapshots and a new index
+        """
+        if not self.pending:
+            return
+        entries = [self._key(i) for i in range(self.count)]
+        new_file = self.file is None
+        self.close()
+        with open(self.filename, 'r+b' if not new_file else 'wb') as f:
+            if new_file:
+                f.write(HEADER.pack(MAGIC, 0, 0))
+            pos = f.seek(0, os.SEEK_END)
+            for key, record in self.pending:
+                f.write(record)
+                entries.append(key + (pos, len(record)))
+                pos += len(record)
+            entries.sort(key = lambda x: x[:5])
+            f.write(b''.join(ENTRY.pack(*x) for x in entries))
+            f.flush()
+            os.fsync(f.fileno())
+            #the new index is complete on disk before the header points to it
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, pos, len(entries)))
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.seek(0, os.SEEK_END)
+        self.pending = []
+        self._open()
+        live = HEADER.size + sum(x[6] for x in entries) + len(entries) * ENTRY.size
+        if size - live > live // 2:
+            self.compact()
+
+    def compact(self):
+        """rewrite the file with the records and one index, drops the old indexes.
+            written to a new file first, then replaces the archive
+        """
+        entries = [self._key(i) for i in range(self.count)]
+        tmp = self.filename + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, 0, 0))
+            pos = HEADER.size
+            index = []
+            for x in entries:
+                f.write(self.data[x[5]:x[5]+x[6]])
+                index.append(x[:5] + (pos, x[6]))
+                pos += x[6]
+            f.write(b''.join(ENTRY.pack(*x) for x in index))
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, pos, len(index)))
+            f.flush()
+            os.fsync(f.fileno())
+        self.close()
+        os.replace(tmp, self.filename)
+        self._open()
+
+
+def read_snapshot(omm, data = None):
+    """pages of profile omm.dest to archive, macro pages only if the profile has macros
+
+    Args:
+        omm (FeatureOnboardProfile): the device, dest_profile set
+        data (bytes, optional): profile page if already read. Defaults to None.
+
+    Returns:
+        list: (page index, bytes), the profile page first
+    """
+    from .HidppProfile import Profile
+    layout = omm.page_layout[omm.dest]
+    if data is None:
+        data = omm.onboard_profile_to_bin()
+    p = Profile(omm)
+    p.load_profile_bin(data)
+    ret = [(layout[0], bytes(data))]
+    if p.macro_pages(layout):
+        ret += [(page, bytes(omm.read_memory_page(page, False))) for page in layout[1:]]
+    return ret
@@ -0,0 +1,112 @@
+import hashlib, json, os, threading
+from .utils import cache_folder, prune_files
+
+
+class ProfileCache:
+    """compiled page images of json profiles, so the same profile for the same geometry is encoded once.
+
+        the key is a hash of the json and every geometry value the encoding depends on.
+        entries are kept in memory for all threads and on disk, in the user cache folder, for other processes and runs.
+        on disk the least recently used files past max_files, or unused for max_age seconds, are removed.
+    """
+    memory = {}
+    lock = threading.Lock()
+    #entries kept in memory
+    max_entries = 64
+    #entries kept on disk
+    max_files = 256
+    max_age = 30*24*3600
+    stats = {'hits': 0, 'misses': 0}
+
+    def __init__(self, folder = None, persist = True):
+        """
+        Args:
+            folder (str, optional): cache folder. Defaults to the user cache folder.
+            persist (bool, optional): False to use the memory cache only, e.g. for dry runs. Defaults to True.
+        """
+        self.folder = folder or cache_folder('profiles')
+        self.persist = persist
+
+    @staticmethod
+    def key(j, geometry, profile_index):
+        """
+        Args:
+            j (dict): profile json
+            geometry (OnboardGeometry): target geometry
+            profile_index (int): target profile, its pages are in the image
+
+        Returns:
+            str: cache key
+        """
+        h = hashlib.sha256()
+        h.update(json.dumps(j, sort_keys = True, ensure_ascii = False).encode('utf-8'))
+        h.update(json.dumps([geometry.profile_format, geometry.page_size, geometry.num_buttons, geometry.num_gbuttons,
+                             bool(geometry.extended_report_rate), profile_index, geometry.page_layout[profile_index]]).encode('utf-8'))
+        return h.hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            pages = self.memory.get(key)
+        if pages is None and self.persist:
+            filename = os.path.join(self.folder, key + '.json')
+            if not os.path.isfile(filename):
+                return None
+            try:
+                with open(filename, 'r', encoding='utf-8') as f:
+                    pages = [bytes.fromhex(x) for x in json.load(f)['pages']]
+            except (OSError, ValueError, KeyError):
+                #pruned by another process or broken
+                return None
+            try:
+                #used, so it is pruned last
+                os.utime(filename)
+            except OSError:
+                pass
+            self._remember(key, pages)
+        return pages
+
+    def put(self, key, pages):
+        pages = [bytes(x) for x in pages]
+        self._remember(key, pages)
+        if not self.persist:
+            return
+        os.makedirs(self.folder, exist_ok = True)
+        filename = os.path.join(self.folder, key + '.json')
+        tmp = f'{filename}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'pages': [x.hex() for x in pages]}, f)
+        os.replace(tmp, filename)
+        prune_files(self.folder, self.max_files, self.max_age)
+
+    def _remember(self, key, pages):
+        with self.lock:
+            if key not in self.memory and len(self.memory) >= self.max_entries:
+                self.memory.pop(next(iter(self.memory)))
+            self.memory[key] = pages
+
+    def compile(self, geometry, j, profile_index):
+        """encode a json profile, or take it from the cache
+
+        Args:
+            geometry (OnboardGeometry): target geometry
+            j (dict): profile json
+            profile_index (int): target profile
+
+        Returns:
+            list: bytearray pages, [0] profile page, [1:] macro pages
+        """
+        key = self.key(j, geometry, profile_index)
+        pages = self.get(key)
+        if pages is None:
+            from .HidppProfile import Profile
+            from .Timings import span
+            with span('encode json'):
+                pages = Profile(geometry).profile_bytes_from_json(j, profile_index)
+            self.put(key, pages)
+            with self.lock:
+                self.stats['misses'] += 1
+        else:
+            with self.lock:
+                self.stats['hits'] += 1
+        #copies, callers may change them
+        return [bytearray(x) for x in pages]
@@ -0,0 +1,93 @@
+import json, struct
+from .FeatureOnboardProfile import OnboardProfileImage
+from .HidppProfile import Profile
+from .ProfileCache import ProfileCache
+from .utils import crc16_ccitt
+
+
+def profile_fields(geometry):
+    """byte ranges of the fields in a profile page, see Profile.load_profile_bin
+
+    Args:
+        geometry (OnboardGeometry): button counts and page size
+
+    Returns:
+        list[tuple]: (name, offset, length, function returning the json value from a loaded Profile)
+    """
+    rate = 'extended_report_rate' if geometry.extended_report_rate else 'report_rate'
+    ret = [(rate, 0, 1, lambda p: p.report_rate),
+           ('dpi_default', 1, 1, lambda p: p.dpi_default),
+           ('dpi_shift', 2, 1, lambda p: p.dpi_shift)]
+    for i in range(5):
+        ret.append((f'dpi_list[{i}]', 3 + i*2, 2, lambda p, i=i: p.dpi_list[i]))
+    ret += [('color', 13, 3, lambda p: '0x' + p.color),
+            ('chunk1', 16, 16, lambda p: p.chunk1.hex())]
+    for key, base, count in [('buttons', 32, geometry.num_buttons), ('buttons_gshift', 96, geometry.num_gbuttons)]:
+        for i in range(count):
+            ret.append((f'{key}[{i}]', base + i*4, 4, lambda p, key=key, i=i: p._keymap_to_json(getattr(p, key)[i])))
+        ret.append((f'{key}_padding', base + count*4, 64 - count*4, lambda p, key=key: getattr(p, key + '_padding').hex()))
+    ret.append(('profile_name', 160, 48, lambda p: p.profile_name.rstrip('\u0000')))
+    for z in range(4):
+        ret.append((f'rgb[{z}]', 208 + z*11, 11, lambda p, z=z: p._rgb_to_json(p.rgb[z])))
+    ret.append(('chunk2', 252, geometry.page_size - 254, lambda p: p.chunk2.hex()))
+    return ret
+
+
+def diff_profile(omm, j):
+    """compare a json profile with profile omm.dest on the device, reading as little as possible.
+
+        the checksum at the end of the profile page is read first, the rest of the page only if it differs.
+        macro pages are read only if the device or the json profile has macros.
+
+    Args:
+        omm (FeatureOnboardProfile): the device, dest_profile set
+        j (dict): profile json
+
+    Returns:
+        list[dict]: {'field', 'old', 'new'} for each changed field, empty if the device has the same profile
+    """
+    layout = omm.page_layout[omm.dest]
+    data = ProfileCache().compile(omm, j, omm.dest)
+    new = OnboardProfileImage(omm, {layout[i]: page for i, page in enumerate(data)})
+    new_page = data[0]
+    #the encoder's checksum is from before the macro pointers are set, write_memory_page stores this one
+    new_page[-2:] = struct.pack('>H', crc16_ccitt(new_page[:-2]))
+    tail = omm.read_memory_range(layout[0], omm.page_size - 16, 16)
+    if tail == new_page[-16:]:
+        old_page = new_page
+    else:
+        old_page = omm.read_memory_page(layout[0], False)
+
+    #macros decode from the pages on each side
+    old = OnboardProfileImage(omm, {layout[0]: old_page})
+    old_p = Profile(old)
+    old_p.load_profile_bin(old_page)
+    new_p = Profile(new)
+    new_p.load_profile_bin(new_page)
+    old_macros = old_p.macro_pages(layout)
+    new_macros = new_p.macro_pages(layout)
+    for page in sorted(old_macros | (new_macros & set(layout[1:]))):
+        old.pages[page] = omm.read_memory_page(page, False)
+
+    ret = []
+    for name, offset, length, value in profile_fields(omm):
+        end = offset + length
+        #same macro pointer, the macro itself may still differ
+        macro = name.endswith(']') and name.startswith('buttons') and 0 in (old_page[offset], new_page[offset])
+        if old_page[offset:end] == new_page[offset:end] and not macro:
+            continue
+        a, b = value(old_p), value(new_p)
+        if a != b:
+            ret.append({'field': name, 'old': a, 'new': b})
+    return ret
+
+
+def print_diff(profile_index, changes):
+    if not changes:
+        print(f'profile {profile_index}: no changes')
+        return
+    print(f'profile {profile_index}: {len(changes)} changes')
+    for x in changes:
+        old = json.dumps(x['old'], ensure_ascii=False)
+        new = json.dumps(x['new'], ensure_ascii=False)
+        print(f"  {x['field']}: {old} => {new}")
@@ -0,0 +1,206 @@
+import struct
+from .HidppConstants import *
+from .HidppFeatures import Feature
+from .HidppMacro import Macro
+
+#offsets in the profile page, see Profile.load_profile_bin
+DPI_LIST = 3
+BUTTONS = {'buttons': 32, 'buttons_gshift': 96}
+#macro pointer in a button slot: page, offset
+POINTER = struct.Struct('>HH')
+
+
+def parse_button(text):
+    """parse a "--set-button" value
+
+        "6=key:f13", "6=key:lctrl+c", "6=button:left_button", "6=macro:+lctrl c -lctrl", "6=unknown:\\x..",
+        "g6=..." for the g-shift buttons. the number is the position in the json "buttons" list, from 0.
+
+    Args:
+        text (str): button and action
+
+    Returns:
+        tuple: (position, json like a "buttons" entry, 'buttons' or 'buttons_gshift')
+    """
+    from .ProfileSchema import ProfileSchema
+    slot, _, spec = text.partition('=')
+    key = 'buttons_gshift' if slot.lower().startswith('g') else 'buttons'
+    slot = slot.lstrip('gG')
+    assert slot.isdigit() and spec, f'wrong button "{text}", should be like 6=key:f13'
+    action, _, value = spec.partition(':')
+    j = {'action': action.strip(), 'value': value.strip()}
+    if j['action'] == 'key':
+        names = [x.strip() for x in value.replace(',', '+').split('+') if x.strip()]
+        keys = [x for x in names if x not in Modifier]
+        assert len(keys) <= 1, f'wrong button "{text}", one key and modifiers only'
+        j['modifier'] = '+'.join(x for x in names if x in Modifier)
+        j['value'] = keys[0] if keys else ''
+    elif j['action'] == 'unknown':
+        j['bytes'] = j.pop('value')
+    errors = ProfileSchema().validate_button(j, f'{key}[{slot}]')
+    assert not errors, ', '.join(errors)
+    return int(slot), j, key
+
+
+def parse_dpi(text):
+    """parse a "--set-dpi" value like "2=1600", the position in the json "dpi_list" from 0
+
+    Returns:
+        tuple: (position, dpi)
+    """
+    slot, _, dpi = text.partition('=')
+    assert slot.isdigit() and dpi.isdigit(), f'wrong dpi "{text}", should be like 2=1600'
+    assert int(slot) < 5 and int(dpi) <= 0xFFFF, f'wrong dpi "{text}", 5 dpi slots from 0'
+    return int(slot), int(dpi)
+
+
+class ProfilePatch:
+    """change single buttons or dpi slots of profile omm.dest in place, without encoding the whole profile.
+
+        the profile page is read once, only the changed 16 bytes chunks and the checksum are written back.
+        a new macro goes into the first free space of the profile's macro pages, the other macros stay.
+    """
+    def __init__(self, omm):
+        """
+        Args:
+            omm (FeatureOnboardProfile): the device, dest_profile set
+        """
+        self.omm = omm
+        self.buttons = []
+        self.dpi = []
+        #macro page index => content, read on first use
+        self.pages = {}
+
+    def set_button(self, position, j, key = 'buttons'):
+        """
+        Args:
+            position (int): position in the json "buttons" list, from 0
+            j (dict): json like a "buttons" entry
+            key (str, optional): 'buttons' or 'buttons_gshift'. Defaults to 'buttons'.
+        """
+        count = self.omm.num_buttons if key == 'buttons' else self.omm.num_gbuttons
+        assert position < count, f'{key}[{position}]: the device has {count} buttons'
+        self.buttons.append((position, j, key))
+
+    def set_dpi(self, position, dpi):
+        """
+        Args:
+            position (int): position in the json "dpi_list", from 0
+            dpi (int): dpi
+        """
+        self.dpi.append((position, dpi))
+
+    def page(self, page):
+        if page not in self.pages:
+            self.pages[page] = bytes(self.omm.read_memory_page(page, False))
+        return self.pages[page]
+
+    def macro_spans(self, pointer):
+        """bytes taken by a macro, following next page steps
+
+        Args:
+            pointer (bytes): button slot
+
+        Returns:
+            list[tuple]: (page, start, end)
+        """
+        page, pos = POINTER.unpack(pointer)
+        ret = []
+        start = pos
+        while True:
+            data = self.page(page)
+            op = data[pos] if pos < len(data) else MacroControl.macro_end
+            if op == MacroControl.next_page:
+                ret.append((page, start, pos + 5))
+                page, pos = POINTER.unpack_from(data, pos + 1)
+                start = pos
+            elif op == MacroControl.macro_end or op not in MacroControl:
+                ret.append((page, start, pos + 1))
+                return ret
+            else:
+                pos += Macro.get_op_length(op)
+
+    def used_spans(self, profile_page):
+        #macros of this profile, and of other profiles sharing its macro pages
+        omm = self.omm
+        pages = set(omm.page_layout[omm.dest][1:])
+        profile_pages = [profile_page]
+        for i in range(1, omm.num_profiles + 1):
+            if i != omm.dest and omm.profile_list[i]['page'] > 0 and pages & set(omm.page_layout[i][1:]):
+                profile_pages.append(omm.read_memory_page(omm.page_layout[i][0]))
+        ret = []
+        for data in profile_pages:
+            for key, base in BUTTONS.items():
+                count = omm.num_buttons if key == 'buttons' else omm.num_gbuttons
+                for i in range(count):
+                    slot = data[base + i*4:base + i*4 + 4]
+                    if slot[0] == 0 and POINTER.unpack(slot)[0] in pages:
+                        ret += self.macro_spans(slot)
+        return ret
+
+    def allocate(self, size, used):
+        """find free space for a macro in the profile's macro pages
+
+        Args:
+            size (int): bytes, with the macro end
+            used (list): (page, start, end) taken
+
+        Returns:
+            tuple: (page, offset)
+        """
+        #same limit as Profile.profile_bytes_from_json
+        limit = self.omm.page_size - 11
+        for page in self.omm.page_layout[self.omm.dest][1:]:
+            spans = sorted((start, end) for p, start, end in used if p == page)
+            pos = 0
+            for start, end in spans + [(limit, limit)]:
+                if start - pos >= size:
+                    return page, pos
+                pos = max(pos, end)
+        raise Exception(f'no space for a {size} bytes macro in profile {self.omm.dest}, use "--import" to pack the macros again')
+
+    def apply(self):
+        """write the changes
+
+        Returns:
+            int: number of bytes written
+        """
+        from .HidppProfile import Profile
+        omm = self.omm
+        page = omm.page_layout[omm.dest][0]
+        old = bytes(omm.read_memory_page(page))
+        new = bytearray(old)
+        for position, dpi in self.dpi:
+            struct.pack_into('<H', new, DPI_LIST + position*2, dpi)
+        macros = []
+        encoder = Profile(omm)
+        for position, j, key in self.buttons:
+            offset = BUTTONS[key] + position*4
+            data = encoder._keymap_from_json(j)
+            if isinstance(data, list):
+                macros.append((offset, b''.join(bytes(x) for x in data) + bytes([MacroControl.macro_end])))
+                #freed, the old macro's space can be used again
+                new[offset:offset+4] = b'\xff\xff\xff\xff'
+            else:
+                new[offset:offset+4] = data
+        written = 0
+        if macros:
+            used = self.used_spans(new)
+            changed = {}
+            for offset, data in macros:
+                macro_page, pos = self.allocate(len(data), used)
+                used.append((macro_page, pos, pos + len(data)))
+                content = changed.setdefault(macro_page, bytearray(self.page(macro_page)))
+                content[pos:pos+len(data)] = data
+                new[offset:offset+4] = POINTER.pack(macro_page, pos)
+            #macros first, so the profile never points at a half written macro
+            for macro_page, content in changed.items():
+                written += omm.write_memory_diff(macro_page, self.page(macro_page), content, False)
+                self.pages[macro_page] = bytes(content)
+        written += omm.write_memory_diff(page, old, new, True)
+        if written and omm.current_profile == omm.dest:
+            #select the profile again so the device loads the new settings
+            omm.dev.call_feature(Feature.onboard_profile, 3, [0, omm.dest, 0])
+        self.buttons = []
+        self.dpi = []
+        return written
@@ -0,0 +1,246 @@
+import json, os, re
+from concurrent.futures import ProcessPoolExecutor
+from .HidppConstants import *
+from .HidppMacro import Macro
+
+#size of each escaped byte field, see Profile.profile_bytes_from_json. chunk2 depends on the page size
+FIELD_SIZES = {'chunk1': 16, 'buttons': 64, 'buttons_gshift': 64}
+#escaped bytes like "\x00\xff"
+ESCAPED = re.compile(r'(\\x[0-9a-fA-F]{2})*')
+HEX = re.compile(r'(0x)?[0-9a-fA-F]{1,6}')
+
+
+class ProfileSchema:
+    """check a json profile before it is encoded, and before any device i/o.
+
+        the name sets and patterns are built once, validate() collects every error with its json path
+        instead of stopping at the first assertion in profile_bytes_from_json.
+    """
+    def __init__(self, geometry = None):
+        """
+        Args:
+            geometry (OnboardGeometry or dict, optional): device geometry, to also check button counts, page size
+                    and the macro page budget. Defaults to None.
+        """
+        if geometry is not None and not isinstance(geometry, dict):
+            geometry = geometry.geometry()
+        self.geometry = geometry
+        self.buttons = set(MouseButton.__members__)
+        self.keys = set(KeyCode.__members__)
+        self.modifiers = set(Modifier.__members__)
+        self.rgb_modes = set(RGBMode.__members__)
+        if geometry is None:
+            self.rates = {'report_rate': [1000, 500, 250, 125], 'extended_report_rate': [125, 250, 500, 1000, 2000, 4000, 8000]}
+        elif geometry['extended_report_rate']:
+            self.rates = {'extended_report_rate': [125, 250, 500, 1000, 2000, 4000, 8000]}
+        else:
+            self.rates = {'report_rate': [1000, 500, 250, 125]}
+
+    def validate(self, j, profile_index = None):
+        """
+        Args:
+            j (dict): profile json
+            profile_index (int, optional): target profile, for the macro page budget. Defaults to None.
+
+        Returns:
+            list[str]: errors as "path: message", empty if the profile can be imported
+        """
+        errors = []
+        if not isinstance(j, dict):
+            return ['profile: not a json object']
+        rate = [k for k in ['extended_report_rate', 'report_rate'] if k in j]
+        if not rate:
+            errors.append('report_rate: missing')
+        elif rate[0] not in self.rates:
+            errors.append(f'{rate[0]}: not supported by the device, use {list(self.rates)[0]}')
+        elif j[rate[0]] not in self.rates[rate[0]]:
+            errors.append(f'{rate[0]}: {j[rate[0]]} should be one of {self.rates[rate[0]]}')
+        self._int(errors, j, 'dpi_default', 0, 4)
+        self._int(errors, j, 'dpi_shift', 0, 255)
+        if self._has(errors, j, 'dpi_list', list):
+            if len(j['dpi_list']) != 5:
+                errors.append(f"dpi_list: needs 5 values, got {len(j['dpi_list'])}")
+            for i, x in enumerate(j['dpi_list'][:5]):
+                self._range(errors, x, 0, 0xFFFF, f'dpi_list[{i}]')
+        if self._has(errors, j, 'color', str) and not HEX.fullmatch(j['color']):
+            errors.append(f"color: {j['color']} is not a 24 bit hex color")
+        self._escaped(errors, j, 'chunk1', FIELD_SIZES['chunk1'])
+        macros = []
+        for key in ['buttons', 'buttons_gshift']:
+            if not self._has(errors, j, key, list):
+                continue
+            if self.geometry is not None:
+                count = self.geometry['num_buttons' if key == 'buttons' else 'num_gbuttons']
+                if len(j[key]) != count:
+                    errors.append(f'{key}: the device has {count}, got {len(j[key])}')
+            padding = self._escaped(errors, j, key + '_padding')
+            if padding is not None and len(j[key]) * 4 + padding != FIELD_SIZES[key]:
+                errors.append(f'{key}_padding: {len(j[key])} buttons and {padding} bytes padding, should be {FIELD_SIZES[key]} bytes')
+            for i, x in enumerate(j[key]):
+                ops = self._button(errors, x, f'{key}[{i}]')
+                if ops is not None:
+                    macros.append(ops)
+        self._has(errors, j, 'profile_name', str)
+        if self._has(errors, j, 'rgb', list):
+            if len(j['rgb']) != 4:
+                errors.append(f"rgb: needs 4 zones, got {len(j['rgb'])}")
+            for i, x in enumerate(j['rgb']):
+                self._rgb(errors, x, f'rgb[{i}]')
+        self._escaped(errors, j, 'chunk2', None if self.geometry is None else self.geometry['page_size'] - 254)
+        if macros and self.geometry is not None and profile_index is not None:
+            needed = self.macro_pages(macros)
+            budget = len(self.geometry['page_layout'][profile_index]) - 1
+            if needed > budget:
+                errors.append(f'macros: need {needed} memory pages, profile {profile_index} has {budget}')
+        return errors
+
+    def validate_button(self, x, path = 'button'):
+        """
+        Args:
+            x (dict): one entry of the json "buttons" list
+            path (str, optional): name in the errors. Defaults to 'button'.
+
+        Returns:
+            list[str]: errors
+        """
+        errors = []
+        self._button(errors, x, path)
+        return errors
+
+    def _has(self, errors, j, key, kind, path = None):
+        if key not in j:
+            errors.append(f'{path or key}: missing')
+            return False
+        if not isinstance(j[key], kind) or (kind is int and isinstance(j[key], bool)):
+            errors.append(f'{path or key}: should be {kind.__name__}, got {type(j[key]).__name__}')
+            return False
+        return True
+
+    def _int(self, errors, j, key, low, high):
+        if self._has(errors, j, key, int):
+            self._range(errors, j[key], low, high, key)
+
+    def _range(self, errors, value, low, high, path):
+        if not isinstance(value, int) or isinstance(value, bool):
+            errors.append(f'{path}: should be int, got {type(value).__name__}')
+        elif not low <= value <= high:
+            errors.append(f'{path}: {value} should be {low}-{high}')
+
+    def _escaped(self, errors, j, key, size = None, path = None):
+        #length in bytes of an escaped byte string, None if wrong
+        if not self._has(errors, j, key, str, path):
+            return None
+        if not ESCAPED.fullmatch(j[key]):
+            errors.append(f'{path or key}: should be escaped bytes like "\\x00\\xff"')
+            return None
+        length = len(j[key]) // 4
+        if size is not None and length != size:
+            errors.append(f'{path or key}: should be {size} bytes, got {length}')
+            return None
+        return length
+
+    def _button(self, errors, x, path):
+        #macro ops of a macro button, None for other buttons
+        if not isinstance(x, dict) or not self._has(errors, x, 'action', str, f'{path}.action'):
+            if not isinstance(x, dict):
+                errors.append(f'{path}: not a json object')
+            return None
+        action = x['action']
+        if action == 'button':
+            if self._has(errors, x, 'value', str, f'{path}.value') and x['value'] not in self.buttons:
+                errors.append(f"{path}.value: unknown button {x['value']}")
+        elif action == 'key':
+            if self._has(errors, x, 'value', str, f'{path}.value') and x['value'] and x['value'] not in self.keys:
+                errors.append(f"{path}.value: unknown key {x['value']}")
+            if 'modifier' in x and self._has(errors, x, 'modifier', str, f'{path}.modifier'):
+                for m in [m.strip() for m in x['modifier'].replace(',', '+').split('+') if m.strip()]:
+                    if m not in self.modifiers:
+                        errors.append(f'{path}.modifier: unknown modifier {m}')
+        elif action == 'macro':
+            if self._has(errors, x, 'value', str, f'{path}.value'):
+                try:
+                    return Macro.macro_bin_from_text(x['value'])
+                except Exception as e:
+                    errors.append(f'{path}.value: {str(e) or type(e).__name__}')
+        elif action == 'unknown':
+            self._escaped(errors, x, 'bytes', 4, f'{path}.bytes')
+        else:
+            errors.append(f'{path}.action: {action} should be button, key, macro or unknown')
+        return None
+
+    def _rgb(self, errors, x, path):
+        if not isinstance(x, dict):
+            errors.append(f'{path}: not a json object')
+            return
+        if not self._has(errors, x, 'mode', str, f'{path}.mode'):
+            return
+        if x['mode'] == 'unknown':
+            self._escaped(errors, x, 'bytes', 11, f'{path}.bytes')
+        elif x['mode'] not in self.rgb_modes:
+            errors.append(f"{path}.mode: {x['mode']} should be one of {sorted(self.rgb_modes)} or unknown")
+        else:
+            if 'color' in x and self._has(errors, x, 'color', str, f'{path}.color') and not HEX.fullmatch(x['color']):
+                errors.append(f"{path}.color: {x['color']} is not a 24 bit hex color")
+            #out of range values are clamped by the encoder
+            self._has(errors, x, 'duration', int, f'{path}.duration')
+            self._has(errors, x, 'brightness', int, f'{path}.brightness')
+
+    def macro_pages(self, macros):
+        """memory pages the macros take, packed like Profile.profile_bytes_from_json
+
+        Args:
+            macros (list): ops of each macro, from Macro.macro_bin_from_text
+
+        Returns:
+            int: number of pages
+        """
+        size = self.geometry['page_size']
+        pages, pos = 1, 0
+        for ops in macros:
+            for op in ops:
+                if pos + len(op) > size - 11:
+                    pages += 1
+                    pos = 0
+                pos += len(op)
+            #macro end
+            pos += 1
+        return pages
+
+
+def validate_file(filename, geometry = None, profile_index = None):
+    """
+    Args:
+        filename (str): json profile
+        geometry (dict, optional): see ProfileSchema. Defaults to None.
+        profile_index (int, optional): target profile. Defaults to None.
+
+    Returns:
+        list[str]: errors
+    """
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            j = json.load(f)
+    except (OSError, ValueError) as e:
+        return [f'file: {e}']
+    return ProfileSchema(geometry).validate(j, profile_index)
+
+
+def validate_files(filenames, geometry = None, profile_index = None, workers = 0):
+    """validate many json profiles in parallel processes
+
+    Args:
+        filenames (list): json profiles
+        geometry (dict, optional): see ProfileSchema. Defaults to None.
+        profile_index (int, optional): target profile. Defaults to None.
+        workers (int, optional): processes, 0 for one per cpu. Defaults to 0.
+
+    Returns:
+        dict: filename => errors
+    """
+    n = len(filenames)
+    if n < 8:
+        #starting processes takes longer than a few files
+        return {x: validate_file(x, geometry, profile_index) for x in filenames}
+    with ProcessPoolExecutor(max_workers = workers or os.cpu_count()) as pool:
+        results = pool.map(validate_file, filenames, [geometry]*n, [profile_index]*n, chunksize = max(1, n // (4 * (workers or os.cpu_count()))))
+        return dict(zip(filenames, results))
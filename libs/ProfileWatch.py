@@ -0,0 +1,166 @@
+import ctypes, json, os, select, struct, sys, time
+from .HidppFeatures import Feature
+from .utils import crc16_ccitt
+
+
+class FileWatcher:
+    """wait for a file to be saved. inotify on linux, polling the modification time elsewhere.
+    """
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+
+    def __init__(self, filename, interval = 0.1):
+        """
+        Args:
+            filename (str): file to watch
+            interval (float, optional): polling interval in seconds, without inotify. Defaults to 0.1.
+        """
+        self.filename = os.path.abspath(filename)
+        self.interval = interval
+        self.fd = -1
+        self.last = self._stat()
+        if sys.platform.startswith('linux'):
+            try:
+                libc = ctypes.CDLL(None, use_errno = True)
+                fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+                #watch the folder, editors often save to a temp file and rename it
+                if fd >= 0 and libc.inotify_add_watch(fd, os.path.dirname(self.filename).encode(),
+                                                      self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE) >= 0:
+                    self.fd = fd
+                elif fd >= 0:
+                    os.close(fd)
+            except (OSError, AttributeError):
+                pass
+
+    def _stat(self):
+        try:
+            st = os.stat(self.filename)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def wait(self, timeout = None):
+        """
+        Args:
+            timeout (float, optional): seconds. Defaults to None, wait forever.
+
+        Returns:
+            bool: True if the file was saved
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while deadline is None or time.perf_counter() < deadline:
+            wait = self.interval if deadline is None else max(0, min(self.interval, deadline - time.perf_counter()))
+            if self.fd >= 0:
+                if not select.select([self.fd], [], [], wait)[0]:
+                    continue
+                data = os.read(self.fd, 4096)
+                pos = 0
+                changed = False
+                while pos < len(data):
+                    #struct inotify_event: wd, mask, cookie, len, name
+                    _, mask, _, length = struct.unpack_from('iIII', data, pos)
+                    name = data[pos+16:pos+16+length].rstrip(b'\0').decode(errors = 'replace')
+                    changed = changed or name == os.path.basename(self.filename)
+                    pos += 16 + length
+                if changed:
+                    self.last = self._stat()
+                    return True
+            else:
+                time.sleep(wait)
+                stat = self._stat()
+                if stat is not None and stat != self.last:
+                    self.last = stat
+                    return True
+        return False
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class ProfileWatch:
+    """push a json profile to the device each time it is saved, writing only the changed bytes.
+    """
+    def __init__(self, omm, filename):
+        """
+        Args:
+            omm (FeatureOnboardProfile): the device, dest_profile set
+            filename (str): json profile
+        """
+        from .ProfileSchema import ProfileSchema
+        self.omm = omm
+        self.filename = filename
+        self.schema = ProfileSchema(omm)
+        #page index => content on the device
+        self.pages = {}
+        #partial writes are read back once, some firmware may only take whole pages. None until checked
+        self.partial = None
+
+    def device_page(self, page):
+        if page not in self.pages:
+            self.pages[page] = bytes(self.omm.read_memory_page(page, False))
+        return self.pages[page]
+
+    def push(self):
+        """encode the json and write the changes
+
+        Returns:
+            int: number of bytes written
+        """
+        from .HidppProfile import Profile
+        with open(self.filename, 'r', encoding='utf-8') as f:
+            j = json.load(f)
+        omm = self.omm
+        #a bad save must not leave a half written profile
+        errors = self.schema.validate(j, omm.dest)
+        assert not errors, '; '.join(errors)
+        data = Profile(omm).profile_bytes_from_json(j, omm.dest)
+        layout = omm.page_layout[omm.dest]
+        #macro pages first, so the profile never points at a half written macro
+        pages = [(layout[i], macro, False) for i, macro in enumerate(data[1:], 1)] + [(layout[0], data[0], True)]
+        written = 0
+        for page, page_data, verify in pages:
+            if verify:
+                page_data = page_data[:-2] + struct.pack('>H', crc16_ccitt(page_data[:-2]))
+            old = self.device_page(page)
+            if bytes(page_data) == old:
+                continue
+            if self.partial is False:
+                omm.write_memory_page(page, page_data, False)
+                written += len(page_data)
+            else:
+                written += omm.write_memory_diff(page, old, page_data, False)
+                if self.partial is None:
+                    self.partial = bytes(omm.read_memory_page(page, False)) == bytes(page_data)
+                    if not self.partial:
+                        print('partial page writes not supported, write whole pages')
+                        omm.write_memory_page(page, page_data, False)
+                        written += len(page_data)
+            self.pages[page] = bytes(page_data)
+        if written and omm.current_profile == omm.dest:
+            #select the profile again so the device loads the new settings
+            omm.dev.call_feature(Feature.onboard_profile, 3, [0, omm.dest, 0])
+        return written
+
+    def run(self):
+        """push on every save until ctrl+c
+        """
+        watcher = FileWatcher(self.filename)
+        print(f'watching {self.filename} for profile {self.omm.dest}, ctrl+c to stop')
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    written = self.push()
+                    print(f'pushed {written} bytes in {(time.perf_counter() - start)*1000:.1f}ms')
+                except (ValueError, KeyError, AssertionError) as e:
+                    #half saved or wrong json, wait for the next save
+                    print(f'error in {self.filename}: {e}')
+                watcher.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+
@@ -0,0 +1,111 @@
+import json, os, time
+
+#key in LogiHPP20.metrics() => (prometheus name, type, help)
+METRICS = {
+    'requests': ('hidpp_requests_total', 'counter', 'hid++ requests sent'),
+    'retries': ('hidpp_retries_total', 'counter', 'requests sent again after a lost or failed reply'),
+    'timeouts': ('hidpp_timeouts_total', 'counter', 'replies not received in time'),
+    'errors': ('hidpp_errors_total', 'counter', 'hid++ error replies'),
+    'drained': ('hidpp_drained_total', 'counter', 'unexpected reports dropped while waiting for a reply'),
+    'crc_failures': ('hidpp_crc_failures_total', 'counter', 'memory pages read with a bad checksum'),
+    'page_retries': ('hidpp_page_retries_total', 'counter', 'memory page reads / writes done again'),
+    'page_reads': ('hidpp_page_reads_total', 'counter', 'memory reads, whole or part of a page'),
+    'read_bytes': ('hidpp_page_read_bytes_total', 'counter', 'bytes read from onboard memory'),
+    'page_writes': ('hidpp_page_writes_total', 'counter', 'memory writes, whole or part of a page'),
+    'write_bytes': ('hidpp_page_write_bytes_total', 'counter', 'bytes written to onboard memory'),
+    'bytes_sent': ('hidpp_report_bytes_sent_total', 'counter', 'bytes of hid++ reports sent'),
+    'read_throughput': ('hidpp_page_read_bytes_per_second', 'gauge', 'onboard memory read throughput'),
+    'write_throughput': ('hidpp_page_write_bytes_per_second', 'gauge', 'onboard memory write throughput'),
+    'timeout': ('hidpp_timeout_seconds', 'gauge', 'read timeout in use'),
+    'ok': ('hidpp_provision_ok', 'gauge', '1 if the last provisioning succeeded'),
+    'elapsed': ('hidpp_provision_seconds', 'gauge', 'time to provision the device'),
+}
+RTT = ('hidpp_rtt_seconds', 'round trip time of hid++ requests')
+
+
+def device_labels(dev):
+    """
+    Args:
+        dev (LogiHPP20): an opened device
+
+    Returns:
+        dict: label name => value
+    """
+    return {'serial': str(getattr(dev.port_long, 'serial', '') or ''), 'pid': f'{dev.product_id:04x}',
+            'index': f'{dev.device_index:02x}', 'name': dev.product_name}
+
+
+def fleet_samples(results):
+    """
+    Args:
+        results (list[dict]): from Fleet.run_fleet
+
+    Returns:
+        list[tuple]: (labels, metrics) per device
+    """
+    ret = []
+    for r in results:
+        labels = {'serial': r['serial'], 'pid': f"{r['pid']:04x}", 'index': f"{r['index']:02x}" if r['index'] >= 0 else '',
+                  'name': r['name']}
+        metrics = dict(r.get('metrics', {}))
+        metrics['ok'] = int(r['ok'])
+        metrics['elapsed'] = r['elapsed']
+        ret.append((labels, metrics))
+    return ret
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, **extra):
+    labels = dict(labels, **extra)
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def prometheus_text(samples):
+    """
+    Args:
+        samples (list[tuple]): (labels, metrics)
+
+    Returns:
+        str: prometheus text format
+    """
+    lines = []
+    for key, (name, kind, doc) in METRICS.items():
+        rows = [(labels, metrics[key]) for labels, metrics in samples if key in metrics]
+        if not rows:
+            continue
+        lines += [f'# HELP {name} {doc}', f'# TYPE {name} {kind}']
+        lines += [f'{name}{_labels(labels)} {value}' for labels, value in rows]
+    rows = [(labels, metrics) for labels, metrics in samples if 'rtt_samples' in metrics]
+    if rows:
+        name, doc = RTT
+        lines += [f'# HELP {name} {doc}', f'# TYPE {name} summary']
+        for labels, metrics in rows:
+            for p in [50, 90, 99]:
+                lines.append(f'{name}{_labels(labels, quantile=p/100)} {metrics[f"rtt_p{p}"]}')
+            lines.append(f'{name}_count{_labels(labels)} {metrics["rtt_samples"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(filename, samples):
+    """write a prometheus textfile (".prom"), replaced on each run, or append json lines (any other name)
+
+    Args:
+        filename (str): output file
+        samples (list[tuple]): (labels, metrics)
+    """
+    folder = os.path.dirname(os.path.abspath(filename))
+    os.makedirs(folder, exist_ok = True)
+    if filename.endswith('.prom'):
+        #replaced at once, so a collector never reads half a file
+        tmp = f'{filename}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8', newline='\n') as f:
+            f.write(prometheus_text(samples))
+        os.replace(tmp, filename)
+    else:
+        now = time.time()
+        with open(filename, 'a', encoding='utf-8') as f:
+            for labels, metrics in samples:
+                f.write(json.dumps(dict(labels, time = now, **metrics)) + '\n')
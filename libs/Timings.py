@@ -0,0 +1,190 @@
+import threading, time, weakref
+
+
+class Node:
+    """a named span, same named spans under one parent are added up
+    """
+    __slots__ = ['name', 'count', 'seconds', 'requests', 'children']
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.seconds = 0.0
+        self.requests = 0
+        self.children = {}
+
+    def child(self, name):
+        node = self.children.get(name)
+        if node is None:
+            node = self.children[name] = Node(name)
+        return node
+
+    def merge(self, other):
+        self.count += other.count
+        self.seconds += other.seconds
+        self.requests += other.requests
+        for name, x in other.children.items():
+            self.child(name).merge(x)
+
+
+class Span:
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        t = self.timings
+        stack = t.stack()
+        with t.lock:
+            self.node = (stack[-1] if stack else t.pending).child(self.name)
+        stack.append(self.node)
+        self.requests = t.requests()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        t = self.timings
+        seconds = time.perf_counter() - self.start
+        requests = t.requests() - self.requests
+        t.stack().pop()
+        with t.lock:
+            self.node.count += 1
+            self.node.seconds += seconds
+            self.node.requests += requests
+        for callback in t.hooks:
+            callback(self.name, seconds, requests)
+        return False
+
+
+class NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_SPAN = NoSpan()
+
+
+class Timings:
+    """named, nested spans of a run and the hid++ requests sent in each, for "--timings"
+
+        spans are opened with span(), mark() closes a top level step of omm.py and takes the spans
+        opened since the last mark as its children. requests are counted over all opened devices,
+        so spans running in parallel (fleet mode) see each other's requests.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.start = self.last = time.perf_counter()
+        self.root = Node('total')
+        #spans opened at top level since the last mark
+        self.pending = Node('')
+        self.last_requests = 0
+        self.hooks = []
+        #(weak reference, stats) of open devices, requests of closed ones are added up in closed_requests
+        self.devices = []
+        self.closed_requests = 0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def requests(self):
+        with self.lock:
+            alive = []
+            for ref, stats in self.devices:
+                if ref() is None:
+                    self.closed_requests += stats['requests']
+                else:
+                    alive.append((ref, stats))
+            self.devices = alive
+            return self.closed_requests + sum(stats['requests'] for _, stats in alive)
+
+    def watch(self, dev):
+        """count the requests of a device, LogiHPP20 calls this itself. the device is not kept alive
+
+        Args:
+            dev (LogiHPP20): the device
+        """
+        with self.lock:
+            self.devices.append((weakref.ref(dev), dev.stats))
+
+    def unwatch(self, dev):
+        """stop watching a closed device, its requests stay counted
+
+        Args:
+            dev (LogiHPP20): the device
+        """
+        with self.lock:
+            for x in [x for x in self.devices if x[0]() is dev]:
+                self.devices.remove(x)
+                self.closed_requests += x[1]['requests']
+
+    def add_hook(self, callback):
+        """get every finished span, also turns span recording on
+
+        Args:
+            callback (function): called with (name, seconds, requests)
+        """
+        self.hooks.append(callback)
+
+    def span(self, name):
+        """
+        Args:
+            name (str): span name
+
+        Returns:
+            context manager, recording only if enabled or hooked
+        """
+        if not self.enabled and not self.hooks:
+            return NO_SPAN
+        return Span(self, name)
+
+    def mark(self, step):
+        """end a top level step, started at the last mark
+
+        Args:
+            step (str): step name
+        """
+        now = time.perf_counter()
+        requests = self.requests()
+        with self.lock:
+            node = Node(step)
+            node.count = 1
+            node.seconds = now - self.last
+            node.requests = requests - self.last_requests
+            node.children = self.pending.children
+            self.pending = Node('')
+            if step in self.root.children:
+                self.root.children[step].merge(node)
+            else:
+                self.root.children[step] = node
+        self.last = now
+        self.last_requests = requests
+        for callback in self.hooks:
+            callback(step, node.seconds, node.requests)
+
+    def print_tree(self, file = None):
+        """
+        Args:
+            file (file, optional): Defaults to None for stdout.
+        """
+        print('timings:', file = file)
+        self._print(self.root.children.values(), 1, file)
+        total = f"{'total':<32}{(time.perf_counter() - self.start)*1000:8.1f}ms"
+        print(f'  {total}{self.requests():>6} requests', file = file)
+
+    def _print(self, nodes, depth, file = None):
+        for x in nodes:
+            name = '  ' * depth + x.name + (f' x{x.count}' if x.count > 1 else '')
+            requests = f'{x.requests:>6} requests' if x.requests else ''
+            print(f'{name:<34}{x.seconds*1000:8.1f}ms{requests}', file = file)
+            self._print(x.children.values(), depth + 1, file)
+
+
+timings = Timings()
+span = timings.span
@@ -1,4 +1,4 @@
-import json, os
+import json, math, os, time
 
 def pretty_json(j):
     return json.dumps(j, indent=2, ensure_ascii=False)
@@ -63,6 +63,56 @@ def crc16_ccitt(data):
         lsb = (x ^ (x << 5)) & 0xFF
     return (msb << 8) + lsb
 
+def percentile(values, p):
+    """nearest-rank percentile
+
+    Args:
+        values (list): samples
+        p (float): 0-100
+
+    Returns:
+        float: value, 0 for no samples
+    """
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, math.ceil(p / 100 * len(values)) - 1))]
+
+def cache_folder(*parts):
+    """user cache folder: $XDG_CACHE_HOME/omm, %LOCALAPPDATA%/omm on windows or ~/.cache/omm
+
+    Args:
+        parts (str): subfolders
+
+    Returns:
+        str: path, not created
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or (os.name == 'nt' and os.environ.get('LOCALAPPDATA')) or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'omm', *parts)
+
+def prune_files(folder, max_files, max_age, suffix = '.json'):
+    """remove cache files older than max_age seconds and the oldest ones past max_files
+
+    Returns:
+        int: number of files removed
+    """
+    try:
+        files = [os.path.join(folder, x) for x in os.listdir(folder) if x.endswith(suffix)]
+        files = sorted(((os.path.getmtime(x), x) for x in files), reverse = True)
+    except OSError:
+        return 0
+    now = time.time()
+    removed = 0
+    for i, (mtime, filename) in enumerate(files):
+        if i >= max_files or now - mtime > max_age:
+            try:
+                os.remove(filename)
+                removed += 1
+            except OSError:
+                #removed by another process
+                pass
+    return removed
+
 def str2int(v):
     if v.lower() in ['yes', 'true', 'y', '1', 'on']:
         return 1
@@ -1,12 +1,31 @@
-from libs.LogiHPP20 import LogiHPP20
-from libs.FeatureOnboardProfile import FeatureOnboardProfile
-from libs.HidppConstants import USBReceiver
-from libs.utils import *
-import argparse, os
+import time
+start_time = time.perf_counter()
+import argparse, contextlib, os, sys
 import configparser 
+from libs.utils import *
+from libs.Timings import timings
 
-if __name__ == "__main__":
-    
+#steps and spans for "--timings", counted from the start of the script
+timings.start = timings.last = start_time
+mark = timings.mark
+#"--metrics" output file, (labels, device) of the opened device
+metrics_file = ''
+metrics_device = None
+#"--timings" tree output, stderr when stdout has json lines
+timings_file = None
+#"--pstats" output file and profiler
+pstats_file = ''
+profiler = None
+
+def load_profiles(import_json, profile_index):
+    #a json file or a profile set "1=a.json,2=b.json", profile index => json
+    profiles = {}
+    for x in import_json.split(','):
+        idx, _, filename = x.rpartition('=')
+        profiles[int(idx) if idx else profile_index] = load_from_file(filename, 'json')
+    return profiles
+
+def main():
     parser = argparse.ArgumentParser(description='Logitech Onboard Memory Manager Python')
     parser.add_argument('-l', '--list', help='list all Logitech devices',  action='store_true', required = False, default=False)    
     parser.add_argument('-p', '--profile', help='profile index, starting from 1', type=int, required=False, default=1)
@@ -18,13 +37,57 @@ if __name__ == "__main__":
     group.add_argument('--dump', help='print profile info', action='store_true', required = False, default = False)
     group.add_argument('--export', help='export profile settings to json file', type=str, required = False, default='')
     group.add_argument('--import', help='import profile settings from json file', type=str, required = False, default='')
+    group.add_argument('--diff', help='compare a json profile with the device, without writing', type=str, required = False, default='')
+    group.add_argument('--validate', help='check json profiles without the device: files, folders or patterns, comma seperated', type=str, required = False, default='')
     group.add_argument('--decode', help='convert saved binary to json', type=str, required = False, default='')
     group.add_argument('--debugout', help='save raw memory page(s) to "debug" folder', type=str, required = False, default='')
     group.add_argument('--debugin', help='load raw memory page', type=str, required = False, default='')
     group.add_argument('--visible', help='set profile visibility', type=str2int, required = False, default='')
     group.add_argument('--enable', help='enable profile',  action='store_true', required = False, default=False)
+    group.add_argument('--watch', help='push a json profile to the device each time the file is saved, until ctrl+c', type=str, required = False, default='')
+    group.add_argument('--monitor', help='print profile and dpi changes made on the device until ctrl+c', action='store_true', required = False, default=False)
+    group.add_argument('--analytics', help='with archive, print report rate, dpi and macro statistics of the latest snapshots, without the device', action='store_true', required = False, default=False)
+    parser.add_argument('--fleet', help='apply "--import" to many devices: "all", a pid like 0xc08b, or serial numbers "sn1,sn2"', type=str, required = False, default='')
+    parser.add_argument('--workers', help='for fleet option, number of devices provisioned at once, 0 for all', type=int, required = False, default=0)
+    parser.add_argument('--processes', help='for fleet option, use a process pool instead of threads', action='store_true', required = False, default=False)
+    parser.add_argument('--journal', help='for import option, journal folder to resume an interrupted import', type=str, required = False, default='')
+    parser.add_argument('--jsonl', help='with dump or export, one compact json line per enabled profile as soon as it is decoded, all profiles. export "-" for stdout', action='store_true', required = False, default=False)
+    parser.add_argument('--jsonl-macros', help='for jsonl option, also one line per macro', action='store_true', required = False, default=False)
+    parser.add_argument('--archive', help='with export, also add the profile pages to an archive file. with decode, a serial number to decode from the archive. with analytics, the archive to summarize', type=str, required = False, default='')
+    parser.add_argument('--set-button', help='change one button of the profile in place, e.g. "6=key:f13", "6=button:left_button", "g6=macro:a b". repeat for more', type=str, action='append', required = False, default=[])
+    parser.add_argument('--set-dpi', help='change one dpi slot of the profile in place, e.g. "2=1600". repeat for more', type=str, action='append', required = False, default=[])
+    parser.add_argument('--dpi', help='set dpi now in host mode, without writing a profile', type=int, required = False, default=0)
+    parser.add_argument('--rate', help='set report rate(hz) now in host mode, without writing a profile', type=int, required = False, default=0)
+    parser.add_argument('--record', help='save all hid++ reports of this run to a recording file', type=str, required = False, default='')
+    parser.add_argument('--replay', help='use a recording file instead of the device', type=str, required = False, default='')
+    parser.add_argument('--replay-timing', help='for replay option, keep the recorded reply timing', action='store_true', required = False, default=False)
+    parser.add_argument('--tune', help='measure timeout and pipeline depth again, instead of the cached values', action='store_true', required = False, default=False)
+    parser.add_argument('--dry-run', help='for import / export, print the planned page i/o and estimated time from the cached device info, without the device', action='store_true', required = False, default=False)
+    parser.add_argument('--metrics', help='save request, retry, latency and throughput metrics: prometheus textfile for ".prom", else json lines', type=str, required = False, default='')
+    parser.add_argument('--timings', help='print a tree of import, init and command timings with request counts', action='store_true', required = False, default=False)
+    parser.add_argument('--pstats', help='save a cProfile dump of the run, for python -m pstats or snakeviz', type=str, required = False, default='')
 
     args = vars(parser.parse_args())
+    if not args['jsonl']:
+        return run(args)
+    from libs.JsonLines import JsonLines
+    assert args['dump'] or args['export'], '"--jsonl" needs "--dump" or "--export"'
+    global timings_file
+    timings_file = sys.stderr
+    to_file = args['export'] and args['export'] != '-'
+    with (open(args['export'], 'w', encoding='utf-8') if to_file else contextlib.nullcontext(sys.stdout)) as out:
+        #messages go to stderr until the command is done, out only has json lines
+        with contextlib.redirect_stdout(sys.stderr):
+            return run(args, JsonLines(out, args['jsonl_macros']))
+
+
+def run(args, stream = None):
+    """run a command
+
+    Args:
+        args (dict): parsed command line
+        stream (JsonLines, optional): "--jsonl" output. Defaults to None.
+    """
     profile_index = args['profile']
     dev_name = args['name']
     dump_mode = args['dump']
@@ -39,11 +102,30 @@ if __name__ == "__main__":
     debugout = args['debugout']
     debugin = args['debugin']
     page = args['page']
+    fleet = args['fleet']
+    global metrics_file, metrics_device, pstats_file, profiler
+    timings.enabled = args['timings']
+    metrics_file = args['metrics']
+    if args['pstats']:
+        import cProfile
+        pstats_file = args['pstats']
+        profiler = cProfile.Profile()
+        profiler.enable()
+    mark('startup')
 
-    
     if list_mode:
+        from libs.LogiHPP20 import LogiHPP20
         LogiHPP20.list_devices()
-        exit()
+        return
+
+    if args['analytics']:
+        #every model in the archive, no device needed
+        assert args['archive'], '"--analytics" needs "--archive"'
+        from libs.ProfileArchive import ProfileArchive
+        from libs.ProfileAnalytics import ProfileTable
+        with ProfileArchive(args['archive']) as archive:
+            ProfileTable.from_archive(archive).print_summary()
+        return
 
     config = configparser.ConfigParser()
     config.read('devices.ini')
@@ -56,15 +138,170 @@ if __name__ == "__main__":
         dev_idx = int(config[dev_name]['index'], 16)
     if dev_pid == 0 or dev_idx < 0:
         print('must set "pid" and "index"')
-        exit()
+        return
+
+    if args['validate'] or import_json:
+        #check json profiles before any device i/o, with the device's cached geometry if known
+        from libs.DeviceCache import DeviceCache
+        geometry = DeviceCache().find_geometry(dev_pid, dev_idx)
+    if args['validate']:
+        import glob
+        from libs.ProfileSchema import validate_files
+        files = []
+        for x in args['validate'].split(','):
+            files += sorted(glob.glob(os.path.join(x, '*.json'))) if os.path.isdir(x) else sorted(glob.glob(x)) or [x]
+        results = validate_files(files, geometry, profile_index, args['workers'])
+        for filename, errors in results.items():
+            for e in errors:
+                print(f'{filename}: {e}')
+        failed = sum(1 for x in results.values() if x)
+        print(f'{len(files) - failed}/{len(files)} files ok')
+        if failed:
+            sys.exit(1)
+        return
+    if import_json:
+        from libs.ProfileSchema import ProfileSchema
+        schema = ProfileSchema(geometry)
+        errors = [f'profile {idx}, {e}' for idx, j in load_profiles(import_json, profile_index).items() for e in schema.validate(j, idx)]
+        for e in errors:
+            print(e)
+        assert not errors, f'{len(errors)} errors in "{import_json}", nothing written'
+    patch_buttons = patch_dpi = None
+    if args['set_button'] or args['set_dpi']:
+        #parse and check before any device i/o
+        from libs.ProfilePatch import ProfilePatch, parse_button, parse_dpi
+        patch_buttons = [parse_button(x) for x in args['set_button']]
+        patch_dpi = [parse_dpi(x) for x in args['set_dpi']]
+
+    if args['dry_run']:
+        from libs.DeviceCache import DeviceCache
+        from libs.DryRun import DryRun
+        entry = DeviceCache().find_entry(dev_pid, dev_idx)
+        assert entry is not None, f'no cached info for {dev_name}, run any command with the device once'
+        plan = DryRun(entry['geometry'], entry.get('tuning'))
+        print(f'dry run for {dev_name}, no device i/o')
+        if import_json:
+            for idx, j in sorted(load_profiles(import_json, profile_index).items()):
+                plan.plan_import(idx, j)
+            if do_switch:
+                plan.plan_switch(profile_index)
+        else:
+            assert export_json, 'dry run needs "--import" or "--export"'
+            plan.plan_export(profile_index)
+        devices = 1
+        if fleet:
+            from libs.Fleet import select_devices
+            devices = len(select_devices(fleet, dev_pid))
+        plan.print_plan(devices, args['workers'])
+        return
+
+    if fleet:
+        from libs.Fleet import select_devices, run_fleet, print_report
+        assert import_json or args['diff'] or stream, 'fleet mode needs "--import" or "--diff", a json file or a profile set "1=a.json,2=b.json", or "--jsonl"'
+        profiles = load_profiles(import_json or args['diff'], profile_index) if not stream else {}
+        targets = select_devices(fleet, dev_pid)
+        print(f'provisioning {len(targets)} devices')
+        results, wall_time = run_fleet(targets, [dev_idx], profiles, profile_index if do_switch else 0, args['workers'], args['processes'], args['journal'], bool(args['diff']), stream)
+        if args['diff']:
+            from libs.ProfileDiff import print_diff
+            for r in results:
+                for idx, changes in sorted(r['changes'].items()):
+                    if changes:
+                        print(f"{r['serial']} 0x{r['index']:02X}", end = ' ')
+                        print_diff(idx, changes)
+        print_report(results, wall_time)
+        if metrics_file:
+            from libs.Telemetry import write_metrics, fleet_samples
+            write_metrics(metrics_file, fleet_samples(results))
+        return
 
-    dev = LogiHPP20(dev_pid, '', [dev_idx]) 
+    if decode_bin and args['archive']:
+        from libs.ProfileArchive import ProfileArchive
+        with ProfileArchive(args['archive']) as archive:
+            entry = archive.latest(decode_bin, dev_pid, profile_index)
+            assert entry is not None, f'profile {profile_index} of {decode_bin} is not in {args["archive"]}'
+            print(f"{entry.meta['name']} {entry.serial} profile {profile_index}, {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry.time))}")
+            print(pretty_json(entry.profile_json()))
+        return
+
+    if decode_bin and not args['replay']:
+        #no device needed if its geometry is cached
+        from libs.DeviceCache import DeviceCache
+        geometry = DeviceCache().find_geometry(dev_pid, dev_idx)
+        if geometry is not None:
+            from libs.FeatureOnboardProfile import OnboardProfileImage
+            data = load_bin_from_file(decode_bin)
+            try:
+                j = OnboardProfileImage(geometry).profile_bin_to_json(data)
+                mark('decode')
+                print(pretty_json(j))
+                return
+            except AssertionError:
+                #macros are in memory pages on the device
+                pass
+
+    from libs.LogiHPP20 import LogiHPP20
+    from libs.FeatureOnboardProfile import FeatureOnboardProfile
+    mark('import libs')
+    if args['replay']:
+        from libs.HidppRecord import ReplayPort
+        port = ReplayPort(args['replay'], args['replay_timing'])
+        dev = LogiHPP20(port = port, index_list = [port.device_index])
+    else:
+        dev = LogiHPP20(dev_pid, '', [dev_idx]) 
+    if args['record']:
+        dev.record(args['record'])
+    if metrics_file:
+        from libs.Telemetry import device_labels
+        metrics_device = (device_labels(dev), dev)
     omm = FeatureOnboardProfile(dev)
+    mark('open')
+    switch_only = do_switch and not (import_json or export_json or dump_mode or debugout or debugin or enable_mode or toggle_vis >= 0 or args['monitor'] or args['watch'] or args['diff'] or patch_buttons or patch_dpi)
+    #a few requests without page i/o are faster than measuring
+    no_pages = switch_only or toggle_onboard >= 0 or args['dpi'] or args['rate']
+    if not args['replay'] and (args['tune'] or not no_pages):
+        from libs.DeviceCache import DeviceCache
+        tuning = DeviceCache().tune(dev, omm, args['tune'], not args['record'])
+        mark('tune')
+        if args['tune']:
+            print(f"{tuning['connection']}: rtt p50 {tuning['rtt_p50']}ms p99 {tuning['rtt_p99']}ms, timeout {tuning['timeout']}ms, pipeline depth {tuning['pipeline_depth']}")
+            print('report types:', ', '.join(name for name, port in [('short', dev.port_short), ('long', dev.port_long), ('very long', dev.port_very_long)] if port is not None))
+
+    if args['dpi'] or args['rate']:
+        from libs.FeatureAdjustableDpi import FeatureAdjustableDpi
+        from libs.FeatureReportRate import FeatureReportRate
+        if omm.onboard_mode:
+            print('switch to host mode, run "omm.py --onboard on" to go back to onboard profiles')
+            omm.onboard_mode = False
+        if args['dpi']:
+            FeatureAdjustableDpi(dev).set_dpi(args['dpi'])
+            print('set dpi:', args['dpi'])
+        if args['rate']:
+            FeatureReportRate(dev).rate = args['rate']
+            print('set report rate:', args['rate'])
+        omm.close()
+        return
 
-    early_exit = toggle_onboard >=0 or enable_mode or toggle_vis >= 0
     if toggle_onboard >= 0:
-        omm.onboard_mode = True if toggle_onboard == 1 else False
+        #setting the mode reloads the profile on some devices, only when it changes
+        if omm.onboard_mode != (toggle_onboard == 1):
+            omm.onboard_mode = toggle_onboard == 1
+        else:
+            print('onboard mode already', 'on' if toggle_onboard == 1 else 'off')
+        omm.close()
+        return
     omm.dest_profile = profile_index
+    if switch_only:
+        #fast path, no device info
+        if not omm.onboard_mode:
+            print('onboard mode disabled! run "omm.py --onboard on" first!')
+        else:
+            assert omm.profile_enabled, f'profile {omm.dest_profile} is disabled!, run "omm.py -p {omm.dest_profile} --enable on" first!'
+            omm.current_profile = omm.dest_profile
+        omm.close()
+        return
+
+    early_exit = enable_mode or toggle_vis >= 0
     if enable_mode:
         omm.profile_enabled = True
     elif toggle_vis >= 0:
@@ -73,7 +310,13 @@ if __name__ == "__main__":
         early_exit = True
     if early_exit:
         omm.close()
-        exit()    
+        return
+
+    if stream is not None:
+        from libs.JsonLines import stream_profiles
+        stream_profiles(omm, stream)
+        omm.close()
+        return
 
     assert omm.profile_enabled, f'profile {omm.dest_profile} is disabled!, run "omm.py -p {omm.dest_profile} --enable on" first!'
     if export_json:
@@ -82,16 +325,42 @@ if __name__ == "__main__":
             j = omm.profile_bin_to_json(data)
             print('Export settings to:', export_json)
             save_file(export_json, pretty_json(j))
+        if args['archive']:
+            from libs.ProfileArchive import ProfileArchive, read_snapshot
+            with ProfileArchive(args['archive'], True) as archive:
+                archive.add(dev.hidpp20_info('serial'), dev.product_id, dev.device_index, dev.product_name, omm, omm.dest, read_snapshot(omm, data))
+            print('Archive to:', args['archive'])
 
     elif import_json:
-        if import_json and os.path.isfile(import_json):
-            j = load_from_file(import_json, 'json')
+        #a json file or a profile set "1=a.json,2=b.json", same as in fleet mode
+        for idx, j in sorted(load_profiles(import_json, profile_index).items()):
+            omm.dest_profile = idx
+            assert omm.profile_enabled, f'profile {idx} is disabled!, run "omm.py -p {idx} --enable on" first!'
             data = omm.profile_bin_from_json(j)
             #data is an array, data[0]: profile, data[1] data[2]: macro
-            omm.onboard_profile_save(data)
+            journal = None
+            if args['journal']:
+                from libs.HidppJournal import WriteJournal
+                journal = WriteJournal.for_device(args['journal'], dev, idx)
+            omm.onboard_profile_save(data, journal)
+        omm.dest_profile = profile_index
+        if do_switch:
+            omm.current_profile = omm.dest_profile
+
+    elif patch_buttons or patch_dpi:
+        patch = ProfilePatch(omm)
+        for position, j, key in patch_buttons:
+            patch.set_button(position, j, key)
+        for position, dpi in patch_dpi:
+            patch.set_dpi(position, dpi)
+        print(f'profile {omm.dest_profile}: {patch.apply()} bytes written')
         if do_switch:
             omm.current_profile = omm.dest_profile
      
+    elif args['diff']:
+        from libs.ProfileDiff import diff_profile, print_diff
+        print_diff(omm.dest_profile, diff_profile(omm, load_from_file(args['diff'], 'json')))
+
     elif dump_mode:
         data = omm.onboard_profile_to_bin()
         j = omm.profile_bin_to_json(data)
@@ -119,8 +388,33 @@ if __name__ == "__main__":
         if r.lower() == 'y':
             omm.write_memory_page(page, data, False)
 
-    elif do_switch:
-        omm.current_profile = omm.dest_profile
+    elif args['watch']:
+        from libs.ProfileWatch import ProfileWatch
+        ProfileWatch(omm, args['watch']).run()
+
+    elif args['monitor']:
+        state = omm.monitor(lambda event, state: print(f"{event} changed: profile {state['profile']}, dpi index {state['dpi_index']}"))
+        print(f"monitoring, profile {state['profile']}, ctrl+c to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
 
     omm.close()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(pstats_file)
+        if timings.enabled:
+            mark('command')
+            timings.print_tree(timings_file)
+        if metrics_device is not None:
+            from libs.Telemetry import write_metrics
+            write_metrics(metrics_file, [(metrics_device[0], metrics_device[1].metrics())])
     
\ No newline at end of file
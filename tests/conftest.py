@@ -0,0 +1,240 @@
+import os, queue, struct, sys, threading
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from libs.utils import crc16_ccitt
+
+#root, feature set, device name, onboard profiles
+FEATURES = [0x0000, 0x0001, 0x0005, 0x8100]
+NAME = b'G502 HERO Gaming Mouse'
+#getInfo: memory layout, profile format, macro format, profiles, oob profiles, buttons, pages, page size, g-shift
+INFO = struct.pack('>BBBBBBBHB', 1, 2, 1, 5, 5, 11, 16, 256, 2)
+
+
+def with_crc(page):
+    page[-2:] = struct.pack('>H', crc16_ccitt(page[:-2]))
+    return page
+
+
+def g502_pages():
+    """page 0 directory, 5 profiles in pages 1-5, profile 1 button 6 runs the macro in page 6
+    """
+    pages = {0: bytearray(b'\xff' * 256)}
+    for i in range(5):
+        pages[0][i*4:i*4+4] = bytes([0, i+1, 1, 0])
+    with_crc(pages[0])
+    buttons = [0x80010001, 0x80010002, 0x80010004, 0x80010008, 0x80010010, 0x9005FF00, 0x80020004,
+               0x9001FF00, 0x9002FF00, 0x900BFF00, 0x9008FF00]
+    for i in range(1, 6):
+        page = bytearray(b'\xff' * 256)
+        page[0:3] = bytes([1, 1, 0])
+        for k, dpi in enumerate([400, 800, 1600, 3200, 6400]):
+            struct.pack_into('<H', page, 3 + k*2, dpi)
+        page[13:16] = bytes([0xff, 0, 0])
+        for k, x in enumerate(buttons):
+            struct.pack_into('>I', page, 32 + k*4, 0x00060000 if i == 1 and k == 6 else x)
+            struct.pack_into('>I', page, 96 + k*4, 0x80010001)
+        page[160:208] = (f'profile {i}'.encode('utf-16le') + bytes(48))[:48]
+        for z in range(4):
+            page[208+z*11:219+z*11] = bytes([1, 0, 0xff, 0]) + bytes(7)
+        pages[i] = with_crc(page)
+    #"a" down and up
+    pages[6] = bytearray(b'\xff' * 256)
+    pages[6][0:7] = bytes([0x43, 0, 4, 0x44, 0, 4, 0xff])
+    return pages
+
+
+class FakePort:
+    """long report port of a wired mouse with onboard profiles, in place of hid.Device.
+
+        replies are queued when a request is written, or after delay seconds.
+    """
+    def __init__(self, pages = None, delay = 0, serial = 'SN1', features = FEATURES):
+        self.pages = pages or g502_pages()
+        self.features = features
+        self.delay = delay
+        self.replies = queue.Queue()
+        self.product = 'G502 HERO Gaming Mouse'
+        self.serial = serial
+        self.profile = 1
+        #1 onboard, 2 host mode
+        self.mode = 1
+        self.write_addr = None
+        self.writes = []
+        #(function, params prefix) => deliver late, the reply of the next matching request is lost
+        self.lost = {}
+        self.late = []
+        #(function, params prefix) of requests answered with an hid++ error
+        self.failing = set()
+        self.closed = False
+
+    def lose(self, func, params, late = False):
+        """drop the reply of the next request of onboard profile function func whose params start with params
+
+        Args:
+            late (bool, optional): deliver it after the next request instead. Defaults to False.
+        """
+        self.lost[(func, bytes(params))] = late
+
+    def fail(self, func, params = b''):
+        """answer requests of onboard profile function func whose params start with params with an error
+        """
+        self.failing.add((func, bytes(params)))
+
+    def page(self, page):
+        return self.pages.setdefault(page, bytearray(b'\xff' * 256))
+
+    def handle(self, data):
+        index, feature_idx, func, params = data[1], data[2], data[3] >> 4, bytes(data[4:])
+        if feature_idx >= len(self.features):
+            return bytes([0x11, index, 0xFF, feature_idx, data[3], 7]) + bytes(14)
+        feature = self.features[feature_idx]
+        if feature == 0x8100 and any(func == x and params.startswith(p) for x, p in self.failing):
+            #hid++ 2.0 error, invalid argument
+            return bytes([0x11, index, 0xFF, feature_idx, data[3], 2]) + bytes(14)
+        out = b''
+        if feature == 0x0000:
+            if func == 0:
+                f = struct.unpack('>H', params[:2])[0]
+                out = bytes([self.features.index(f) if f in self.features else 0])
+            elif func == 1:
+                out = bytes([4, 2, params[2]])
+        elif feature == 0x0005:
+            out = bytes([len(NAME)]) if func == 0 else NAME[params[0]:params[0]+16]
+        elif feature == 0x8100:
+            if func == 0:
+                out = INFO
+            elif func == 1:
+                self.mode = params[0]
+            elif func == 2:
+                out = bytes([self.mode])
+            elif func == 3:
+                self.profile = params[1]
+            elif func == 4:
+                out = bytes([0, self.profile])
+            elif func == 5:
+                page, offset = struct.unpack('>HH', params[:4])
+                out = bytes(self.page(page)[offset:offset+16])
+            elif func == 6:
+                self.write_addr = list(struct.unpack('>HH', params[:4]))
+            elif func == 7:
+                page, offset = self.write_addr
+                self.page(page)[offset:offset+16] = params[:16]
+                self.write_addr[1] += 16
+        return bytes(data[:4]) + (out + bytes(16))[:16]
+
+    def write(self, data):
+        data = bytes(data)
+        self.writes.append(data)
+        reply = self.handle(data)
+        late, self.late = self.late, []
+        for (func, params), delay in list(self.lost.items()):
+            if data[2] == 3 and data[3] >> 4 == func and data[4:].startswith(params):
+                del self.lost[(func, params)]
+                if delay:
+                    self.late.append(reply)
+                reply = None
+                break
+        for x in late + ([reply] if reply else []):
+            if self.delay:
+                threading.Timer(self.delay, self.replies.put, [x]).start()
+            else:
+                self.replies.put(x)
+        return len(data)
+
+    def read(self, size = 255, timeout = None):
+        try:
+            return self.replies.get(timeout = None if timeout is None else timeout / 1000)
+        except queue.Empty:
+            return b''
+
+    def get_report_descriptor(self):
+        #long reports only
+        return bytes([0x85, 0x11])
+
+    def close(self):
+        self.closed = True
+
+
+class FakeReceiver(FakePort):
+    """long report port of a receiver, requests go to the mouse paired in the slot of their device index.
+        empty slots never reply.
+    """
+    def __init__(self, slots, delay = 0, serial = 'RCV1'):
+        super().__init__(delay = delay, serial = serial)
+        self.product = 'USB Receiver'
+        #device index => FakePort
+        self.slots = slots
+
+    def handle(self, data):
+        slot = self.slots.get(data[1])
+        return None if slot is None else slot.handle(data)
+
+
+class FakeHid:
+    """hid module with fake devices, in place of libs.LogiHPP20.hid. Device() of a path always returns the same port.
+    """
+    def __init__(self):
+        self.ports = []
+
+    def add(self, pid, port):
+        self.ports.append((pid, port))
+        return port
+
+    def enumerate(self, vid = 0, pid = 0):
+        return [{'path': str(i).encode(), 'vendor_id': 0x046D, 'product_id': _pid, 'serial_number': port.serial,
+                 'usage_page': 0xFF00, 'manufacturer_string': 'Logitech', 'product_string': port.product}
+                for i, (_pid, port) in enumerate(self.ports) if not pid or _pid == pid]
+
+    def Device(self, path):
+        return self.ports[int(path)][1]
+
+
+@pytest.fixture(autouse = True)
+def cache_home(tmp_path, monkeypatch):
+    #keep the profile and device caches out of the user's cache folder
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    from libs.ProfileCache import ProfileCache
+    monkeypatch.setattr(ProfileCache, 'memory', {})
+    return tmp_path / 'cache'
+
+
+@pytest.fixture
+def fake_hid(monkeypatch):
+    import libs.LogiHPP20
+    fake = FakeHid()
+    monkeypatch.setattr(libs.LogiHPP20, 'hid', fake)
+    return fake
+
+
+@pytest.fixture
+def port():
+    return FakePort()
+
+
+@pytest.fixture
+def dev(port):
+    from libs.LogiHPP20 import LogiHPP20
+    dev = LogiHPP20(port = port, index_list = [0xFF])
+    dev.retries = 1
+    yield dev
+    dev.close()
+
+
+@pytest.fixture
+def omm(dev):
+    from libs.FeatureOnboardProfile import FeatureOnboardProfile
+    omm = FeatureOnboardProfile(dev)
+    omm.dest_profile = 1
+    return omm
+
+
+@pytest.fixture
+def geometry(omm):
+    return omm.geometry()
+
+
+@pytest.fixture
+def profile(omm):
+    """json of profile 1, button 6 has a macro"""
+    return omm.profile_bin_to_json(omm.read_memory_page(1))
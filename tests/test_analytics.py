@@ -0,0 +1,61 @@
+import struct
+import pytest
+np = pytest.importorskip('numpy')
+from libs.ProfileArchive import ProfileArchive
+from libs.ProfileAnalytics import ProfileTable, MACRO, BUTTON, KEY
+from libs.utils import crc16_ccitt
+
+
+def page_with(page, **fields):
+    #set the rate byte or default dpi index of a profile page
+    page = bytearray(page)
+    if 'rate' in fields:
+        page[0] = fields['rate']
+    if 'dpi_default' in fields:
+        page[1] = fields['dpi_default']
+    page[-2:] = struct.pack('>H', crc16_ccitt(page[:-2]))
+    return page
+
+
+@pytest.fixture
+def table(tmp_path, omm, geometry):
+    """(serial, extended rates, rate byte, default dpi index, profile) snapshots"""
+    extended = dict(geometry, extended_report_rate = True)
+    rows = [('SN1', geometry, 1, 0, 1), ('SN2', geometry, 3, 2, 2), ('SN3', extended, 6, 4, 2), ('SN4', extended, 0xFF, 1, 2)]
+    filename = str(tmp_path / 'a.omma')
+    with ProfileArchive(filename, True) as a:
+        for i, (serial, g, rate, dpi, profile_index) in enumerate(rows):
+            layout = omm.page_layout[profile_index]
+            page = page_with(omm.read_memory_page(layout[0]), rate = rate, dpi_default = dpi)
+            pages = [(layout[0], page)] + [(x, omm.read_memory_page(x, False)) for x in layout[1:]]
+            a.add(serial, 0xC08B, 0xFF, 'G502' if g is geometry else 'G PRO', g, profile_index, pages, i)
+        #an older snapshot, not in the table
+        a.add('SN1', 0xC08B, 0xFF, 'G502', geometry, 1, pages, -1)
+    with ProfileArchive(filename) as a:
+        return ProfileTable.from_archive(a)
+
+
+def test_report_rate(table):
+    #wrong rate bytes are 0, not clipped to the fastest rate
+    assert list(table.report_rate()) == [1000, 0, 8000, 0]
+
+
+def test_dpi_and_distribution(table):
+    assert list(table.dpi()) == [400, 1600, 6400, 800]
+    assert table.distribution(table.dpi(), 'model') == {'G502': {400: 1, 1600: 1}, 'G PRO': {800: 1, 6400: 1}}
+    assert table.names() == ['profile 1', 'profile 2', 'profile 2', 'profile 2']
+
+
+def test_button_actions(table):
+    actions = table.button_actions()
+    assert actions.shape == (4, 16)
+    assert actions[0, 6] == MACRO and actions[0, 0] == BUTTON and actions[1, 6] == KEY
+    assert (actions[:, 11:] == -1).all()
+    assert table.where(table.has_macro(6)) == [{'serial': 'SN1', 'pid': 0xC08B, 'index': 0xFF, 'profile': 1}]
+    assert len(table[table.report_rate() == 0]) == 2
+
+
+def test_summary(table, capsys):
+    table.print_summary()
+    out = capsys.readouterr().out
+    assert '4 profiles of 4 devices' in out and '  G PRO: 0 x1, 8000 x1' in out
@@ -0,0 +1,45 @@
+import os
+from libs.ProfileArchive import ProfileArchive, HEADER, ENTRY
+
+
+def snapshot(omm, profile_index):
+    layout = omm.page_layout[profile_index]
+    return [(layout[0], omm.read_memory_page(layout[0]))] + [(x, omm.read_memory_page(x, False)) for x in layout[1:]]
+
+
+def test_find_and_latest(tmp_path, omm, geometry, profile):
+    filename = str(tmp_path / 'a.omma')
+    pages = snapshot(omm, 1)
+    with ProfileArchive(filename, True) as a:
+        a.add('SN2', 0xC08B, 0xFF, 'G502', geometry, 1, pages, 100)
+        a.add('SN1', 0xC08B, 0xFF, 'G502', geometry, 1, pages, 200)
+        a.add('SN1', 0xC08B, 0xFF, 'G502', geometry, 2, snapshot(omm, 2), 150)
+    #the same serial on a receiver, newer
+    with ProfileArchive(filename, True) as a:
+        a.add('SN1', 0xC08B, 1, 'G502', geometry, 1, pages, 300)
+        a.add('SN1', 0xC08B, 0xFF, 'G502', geometry, 1, pages, 50)
+    with ProfileArchive(filename) as a:
+        assert len(a) == 5
+        assert [(x.device_index, x.time) for x in a.find('SN1', 0xC08B, 1)] == [(1, 300.0), (0xFF, 50.0), (0xFF, 200.0)]
+        latest = a.latest('SN1')
+        assert (latest.device_index, latest.time) == (1, 300.0)
+        assert a.latest('SN1', None, 2).time == 150.0
+        assert a.latest('SN3') is None and a.latest('SN1', 0x1234) is None
+        assert len(list(a.entries(latest = True))) == 4
+        assert latest.profile_json() == profile
+        assert bytes(latest.profile_page()) == bytes(pages[0][1])
+
+
+def test_compact(tmp_path, omm, geometry):
+    filename = str(tmp_path / 'a.omma')
+    pages = snapshot(omm, 1)
+    for i in range(100):
+        with ProfileArchive(filename, True) as a:
+            a.add(f'SN{i}', 0xC08B, 0xFF, 'G502', geometry, 1, pages, i)
+    with ProfileArchive(filename) as a:
+        assert len(a) == 100
+        live = HEADER.size + sum(a.entry(i).length for i in range(100)) + 100 * ENTRY.size
+        assert [a.latest(f'SN{i}').time for i in range(100)] == list(range(100))
+    #old indexes are dropped when they take more than half of the file
+    assert os.path.getsize(filename) <= live * 3 // 2 + ENTRY.size
+    assert not os.path.exists(filename + '.tmp')
@@ -0,0 +1,69 @@
+import asyncio, copy, struct
+import pytest
+from conftest import FakePort
+from libs.HidppAsync import AsyncTransport, AsyncLogiHPP20, AsyncOnboardProfile
+from libs.FeatureOnboardProfile import ADDRESS
+
+
+def run(port, test, timeout = 1.0):
+    async def main():
+        dev = AsyncLogiHPP20(AsyncTransport(port), 0xFF)
+        dev.timeout = timeout
+        try:
+            omm = await AsyncOnboardProfile.open(dev)
+            return await test(dev, omm)
+        finally:
+            dev.close()
+    return asyncio.run(main())
+
+
+def test_concurrent_page_reads():
+    port = FakePort(delay = 0.005)
+
+    async def test(dev, omm):
+        pages = await asyncio.gather(*[omm.read_memory_page(i) for i in range(1, 6)])
+        assert [bytes(x) for x in pages] == [bytes(port.pages[i]) for i in range(1, 6)]
+        assert dev.transport.stale == 0
+    run(port, test)
+
+
+def test_late_reply_is_not_taken_by_the_next_request():
+    port = FakePort()
+
+    async def test(dev, omm):
+        port.lose(5, ADDRESS.pack(1, 32), late = True)
+        with pytest.raises(AssertionError):
+            await omm.read_memory_page(1)
+        #the late reply comes with the next request, a macro page read without checksum
+        assert await omm.read_memory_page(6, False) == port.pages[6]
+        assert dev.transport.stale == 1
+    run(port, test, 0.05)
+
+
+def test_profile_save(profile):
+    port = FakePort()
+    j = copy.deepcopy(profile)
+    j['dpi_list'][0] = 500
+    j['buttons'][6] = {'action': 'macro', 'value': 'b'}
+
+    async def test(dev, omm):
+        await omm.profile_save(1, j)
+        return await omm.profile_to_json(1)
+    ret = run(port, test)
+    assert ret['dpi_list'][0] == 500 and ret['buttons'][6]['value'] == 'b'
+
+
+@pytest.mark.parametrize('func, params', [(6, struct.pack('>H', 1)), (7, b''), (8, b'')])
+def test_write_error(profile, func, params):
+    port = FakePort()
+    page = bytes(port.pages[1])
+    j = copy.deepcopy(profile)
+    j['dpi_list'][0] = 500
+    port.fail(func, params)
+
+    async def test(dev, omm):
+        with pytest.raises(AssertionError, match = 'error while writing memory page'):
+            await omm.profile_save(1, j)
+    run(port, test)
+    #stopped at the macro page, the profile page is not written
+    assert bytes(port.pages[1]) == page
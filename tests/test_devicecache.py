@@ -0,0 +1,51 @@
+import time
+from libs.DeviceCache import DeviceCache
+
+
+def test_timeout_floor(dev):
+    dev.tune_timeout([0.001] * 20)
+    assert dev.timeout == dev.min_timeout
+    dev.tune_timeout([0.5] * 20)
+    assert dev.timeout == 2020
+    #an entry from before the floor
+    dev.apply_tuning({'timeout': 50})
+    assert dev.timeout == dev.min_timeout
+
+
+def test_retune_after_timeouts(dev, omm, port, monkeypatch):
+    cache = DeviceCache()
+    tuning = cache.tune(dev, omm)
+    assert cache.tune(dev, omm) == tuning
+    dev.timeout = 20
+    handle = port.handle
+    monkeypatch.setattr(port, 'handle', lambda data: None)
+    for i in range(dev.retune_after):
+        assert dev.call_feature(0x8100, 4) is None
+    assert dev.timeout == 40
+    entry = cache.load(dev)
+    assert 'tuning' not in entry and 'geometry' in entry
+    #measured again on the next run
+    monkeypatch.setattr(port, 'handle', handle)
+    requests = dev.stats['requests']
+    cache.tune(dev, omm)
+    assert dev.stats['requests'] > requests and 'tuning' in cache.load(dev)
+
+
+def test_probe_empty_slot(port, monkeypatch):
+    from libs.LogiHPP20 import LogiHPP20
+    monkeypatch.setattr(port, 'handle', lambda data: None)
+    start = time.perf_counter()
+    dev = LogiHPP20(port = port, index_list = [3])
+    #one request with the probe timeout, no retries
+    assert dev.product_name == '' and len(port.writes) == 1
+    assert time.perf_counter() - start < 2 * dev.probe_timeout / 1000
+    assert dev.retries == 3 and dev.timeout == 5000 and dev.retune_after == 3
+
+
+def test_probe_lost_name(dev, port, monkeypatch):
+    handle = port.handle
+    #the name length request of feature 0x0005, index 2, gets no reply
+    monkeypatch.setattr(port, 'handle', lambda data: None if data[2] == 2 and data[3] >> 4 == 0 else handle(data))
+    dev.probe_timeout = 20
+    with dev.probing():
+        assert dev.get_device_name() is None
@@ -0,0 +1,32 @@
+import copy
+from libs.ProfileDiff import diff_profile
+
+
+def test_same_profile(omm, port, profile):
+    writes = len(port.writes)
+    assert diff_profile(omm, profile) == []
+    #only the checksum chunk of the profile page
+    reads = [x[4:8] for x in port.writes[writes:] if x[3] >> 4 == 5 and x[4:6] == bytes([0, 1])]
+    assert reads == [bytes([0, 1, 0, 240])]
+
+
+def test_changed_fields(omm, profile):
+    j = copy.deepcopy(profile)
+    j['dpi_list'][1] = 900
+    j['rgb'][0]['color'] = '0x123456'
+    j['buttons'][2] = {'action': 'key', 'modifier': 'lctrl', 'value': 'a'}
+    changes = {x['field']: (x['old'], x['new']) for x in diff_profile(omm, j)}
+    assert changes['dpi_list[1]'] == (800, 900)
+    assert changes['rgb[0]'][0]['color'] == '0x00ff00' and changes['rgb[0]'][1]['color'] == '0x123456'
+    assert changes['buttons[2]'] == ({'action': 'button', 'value': 'middle_button'},
+                                     {'action': 'key', 'modifier': 'lctrl', 'value': 'a'})
+    assert set(changes) == {'dpi_list[1]', 'rgb[0]', 'buttons[2]'}
+
+
+def test_changed_macro(omm, profile):
+    #same macro pointer, other macro
+    j = copy.deepcopy(profile)
+    j['buttons'][6] = {'action': 'macro', 'value': 'b'}
+    changes = diff_profile(omm, j)
+    assert [x['field'] for x in changes] == ['buttons[6]']
+    assert changes[0]['old']['value'] == 'a' and changes[0]['new']['value'] == 'b'
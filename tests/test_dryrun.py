@@ -0,0 +1,43 @@
+import copy
+from libs.DryRun import DryRun
+
+TUNING = {'connection': 'wired', 'timeout': 50, 'pipeline_depth': 4, 'rtt_p50': 2.0, 'rtt_p99': 4.0}
+
+
+def test_plan_import(geometry, profile, cache_home, capsys):
+    plan = DryRun(geometry, TUNING)
+    other = copy.deepcopy(profile)
+    other['buttons'][6] = {'action': 'button', 'value': 'left_button'}
+    plan.plan_import(1, profile)
+    plan.plan_import(2, other)
+    plan.plan_switch(1)
+    #macro page before its profile page, no macro page without macros, one switch at the end
+    assert [x[:3] for x in plan.steps] == [('write', 6, 256), ('write', 1, 256), ('write', 2, 256), ('switch', 1, 0)]
+    t = plan.totals()
+    assert t['pages'] == 3 and t['bytes'] == 768 and t['chunks'] == 48
+    #16 chunks plus start / end per page
+    assert t['transactions'] == 3 * 18 + 1
+    assert t['seconds'] == t['transactions'] * 2.0 / 1000
+    assert t['lower_bound']
+    plan.print_plan()
+    assert 'est. at least' in capsys.readouterr().out
+    #memory cache only
+    assert not (cache_home / 'omm' / 'profiles').exists()
+
+
+def test_plan_export(geometry):
+    plan = DryRun(geometry, TUNING)
+    plan.plan_export(2)
+    assert [x[:2] for x in plan.steps] == [('read', 2), ('macro', 8), ('macro', 9)]
+    t = plan.totals()
+    assert t['pages'] == 3 and t['transactions'] == 48 and not t['lower_bound']
+    #4 requests in flight
+    assert t['seconds'] == 12 * 2.0 / 1000
+
+
+def test_no_rtt(geometry, capsys):
+    plan = DryRun(geometry)
+    plan.plan_export(1)
+    assert plan.totals()['seconds'] is None
+    plan.print_plan()
+    assert 'no measured rtt' in capsys.readouterr().out
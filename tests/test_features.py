@@ -0,0 +1,108 @@
+import struct
+import pytest
+from conftest import FakePort, FEATURES
+from libs.LogiHPP20 import LogiHPP20
+from libs.FeatureAdjustableDpi import FeatureAdjustableDpi
+from libs.FeatureReportRate import FeatureReportRate
+
+
+#set dpi, set report rate, set extended report rate
+SETTERS = {0x2201: 3, 0x8060: 2, 0x8061: 3}
+
+
+class HostModePort(FakePort):
+    """a mouse with adjustable dpi and report rate features, the dpi list as sent by the device"""
+    def __init__(self, dpi_words = [400, 800, 1600], extended = False):
+        super().__init__(features = FEATURES + [0x2201, 0x8060] + ([0x8061] if extended else []))
+        self.dpi_words = dpi_words
+        self.dpi = 800
+        #0x8060: bit n for (n+1)ms, 0x8061: bit n for FeatureReportRate.EXTENDED_RATES[n]
+        self.rate_mask = 0b10001011
+        self.extended_mask = 0b1111111
+        self.rate = 1
+        self.set_requests = []
+
+    def handle(self, data):
+        feature = self.features[data[2]] if data[2] < len(self.features) else 0
+        func, params = data[3] >> 4, bytes(data[4:])
+        if feature not in [0x2201, 0x8060, 0x8061]:
+            return super().handle(data)
+        out = b''
+        if feature == 0x2201:
+            if func == 0:
+                out = bytes([1])
+            elif func == 1:
+                out = bytes([params[0]]) + b''.join(struct.pack('>H', x) for x in self.dpi_words)
+            elif func == 2:
+                out = bytes([params[0]]) + struct.pack('>H', self.dpi)
+            elif func == 3:
+                self.dpi = struct.unpack('>H', params[1:3])[0]
+        elif feature == 0x8060:
+            out = [bytes([self.rate_mask]), bytes([self.rate]), b''][func]
+        elif feature == 0x8061:
+            out = [b'', struct.pack('>H', self.extended_mask), bytes([self.rate]), b''][func]
+        if func == SETTERS[feature]:
+            self.set_requests.append((feature, func, params[:3]))
+            if feature != 0x2201:
+                self.rate = params[0]
+        return bytes(data[:4]) + (out + bytes(16))[:16]
+
+
+def open_device(port):
+    return LogiHPP20(port = port, index_list = [0xFF])
+
+
+@pytest.mark.parametrize('words, expected', [
+    ([400, 800, 1600], [400, 800, 1600]),
+    #low, step, high
+    ([100, 0xE000 | 50, 25600], [(100, 25600, 50)]),
+    #the upper bound of a range starts the next one
+    ([100, 0xE000 | 50, 1000, 0xE000 | 100, 4000], [(100, 1000, 50), (1000, 4000, 100)]),
+    ([200, 400, 0xE000 | 100, 800, 1600], [200, (400, 800, 100), 1600]),
+])
+def test_dpi_list(words, expected):
+    dpi = FeatureAdjustableDpi(open_device(HostModePort(words)))
+    assert dpi.dpi_list() == expected
+
+
+def test_set_dpi():
+    port = HostModePort([100, 0xE000 | 50, 25600])
+    dpi = FeatureAdjustableDpi(open_device(port))
+    assert dpi.sensor_count == 1 and dpi.get_dpi() == 800
+    dpi.set_dpi(1650)
+    assert port.dpi == 1650 and dpi.get_dpi() == 1650
+    for x in [1625, 50, 25650]:
+        assert not dpi.is_supported(x)
+    with pytest.raises(AssertionError, match = 'unsupported dpi: 1625'):
+        dpi.set_dpi(1625)
+    assert port.dpi == 1650
+
+
+def test_report_rate():
+    port = HostModePort()
+    rate = FeatureReportRate(open_device(port))
+    assert not rate.extended
+    assert rate.rates == [125, 250, 500, 1000] and rate.rate == 1000
+    rate.rate = 250
+    assert port.set_requests == [(0x8060, 2, bytes([4, 0, 0]))] and rate.rate == 250
+
+
+def test_extended_report_rate():
+    port = HostModePort(extended = True)
+    port.extended_mask = 0b1011000
+    rate = FeatureReportRate(open_device(port))
+    #0x8061 is used when the device has both
+    assert rate.extended
+    assert rate.rates == [1000, 2000, 8000]
+    rate.rate = 8000
+    assert port.set_requests == [(0x8061, 3, bytes([6, 0, 0]))] and rate.rate == 8000
+
+
+@pytest.mark.parametrize('extended, value', [(False, 2000), (False, 333), (True, 500)])
+def test_unsupported_rate(extended, value):
+    port = HostModePort(extended = extended)
+    port.extended_mask = 0b1011000
+    rate = FeatureReportRate(open_device(port))
+    with pytest.raises(AssertionError, match = f'unsupported report rate: {value}'):
+        rate.rate = value
+    assert port.set_requests == []
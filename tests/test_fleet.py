@@ -0,0 +1,62 @@
+import copy
+import pytest
+from conftest import FakePort
+from libs.Fleet import select_devices, run_fleet, print_report
+from libs.FeatureOnboardProfile import FeatureOnboardProfile
+from libs.LogiHPP20 import LogiHPP20
+
+
+@pytest.fixture
+def fleet(fake_hid):
+    """three mice, two G502 and a G403"""
+    fake_hid.add(0xC08B, FakePort(serial = 'SN1'))
+    fake_hid.add(0xC08B, FakePort(serial = 'SN2'))
+    fake_hid.add(0xC083, FakePort(serial = 'SN3'))
+    return fake_hid
+
+
+def read_profile(port, index):
+    dev = LogiHPP20(port = port, index_list = [0xFF])
+    omm = FeatureOnboardProfile(dev)
+    return omm.profile_bin_to_json(omm.read_memory_page(index))
+
+
+def test_select_devices(fleet, capsys):
+    assert select_devices('all') == [(0xC08B, 'SN1'), (0xC08B, 'SN2'), (0xC083, 'SN3')]
+    assert select_devices('0xc083') == [(0xC083, 'SN3')]
+    assert select_devices('SN3, SN1') == [(0xC08B, 'SN1'), (0xC083, 'SN3')]
+    capsys.readouterr()
+    assert select_devices('SN2,SN9') == [(0xC08B, 'SN2')]
+    assert 'devices not found: SN9' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_run_fleet(fleet, profile, workers, capsys):
+    j = copy.deepcopy(profile)
+    j['dpi_list'][0] = 500
+    results, wall = run_fleet(select_devices('all'), [0xFF], {1: j}, do_switch = 2, workers = workers)
+    assert [(r['serial'], r['ok'], r['index']) for r in results] == [('SN1', True, 0xFF), ('SN2', True, 0xFF), ('SN3', True, 0xFF)]
+    for _, port in fleet.ports:
+        assert read_profile(port, 1)['dpi_list'][0] == 500
+        assert port.profile == 2
+    print_report(results, wall)
+    assert '3/3 devices ok' in capsys.readouterr().out
+
+
+def test_failure_in_report(fleet, profile, capsys):
+    j = copy.deepcopy(profile)
+    j['dpi_list'][0] = 500
+    fleet.ports[1][1].fail(6)
+    results, wall = run_fleet(select_devices('all'), [0xFF], {1: j})
+    assert [r['ok'] for r in results] == [True, False, True]
+    assert 'error while writing' in results[1]['error']
+    print_report(results, wall)
+    out = capsys.readouterr().out
+    assert 'FAIL' in out and '    error: error while writing' in out and '2/3 devices ok' in out
+
+
+def test_missing_device(fleet, capsys):
+    #unplugged between selection and provisioning
+    results, wall = run_fleet([(0xC08B, 'SN1'), (0xC08B, 'SN7')], [0xFF], {})
+    assert [(r['serial'], r['ok']) for r in results] == [('SN1', True), ('SN7', False)]
+    assert results[1]['error'] and results[1]['index'] == 0xFF
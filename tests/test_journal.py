@@ -0,0 +1,46 @@
+import copy, os, struct
+import pytest
+from libs.HidppJournal import WriteJournal
+
+
+def write_starts(port, start):
+    #pages of the write sequences since start
+    return [struct.unpack('>H', x[4:6])[0] for x in port.writes[start:] if x[2] == 3 and x[3] >> 4 == 6]
+
+
+@pytest.fixture
+def profile_b(profile):
+    j = copy.deepcopy(profile)
+    j['dpi_list'][0] = 500
+    j['buttons'][6] = {'action': 'macro', 'value': 'b'}
+    return j
+
+
+def test_resume(omm, port, profile_b, tmp_path):
+    filename = str(tmp_path / 'j.json')
+    data = omm.profile_bin_from_json(profile_b)
+    #the profile page fails after its macro page is written
+    port.fail(6, struct.pack('>H', 1))
+    with pytest.raises(Exception, match = 'error while writing memory page: 1'):
+        omm.onboard_profile_save(data, WriteJournal(filename))
+    assert write_starts(port, 0)[0] == 6
+    assert os.path.isfile(filename)
+    port.failing.clear()
+    start = len(port.writes)
+    omm.onboard_profile_save(data, WriteJournal(filename))
+    assert write_starts(port, start) == [1]
+    assert not os.path.exists(filename)
+    j = omm.profile_bin_to_json(omm.read_memory_page(1))
+    assert j['dpi_list'][0] == 500 and j['buttons'][6]['value'] == 'b'
+
+
+def test_other_image_starts_over(omm, port, profile_b, tmp_path):
+    filename = str(tmp_path / 'j.json')
+    port.fail(6, struct.pack('>H', 1))
+    with pytest.raises(Exception, match = 'error while writing memory page: 1'):
+        omm.onboard_profile_save(omm.profile_bin_from_json(profile_b), WriteJournal(filename))
+    port.failing.clear()
+    profile_b['dpi_list'][0] = 600
+    start = len(port.writes)
+    omm.onboard_profile_save(omm.profile_bin_from_json(profile_b), WriteJournal(filename))
+    assert write_starts(port, start) == [6, 1]
@@ -0,0 +1,34 @@
+import json, time
+from conftest import FakePort
+from libs.Fleet import run_fleet
+from libs.JsonLines import JsonLines
+
+
+class SlowFile:
+    """writes a line in pieces, other threads get to run in between"""
+    def __init__(self):
+        self.data = []
+        self.flushes = 0
+
+    def write(self, text):
+        for i in range(0, len(text), 64):
+            self.data.append(text[i:i+64])
+            time.sleep(0)
+
+    def flush(self):
+        self.flushes += 1
+
+
+def test_fleet_stream(fake_hid):
+    for serial in ['SN1', 'SN2', 'SN3']:
+        fake_hid.add(0xC08B, FakePort(serial = serial, delay = 0.001))
+    out = SlowFile()
+    results, _ = run_fleet([(0xC08B, x) for x in ['SN1', 'SN2', 'SN3']], [0xFF], {}, stream = JsonLines(out, True))
+    assert all(r['ok'] and 'all' in r['profiles'] for r in results)
+    lines = ''.join(out.data).splitlines()
+    #whole lines only, one per profile and macro button of each device
+    rows = [json.loads(x) for x in lines]
+    assert len(rows) == 3 * (5 + 1) and out.flushes == len(rows)
+    assert sorted((x['type'], x['profile']) for x in rows) == sorted([('profile', i) for i in range(1, 6)] * 3 + [('macro', 1)] * 3)
+    macros = [x for x in rows if x['type'] == 'macro']
+    assert {(x['button'], x['value']) for x in macros} == {('buttons[6]', 'a')}
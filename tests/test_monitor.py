@@ -0,0 +1,45 @@
+import queue
+
+
+def notify(port, event, payload):
+    #0x8100 is feature index 3, swid 0
+    port.replies.put(bytes([0x11, 0xFF, 3, event << 4]) + (bytes(payload) + bytes(16))[:16])
+
+
+def requests(port, func):
+    return [x for x in port.writes if x[2] == 3 and x[3] >> 4 == func]
+
+
+def test_monitor_state(omm, port):
+    events = queue.Queue()
+    state = omm.monitor(lambda event, state: events.put((event, state)))
+    assert state == {'profile': 1, 'onboard_mode': True, 'dpi_index': -1}
+    #served from the cache, no requests
+    count = len(requests(port, 4)), len(requests(port, 2))
+    assert omm.current_profile == 1 and omm.onboard_mode
+    assert (len(requests(port, 4)), len(requests(port, 2))) == count
+
+    #profile 3 selected on the device, the notification has its memory page
+    notify(port, 0, [0, 3])
+    assert events.get(timeout = 2) == ('profile', {'profile': 3, 'onboard_mode': True, 'dpi_index': -1})
+    notify(port, 1, [2])
+    assert events.get(timeout = 2) == ('dpi', {'profile': 3, 'onboard_mode': True, 'dpi_index': 2})
+    #other events are ignored
+    notify(port, 5, [1])
+    assert omm.current_profile == 3 and events.empty()
+
+    #changes made by the host are in the state too
+    omm.current_profile = 2
+    omm.onboard_mode = False
+    assert omm.monitor() == {'profile': 2, 'onboard_mode': False, 'dpi_index': 2}
+    assert port.profile == 2 and port.mode == 2
+
+
+def test_stop_monitor(omm, port):
+    omm.monitor()
+    omm.stop_monitor()
+    assert omm.state is None
+    notify(port, 0, [0, 3])
+    count = len(requests(port, 4))
+    assert omm.current_profile == 1
+    assert len(requests(port, 4)) == count + 1
@@ -0,0 +1,36 @@
+import sys
+import pytest
+from conftest import FakePort
+import omm
+
+
+@pytest.fixture
+def mouse(fake_hid, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'devices.ini').write_text('[g502]\npid=0xc08b\nindex=0xff\n')
+    return fake_hid.add(0xC08B, FakePort())
+
+
+def run(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['omm.py', '-n', 'g502'] + list(args))
+    omm.main()
+
+
+def requests(port, feature_idx, func):
+    return [x for x in port.writes if x[2] == feature_idx and x[3] >> 4 == func]
+
+
+def test_switch_without_tuning(mouse, monkeypatch, cache_home):
+    run(monkeypatch, '-p', '2', '--switch')
+    assert mouse.profile == 2
+    #no rtt pings, nothing cached
+    assert requests(mouse, 0, 1) == []
+    assert not (cache_home / 'omm' / 'devices').exists()
+
+
+def test_onboard_mode_only_when_changed(mouse, monkeypatch, capsys):
+    run(monkeypatch, '--onboard', 'on')
+    assert requests(mouse, 3, 1) == []
+    assert 'onboard mode already on' in capsys.readouterr().out
+    run(monkeypatch, '--onboard', 'off')
+    assert len(requests(mouse, 3, 1)) == 1 and mouse.mode == 2
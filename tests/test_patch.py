@@ -0,0 +1,51 @@
+import pytest
+from libs.ProfilePatch import ProfilePatch, parse_button, parse_dpi
+
+
+def test_parse_button():
+    assert parse_button('6=key:lctrl+c') == (6, {'action': 'key', 'value': 'c', 'modifier': 'lctrl'}, 'buttons')
+    assert parse_button('g2=button:middle_button') == (2, {'action': 'button', 'value': 'middle_button'}, 'buttons_gshift')
+    assert parse_button('3=macro:+lctrl c -lctrl') == (3, {'action': 'macro', 'value': '+lctrl c -lctrl'}, 'buttons')
+    assert parse_button('1=unknown:\\x01\\x02\\x03\\x04')[1] == {'action': 'unknown', 'bytes': '\\x01\\x02\\x03\\x04'}
+    for text in ['x=key:a', '6=key:a+b', '6=button:left', '6=']:
+        with pytest.raises(AssertionError):
+            parse_button(text)
+
+
+def test_parse_dpi():
+    assert parse_dpi('2=1600') == (2, 1600)
+    for text in ['5=100', '0=70000', '1=abc', '1600']:
+        with pytest.raises(AssertionError):
+            parse_dpi(text)
+
+
+def test_allocate(omm):
+    patch = ProfilePatch(omm)
+    #profile 1 macros go in pages 6 and 7, 245 bytes each
+    assert patch.allocate(10, []) == (6, 0)
+    assert patch.allocate(40, [(6, 0, 10), (6, 50, 60)]) == (6, 10)
+    assert patch.allocate(100, [(6, 0, 200)]) == (7, 0)
+    assert patch.allocate(45, [(6, 0, 200)]) == (6, 200)
+    with pytest.raises(Exception):
+        patch.allocate(100, [(6, 0, 200), (7, 0, 200)])
+
+
+def test_apply(omm, port):
+    patch = ProfilePatch(omm)
+    patch.set_dpi(*parse_dpi('0=500'))
+    patch.set_button(*parse_button('2=key:lctrl+c'))
+    patch.set_button(*parse_button('3=macro:b'))
+    macro = bytes(port.pages[6][:7])
+    assert patch.apply() > 0
+    j = omm.profile_bin_to_json(omm.read_memory_page(1))
+    assert j['dpi_list'][0] == 500
+    assert j['buttons'][2] == {'action': 'key', 'value': 'c', 'modifier': 'lctrl'}
+    assert j['buttons'][3]['action'] == 'macro' and j['buttons'][3]['value'] == 'b'
+    #the old macro stays, the new one goes after it
+    assert j['buttons'][6]['value'] == 'a'
+    assert bytes(port.pages[6][:7]) == macro
+    #nothing changed, nothing written
+    writes = len(port.writes)
+    patch.set_dpi(0, 500)
+    assert patch.apply() == 0
+    assert not [x for x in port.writes[writes:] if x[3] >> 4 == 7]
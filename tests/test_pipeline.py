@@ -0,0 +1,32 @@
+from libs.FeatureOnboardProfile import ADDRESS
+
+
+def test_batch_keeps_replies_behind_a_lost_one(dev, omm, port):
+    page = bytes(omm.read_memory_page(1))
+    dev.pipeline_depth = 8
+    dev.timeout = 100
+    for offset in [16, 48, 160]:
+        port.lose(5, ADDRESS.pack(1, offset))
+    assert omm.read_memory_page(1) == page
+    #one timeout per lost reply, none for the replies read while waiting
+    assert dev.stats['timeouts'] == 3
+    assert dev.stats['drained'] == 0
+
+
+def test_batch_retry_ignores_a_late_reply(dev, omm, port):
+    page = bytes(omm.read_memory_page(2))
+    dev.pipeline_depth = 4
+    dev.timeout = 100
+    #the last chunk, swid 15. its reply comes after the retry, which has another swid and drops it
+    port.lose(5, ADDRESS.pack(2, 224), late = True)
+    assert omm.read_memory_range(2, 0, 240) == page[:240]
+    assert dev.stats['timeouts'] == 1
+    assert dev.stats['drained'] == 1
+    assert port.writes[-1][3] & 0xF != port.writes[-2][3] & 0xF
+
+
+def test_batch_shared_transport(dev, omm, port):
+    page = bytes(omm.read_memory_page(4))
+    dev.share()
+    dev.pipeline_depth = 4
+    assert omm.read_memory_page(4) == page
@@ -0,0 +1,59 @@
+import copy, os
+import pytest
+from libs.ProfileCache import ProfileCache
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    stats = {'hits': 0, 'misses': 0}
+    monkeypatch.setattr(ProfileCache, 'stats', stats)
+    return stats
+
+
+def test_key(omm, profile):
+    key = ProfileCache.key(profile, omm, 1)
+    #json key order doesn't matter
+    assert ProfileCache.key(dict(reversed(list(profile.items()))), omm, 1) == key
+    other = copy.deepcopy(profile)
+    other['dpi_list'][0] = 500
+    assert ProfileCache.key(other, omm, 1) != key
+    #nor the same pages for another profile or page size
+    assert ProfileCache.key(profile, omm, 2) != key
+    omm.page_size = 1024
+    assert ProfileCache.key(profile, omm, 1) != key
+
+
+def test_compile_hits(omm, profile, stats, cache_home):
+    pages = ProfileCache().compile(omm, profile, 1)
+    again = ProfileCache().compile(omm, profile, 1)
+    assert again == pages and stats == {'hits': 1, 'misses': 1}
+    #copies, changing one doesn't change the cache
+    again[0][0] = 0
+    assert ProfileCache().compile(omm, profile, 1) == pages
+    #another process finds it on disk
+    ProfileCache.memory.clear()
+    assert ProfileCache().compile(omm, profile, 1) == pages and stats['misses'] == 1
+    assert len(os.listdir(cache_home / 'omm' / 'profiles')) == 1
+
+
+def test_memory_eviction(omm, profile, stats, monkeypatch):
+    monkeypatch.setattr(ProfileCache, 'max_entries', 3)
+    cache = ProfileCache(persist = False)
+    keys = []
+    for i in range(5):
+        j = copy.deepcopy(profile)
+        j['dpi_list'][0] = 100 * (i + 1)
+        cache.compile(omm, j, 1)
+        keys.append(ProfileCache.key(j, omm, 1))
+    #oldest first out
+    assert list(ProfileCache.memory) == keys[2:]
+    assert cache.get(keys[0]) is None and cache.get(keys[4]) is not None
+
+
+def test_disk_pruning(omm, profile, monkeypatch, cache_home):
+    monkeypatch.setattr(ProfileCache, 'max_files', 2)
+    for i in range(4):
+        j = copy.deepcopy(profile)
+        j['dpi_list'][0] = 100 * (i + 1)
+        ProfileCache().compile(omm, j, 1)
+    assert len(os.listdir(cache_home / 'omm' / 'profiles')) == 2
@@ -0,0 +1,58 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from conftest import FakePort, FakeReceiver, g502_pages, with_crc
+from libs.HidppReceiver import ReceiverSession
+from libs.FeatureOnboardProfile import FeatureOnboardProfile
+from libs.Fleet import run_fleet
+
+
+@pytest.fixture
+def receiver(fake_hid):
+    """mice in slots 1 and 3, profile 1 of the second one has other dpi"""
+    pages = g502_pages()
+    pages[1][3] = 0x20
+    with_crc(pages[1])
+    receiver = FakeReceiver({1: FakePort(serial = 'M1'), 3: FakePort(pages, serial = 'M3')}, delay = 0.002)
+    return fake_hid.add(0xC539, receiver)
+
+
+def test_probe(receiver):
+    session = ReceiverSession(0xC539)
+    start = time.perf_counter()
+    devices = session.probe()
+    #empty slots cost one probe timeout, all slots at once
+    assert time.perf_counter() - start < 2 * devices[1].probe_timeout / 1000
+    assert sorted(devices) == [1, 3]
+    #one request per empty slot, no retries
+    assert sorted(x[1] for x in receiver.writes if x[1] not in [1, 3]) == [2, 4, 5, 6]
+    for dev in devices.values():
+        assert dev.product_id == 0xC539 and dev.product_name == 'G502 HERO Gaming Mouse'
+        assert dev.retries == 3 and dev.timeout == 5000
+    assert session.device(2) is None and session.device(3) is devices[3]
+    session.close()
+
+
+def test_slot_routing(receiver):
+    session = ReceiverSession(0xC539)
+    devices = session.probe([1, 3])
+
+    def read(dev):
+        dev.pipeline_depth = 4
+        omm = FeatureOnboardProfile(dev)
+        return [bytes(omm.read_memory_page(i)) for i in range(1, 6)]
+    with ThreadPoolExecutor(max_workers = 2) as pool:
+        pages = list(pool.map(read, [devices[1], devices[3]]))
+    for i, slot in enumerate([1, 3]):
+        assert pages[i] == [bytes(receiver.slots[slot].pages[x]) for x in range(1, 6)]
+    assert pages[0][0] != pages[1][0]
+    assert session.transport.stale == 0
+    session.close()
+
+
+def test_fleet_receiver(receiver, profile):
+    profile['dpi_list'][0] = 500
+    results, wall = run_fleet([(0xC539, 'RCV1')], [], {1: profile})
+    assert [(r['index'], r['ok']) for r in results] == [(1, True), (3, True)]
+    for slot in receiver.slots.values():
+        assert slot.pages[1][3:5] == bytes([0xF4, 0x01])
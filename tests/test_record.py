@@ -0,0 +1,48 @@
+from libs.LogiHPP20 import LogiHPP20
+from libs.FeatureOnboardProfile import FeatureOnboardProfile
+from libs.HidppRecord import ReplayPort, load_recording, WRITE, READ
+
+
+def record_session(dev, filename, depth):
+    dev.record(filename)
+    omm = FeatureOnboardProfile(dev)
+    dev.pipeline_depth = depth
+    ret = [bytes(omm.read_memory_page(x, x != 6)) for x in [0, 1, 6]]
+    dev.close()
+    return ret
+
+
+def replay_session(filename, depth):
+    port = ReplayPort(filename)
+    dev = LogiHPP20(port = port, index_list = [port.device_index])
+    omm = FeatureOnboardProfile(dev)
+    dev.pipeline_depth = depth
+    ret = [bytes(omm.read_memory_page(x, x != 6)) for x in [0, 1, 6]]
+    dev.close()
+    return dev, ret
+
+
+def test_recording_file(dev, tmp_path):
+    filename = str(tmp_path / 'a.ommr')
+    record_session(dev, filename, 1)
+    meta, records = load_recording(filename)
+    assert meta == {'device_index': 0xFF, 'product': 'G502 HERO Gaming Mouse', 'serial': 'SN1'}
+    assert records and {x[1] for x in records} == {WRITE, READ}
+    assert [x[0] for x in records] == sorted(x[0] for x in records)
+
+
+def test_replay_round_trip(dev, tmp_path):
+    filename = str(tmp_path / 'a.ommr')
+    pages = record_session(dev, filename, 1)
+    replayed, ret = replay_session(filename, 1)
+    assert ret == pages
+    assert replayed.product_name == 'G502 HERO Gaming Mouse'
+
+
+def test_replay_pipelined(dev, tmp_path):
+    #replies are matched to their request by swid, not by the order they were read
+    filename = str(tmp_path / 'a.ommr')
+    pages = record_session(dev, filename, 8)
+    replayed, ret = replay_session(filename, 8)
+    assert ret == pages
+    assert replayed.stats['timeouts'] == 0
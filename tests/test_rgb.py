@@ -0,0 +1,77 @@
+import pytest
+import libs.FeatureColorLed
+from libs.FeatureColorLed import RGBStream
+
+
+class FakeClock:
+    """perf_counter and sleep in place of the time module, sleep only moves the clock"""
+    def __init__(self):
+        self.now = 100.0
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeLed:
+    """each zone update takes cost seconds of the fake clock"""
+    def __init__(self, clock, cost = 0.0):
+        self.clock = clock
+        self.cost = cost
+        self.sent = []
+
+    def set_zone_color(self, zone, color, wait_ack = True):
+        self.clock.now += self.cost
+        self.sent.append((zone, color))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(libs.FeatureColorLed, 'time', clock)
+    return clock
+
+
+def test_skip_unchanged_zones(clock):
+    led = FakeLed(clock)
+    stream = RGBStream(led)
+    assert stream.push({0: 0xFF0000, 1: 0x0000FF}) == 2
+    assert stream.push({0: 0xFF0000, 1: 0x00FF00}) == 1
+    assert stream.push({0: 0xFF0000}) == 0
+    assert led.sent == [(0, 0xFF0000), (1, 0x0000FF), (1, 0x00FF00)]
+    assert stream.stats()['zones_sent'] == 3 and stream.stats()['zones_skipped'] == 2
+
+
+def test_steady_rate(clock):
+    stream = RGBStream(FakeLed(clock, 0.001), fps = 50)
+    stats = stream.run(lambda i, t: {0: i}, frames = 100)
+    assert stats['frames'] == 100 and stats['dropped'] == 0
+    assert stats['fps'] == pytest.approx(50)
+    #duration instead of frames, fps adds up over runs
+    stats = stream.run(lambda i, t: {0: i}, duration = 1.0)
+    assert stats['frames'] == 150 and stats['fps'] == pytest.approx(50)
+
+
+def test_drop_late_frames(clock):
+    led = FakeLed(clock, 0.045)
+    stream = RGBStream(led, fps = 50)
+    slots = []
+
+    def source(i, t):
+        slots.append(i)
+        return {0: i}
+    stats = stream.run(source, frames = 100)
+    #each update takes 2.25 frame intervals, the slots whose time passed are skipped
+    assert stats['frames'] == len(slots) and stats['frames'] + stats['dropped'] == 100
+    assert sum(b - a - 1 for a, b in zip(slots, slots[1:])) == stats['dropped'] - (99 - slots[-1])
+    assert stats['dropped'] >= 50
+    #one frame per update, never waiting for the next slot
+    assert stats['fps'] == pytest.approx(1 / 0.045)
+
+
+def test_source_stops(clock):
+    stream = RGBStream(FakeLed(clock), fps = 10)
+    stats = stream.run(lambda i, t: {0: 0xFFFFFF} if i < 5 else None)
+    assert stats['frames'] == 5 and stats['zones_sent'] == 1 and stats['zones_skipped'] == 4
@@ -0,0 +1,55 @@
+import copy, json
+from libs.ProfileSchema import ProfileSchema, validate_file
+
+
+def test_valid_profile(geometry, profile):
+    assert ProfileSchema().validate(profile) == []
+    assert ProfileSchema(geometry).validate(profile, 1) == []
+
+
+def test_errors_with_path(profile):
+    j = copy.deepcopy(profile)
+    j['report_rate'] = 300
+    j['dpi_list'] = [400, 800, 70000]
+    j['buttons'][0] = {'action': 'button', 'value': 'left'}
+    j['buttons'][1] = {'action': 'key', 'value': 'f13', 'modifier': 'lctrl+hyper'}
+    j['buttons'][6] = {'action': 'macro', 'value': '+nosuchkey'}
+    j['rgb'][2] = {'mode': 'disco'}
+    del j['profile_name']
+    errors = ProfileSchema().validate(j)
+    assert 'report_rate: 300 should be one of [1000, 500, 250, 125]' in errors
+    assert 'dpi_list: needs 5 values, got 3' in errors
+    assert 'dpi_list[2]: 70000 should be 0-65535' in errors
+    assert 'buttons[0].value: unknown button left' in errors
+    assert 'buttons[1].modifier: unknown modifier hyper' in errors
+    assert any(x.startswith('buttons[6].value: ') for x in errors)
+    assert any(x.startswith('rgb[2].mode: disco') for x in errors)
+    assert 'profile_name: missing' in errors
+
+
+def test_geometry_checks(geometry, profile):
+    j = copy.deepcopy(profile)
+    j['buttons'] = j['buttons'][:8]
+    j['extended_report_rate'] = j.pop('report_rate')
+    errors = ProfileSchema(geometry).validate(j)
+    assert 'buttons: the device has 11, got 8' in errors
+    assert 'extended_report_rate: not supported by the device, use report_rate' in errors
+
+
+def test_macro_budget(geometry, profile):
+    #2 macro pages per profile
+    j = copy.deepcopy(profile)
+    for i in range(11):
+        j['buttons_gshift'][i] = {'action': 'macro', 'value': ' '.join(['a'] * 40)}
+    errors = ProfileSchema(geometry).validate(j, 1)
+    assert len(errors) == 1
+    assert errors[0].startswith('macros: need ') and errors[0].endswith('memory pages, profile 1 has 2')
+
+
+def test_validate_file(tmp_path, profile):
+    good = tmp_path / 'good.json'
+    good.write_text(json.dumps(profile))
+    bad = tmp_path / 'bad.json'
+    bad.write_text('{')
+    assert validate_file(str(good)) == []
+    assert validate_file(str(bad))[0].startswith('file: ')
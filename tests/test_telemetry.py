@@ -0,0 +1,53 @@
+import json
+from libs.Telemetry import device_labels, fleet_samples, prometheus_text, write_metrics
+
+
+def test_prometheus_text(dev, omm):
+    omm.read_memory_page(1)
+    samples = [(device_labels(dev), dev.metrics())]
+    assert samples[0][0] == {'serial': 'SN1', 'pid': '0000', 'index': 'ff', 'name': 'G502 HERO Gaming Mouse'}
+    text = prometheus_text(samples)
+    labels = '{serial="SN1",pid="0000",index="ff",name="G502 HERO Gaming Mouse"}'
+    lines = text.splitlines()
+    assert '# TYPE hidpp_requests_total counter' in lines
+    assert f'hidpp_requests_total{labels} {dev.stats["requests"]}' in lines
+    assert f'hidpp_page_read_bytes_total{labels} 256' in lines
+    #one summary per device, quantiles as labels
+    assert '# TYPE hidpp_rtt_seconds summary' in lines
+    assert any(x.startswith('hidpp_rtt_seconds{serial="SN1",pid="0000",index="ff",name="G502 HERO Gaming Mouse",quantile="0.99"} ') for x in lines)
+    assert f'hidpp_rtt_seconds_count{labels} {len(dev.rtt)}' in lines
+    #each metric documented once
+    assert len([x for x in lines if x.startswith('# HELP hidpp_requests_total')]) == 1
+
+
+def test_label_escaping():
+    text = prometheus_text([({'name': 'a "b"\\c\nd'}, {'ok': 1})])
+    assert 'hidpp_provision_ok{name="a \\"b\\"\\\\c\\nd"} 1' in text.splitlines()
+
+
+def test_fleet_samples():
+    results = [{'serial': 'SN1', 'pid': 0xC08B, 'index': 0xFF, 'name': 'G502', 'ok': True, 'elapsed': 1.5, 'metrics': {'requests': 10}},
+               {'serial': 'SN2', 'pid': 0xC08B, 'index': -1, 'name': '', 'ok': False, 'elapsed': 0.1}]
+    samples = fleet_samples(results)
+    assert samples[0] == ({'serial': 'SN1', 'pid': 'c08b', 'index': 'ff', 'name': 'G502'}, {'requests': 10, 'ok': 1, 'elapsed': 1.5})
+    assert samples[1] == ({'serial': 'SN2', 'pid': 'c08b', 'index': '', 'name': ''}, {'ok': 0, 'elapsed': 0.1})
+    lines = prometheus_text(samples).splitlines()
+    assert 'hidpp_provision_ok{serial="SN2",pid="c08b",index="",name=""} 0' in lines
+    assert not any(x.startswith('hidpp_rtt_seconds') for x in lines)
+
+
+def test_write_metrics(tmp_path):
+    samples = [({'serial': 'SN1'}, {'requests': 3}), ({'serial': 'SN2'}, {'requests': 4})]
+    prom = tmp_path / 'out' / 'omm.prom'
+    write_metrics(str(prom), samples)
+    write_metrics(str(prom), samples[:1])
+    #replaced on each run
+    assert prom.read_text() == prometheus_text(samples[:1])
+    assert [x.name for x in prom.parent.iterdir()] == ['omm.prom']
+    #json lines are appended
+    jsonl = tmp_path / 'omm.jsonl'
+    write_metrics(str(jsonl), samples)
+    write_metrics(str(jsonl), samples[:1])
+    rows = [json.loads(x) for x in jsonl.read_text().splitlines()]
+    assert [(x['serial'], x['requests']) for x in rows] == [('SN1', 3), ('SN2', 4), ('SN1', 3)]
+    assert all('time' in x for x in rows)
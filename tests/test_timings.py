@@ -0,0 +1,77 @@
+import gc, threading
+from conftest import FakePort
+from libs.LogiHPP20 import LogiHPP20
+from libs.Timings import Timings, NO_SPAN
+
+
+def open_device():
+    dev = LogiHPP20(port = FakePort(), index_list = [0xFF])
+    dev.stats['requests'] = 0
+    return dev
+
+
+def test_span_tree(capsys):
+    t = Timings()
+    assert t.span('a') is NO_SPAN
+    t.enabled = True
+    dev = open_device()
+    t.watch(dev)
+    with t.span('read'):
+        for i in range(2):
+            with t.span('ping'):
+                dev.call_feature(0, 1, [0, 0, i])
+        with t.span('name'):
+            dev.get_device_name()
+    t.mark('command')
+    with t.span('read'):
+        pass
+    t.mark('command')
+    command = t.root.children['command']
+    assert command.count == 2 and command.requests == 2 + 3
+    read = command.children['read']
+    assert read.count == 2 and read.requests == 5
+    assert (read.children['ping'].count, read.children['ping'].requests) == (2, 2)
+    assert read.children['name'].requests == 3
+    t.print_tree()
+    out = capsys.readouterr().out.splitlines()
+    assert out[0] == 'timings:'
+    assert out[1].startswith('  command x2') and out[2].startswith('    read x2') and out[3].startswith('      ping x2')
+    assert out[-1].startswith('  total') and out[-1].endswith('5 requests')
+
+
+def test_hooks_and_threads():
+    t = Timings()
+    events = []
+    t.add_hook(lambda name, seconds, requests: events.append(name))
+
+    def work(name):
+        with t.span(name):
+            with t.span('inner'):
+                pass
+    threads = [threading.Thread(target = work, args = (f'device {i}',)) for i in range(4)]
+    for x in threads:
+        x.start()
+    for x in threads:
+        x.join()
+    t.mark('fleet')
+    #each thread has its own stack, the spans don't nest in each other
+    assert sorted(t.root.children['fleet'].children) == [f'device {i}' for i in range(4)]
+    assert events.count('inner') == 4 and events[-1] == 'fleet'
+
+
+def test_closed_devices_stay_counted():
+    t = Timings()
+    dev = open_device()
+    t.watch(dev)
+    dev.call_feature(0, 1, [0, 0, 1])
+    other = open_device()
+    t.watch(other)
+    other.call_feature(0, 1, [0, 0, 1])
+    other.call_feature(0, 1, [0, 0, 2])
+    assert t.requests() == 3
+    #not kept alive by the watch list
+    del other
+    gc.collect()
+    assert t.requests() == 3 and len(t.devices) == 1
+    t.unwatch(dev)
+    assert t.devices == [] and t.requests() == 3
@@ -0,0 +1,70 @@
+import threading
+from conftest import FakePort
+from libs.HidppTransport import HidppTransport
+from libs.FeatureOnboardProfile import ADDRESS
+
+
+def read_request(page, offset):
+    #memRead of feature index 3, function 5
+    return bytes([0x11, 0xFF, 3, 0x50]) + ADDRESS.pack(page, offset) + bytes(12)
+
+
+def test_replies_routed_by_swid():
+    port = FakePort(delay = 0.01)
+    t = HidppTransport(port)
+    tokens = [t.submit(read_request(1, i*16)) for i in range(8)]
+    swids = [x[0][3] for x in tokens]
+    assert len(set(swids)) == 8
+    for i, token in enumerate(tokens):
+        assert t.wait(token, 1000)[4:] == port.pages[1][i*16:i*16+16]
+    t.close()
+
+
+def test_submit_waits_for_free_swid():
+    #3 threads with 8 requests each in flight, more than the 15 swids
+    port = FakePort(delay = 0.02)
+    t = HidppTransport(port)
+    errors, replies = [], []
+
+    def run():
+        try:
+            tokens = [t.submit(read_request(2, i*16), True, None, 1000) for i in range(8)]
+            replies.extend(t.wait(x, 1000) for x in tokens)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target = run) for _ in range(3)]
+    for x in threads:
+        x.start()
+    for x in threads:
+        x.join()
+    t.close()
+    assert not errors
+    assert len(replies) == 24 and all(replies)
+
+
+def test_submit_times_out_without_free_swid():
+    port = FakePort()
+    t = HidppTransport(port)
+    for i in range(15):
+        port.lose(5, ADDRESS.pack(3, i*16))
+    tokens = [t.submit(read_request(3, i*16), True, None, 50) for i in range(15)]
+    token = t.submit(read_request(3, 0), True, None, 50)
+    assert token[0] is None
+    assert t.wait(token, 50) is None
+    #a timed out request frees its swid
+    assert t.wait(tokens[0], 10) is None
+    assert t.request(read_request(3, 0), True, 1000)[4:] == port.pages[3][:16]
+    t.close()
+
+
+def test_error_reply_and_notification():
+    port = FakePort()
+    t = HidppTransport(port)
+    #feature index 9 doesn't exist
+    assert t.request(bytes([0x11, 0xFF, 9, 0x10]) + bytes(16), True, 1000) is None
+    got = threading.Event()
+    t.subscribe(lambda data: got.set(), 0xFF, 3)
+    #swid 0, sent by the device
+    port.replies.put(bytes([0x11, 0xFF, 3, 0x00, 0, 2]) + bytes(14))
+    assert got.wait(1)
+    t.close()
@@ -0,0 +1,37 @@
+import os, time
+from libs.utils import percentile, cache_folder, prune_files
+
+
+def test_percentile():
+    assert percentile([], 50) == 0
+    assert percentile([3], 99) == 3
+    values = list(range(10, 0, -1))
+    assert percentile(values, 0) == 1
+    assert percentile(values, 50) == 5
+    assert percentile(values, 90) == 9
+    assert percentile(values, 99) == 10
+    assert percentile(values, 100) == 10
+    #nearest rank rounds up: rank 2.5 is the 3rd value
+    assert percentile([1, 2, 3, 4, 5], 50) == 3
+
+
+def test_cache_folder(monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', '/tmp/xdg')
+    assert cache_folder('profiles') == os.path.join('/tmp/xdg', 'omm', 'profiles')
+    monkeypatch.delenv('XDG_CACHE_HOME')
+    monkeypatch.setenv('HOME', '/home/me')
+    if os.name != 'nt':
+        assert cache_folder() == os.path.join('/home/me', '.cache', 'omm')
+
+
+def test_prune_files(tmp_path):
+    now = time.time()
+    for i in range(5):
+        filename = tmp_path / f'{i}.json'
+        filename.write_text('{}')
+        os.utime(filename, (now - i*100, now - i*100))
+    (tmp_path / 'other.tmp').write_text('')
+    #4.json is too old, 3.json one too many
+    assert prune_files(str(tmp_path), 3, 350) == 2
+    assert sorted(os.listdir(tmp_path)) == ['0.json', '1.json', '2.json', 'other.tmp']
+    assert prune_files(str(tmp_path / 'missing'), 3, 350) == 0
@@ -0,0 +1,88 @@
+import copy, json, struct, threading
+import pytest
+from libs.ProfileWatch import FileWatcher, ProfileWatch
+from libs.HidppProfile import Profile
+
+
+def save(filename, j):
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(j, f)
+
+
+def chunk_writes(port, start):
+    #(page, offset) of the write sequences since start
+    return [struct.unpack('>HH', x[4:8]) for x in port.writes[start:] if x[2] == 3 and x[3] >> 4 == 6]
+
+
+def test_push_changed_chunks(omm, port, profile, tmp_path):
+    filename = tmp_path / 'p.json'
+    j = copy.deepcopy(profile)
+    j['dpi_list'][0] = 500
+    save(filename, j)
+    watch = ProfileWatch(omm, str(filename))
+    start = len(port.writes)
+    #the dpi chunk and the checksum chunk, the macro page is unchanged
+    assert watch.push() == 32
+    assert chunk_writes(port, start) == [(1, 0), (1, 240)]
+    assert watch.partial
+    assert omm.profile_bin_to_json(omm.read_memory_page(1))['dpi_list'][0] == 500
+    start = len(port.writes)
+    assert watch.push() == 0 and chunk_writes(port, start) == []
+
+
+def test_push_whole_page_fallback(omm, port, profile, tmp_path, monkeypatch):
+    #firmware that drops writes not starting at offset 0
+    handle = port.handle
+
+    def whole_pages(data):
+        if data[2] == 3 and data[3] >> 4 == 6 and struct.unpack('>H', data[6:8])[0]:
+            data = bytes(data[:4]) + struct.pack('>HH', 0x100, 0) + bytes(data[8:])
+        return handle(data)
+    monkeypatch.setattr(port, 'handle', whole_pages)
+    filename = tmp_path / 'p.json'
+    j = copy.deepcopy(profile)
+    j['dpi_list'][1] = 900
+    save(filename, j)
+    watch = ProfileWatch(omm, str(filename))
+    #the dpi and checksum chunks, then the page again
+    assert watch.push() == 32 + 256
+    assert watch.partial is False
+    assert omm.profile_bin_to_json(omm.read_memory_page(1))['dpi_list'][1] == 900
+    j['dpi_list'][1] = 1000
+    save(filename, j)
+    start = len(port.writes)
+    assert watch.push() == 256
+    assert chunk_writes(port, start) == [(1, 0)]
+    assert omm.profile_bin_to_json(omm.read_memory_page(1))['dpi_list'][1] == 1000
+
+
+def test_push_checks_schema_first(omm, port, profile, tmp_path):
+    filename = tmp_path / 'p.json'
+    j = copy.deepcopy(profile)
+    j['dpi_default'] = 9
+    save(filename, j)
+    watch = ProfileWatch(omm, str(filename))
+    start = len(port.writes)
+    with pytest.raises(AssertionError, match = 'dpi_default'):
+        watch.push()
+    assert port.writes[start:] == []
+
+
+def test_macro_page_size(omm, profile, monkeypatch):
+    monkeypatch.setattr(omm, 'page_size', 1024)
+    data = Profile(omm).profile_bytes_from_json(copy.deepcopy(profile), 1)
+    assert [len(x) for x in data[1:]] == [1024]
+
+
+@pytest.mark.parametrize('inotify', [True, False])
+def test_file_watcher(tmp_path, inotify):
+    filename = tmp_path / 'p.json'
+    filename.write_text('{}')
+    watcher = FileWatcher(str(filename), 0.01)
+    if not inotify:
+        watcher.close()
+    (tmp_path / 'other.json').write_text('{}')
+    assert not watcher.wait(0.1)
+    threading.Timer(0.05, filename.write_text, ['{"a": 1}']).start()
+    assert watcher.wait(2)
+    watcher.close()